@@ -0,0 +1,66 @@
+import os
+
+import pytest
+
+from wafermap_deliver.fallout import fallout_tables
+from wafermap_deliver.parser import FAST_TEXT_WIDTH
+from wafermap_deliver.synthetic import DIE_HEADER, write_synthetic_wafer
+from wafermap_deliver.wafermap import build_wafermap_grid
+
+# Small synthetic wafers, plus the die-table shapes the fast paths have to
+# get right: CRLF line ends, negative coordinates, no die rows at all and
+# marks too wide for the bulk loader.
+
+LONG_MARK = "M" * (FAST_TEXT_WIDTH + 4)
+# Shipped sample: the CSV and the workbook Excel built from it (Pivot for C1_MARK H, W#08 wafermap)
+DEMO = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "DEMO_WAFERMAP_08.wmap")
+VARIANTS = ("plain", "crlf", "negative", "no_dies", "long_mark")
+
+
+def _edit_dies(lines, variant):
+    start = lines.index(",".join(DIE_HEADER)) + 1
+    head, dies = lines[:start], [line.split(",") for line in lines[start:] if line]
+    if variant == "no_dies":
+        dies = []
+    elif variant == "negative":
+        for row in dies:
+            row[0], row[1] = str(int(row[0]) - 40), str(int(row[1]) - 40)
+    elif variant == "long_mark":
+        for row in dies[::7]:
+            row[6] = LONG_MARK
+    return head + [",".join(row) for row in dies]
+
+
+@pytest.fixture
+def make_wafer_csv(tmp_path):
+    """make_wafer_csv(variant, **shape) -> path of a synthetic .wmap.csv with that edit applied."""
+    def make(variant="plain", name=None, **shape):
+        path = tmp_path / (name or f"{variant}.wmap.csv")
+        write_synthetic_wafer(path, **{"dies": 1500, "seed": 3, **shape})
+        lines = _edit_dies(path.read_bytes().decode("utf-8").split("\r\n"), variant)
+        newline = "\r\n" if variant == "crlf" else "\n"
+        path.write_text(newline.join(lines) + newline, encoding="utf-8", newline="")
+        return str(path)
+    return make
+
+
+@pytest.fixture(params=VARIANTS)
+def wafer_csv(request, make_wafer_csv):
+    return make_wafer_csv(request.param)
+
+
+@pytest.fixture
+def outputs():
+    """outputs(wafer) -> everything a parse feeds the stages, in comparable form."""
+    def summarize(wafer):
+        grid = None
+        if wafer.die_count:
+            grid = [labels.tolist() for labels in build_wafermap_grid(wafer)]
+        return {
+            "columns": {name: wafer.dies[name].tolist() for name in wafer.dies},
+            "rows": list(wafer.iter_rows()),
+            "marks": wafer.c1_mark_values(),
+            "fallout": fallout_tables(wafer),
+            "grid": grid,
+        }
+    return summarize
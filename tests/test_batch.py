@@ -0,0 +1,75 @@
+import os
+import re
+
+import openpyxl
+import pytest
+
+from wafermap_deliver.batch import find_wafer_files, lot_slot_problems, run_batch, write_lot_workbook
+from wafermap_deliver.pipeline import process_file
+
+
+@pytest.fixture
+def lot(make_wafer_csv, tmp_path):
+    """lot(*slots) -> folder of one small wafer per slot (None: no SLOT value)."""
+    def make(*slots):
+        for i, slot in enumerate(slots):
+            path = make_wafer_csv(name=f"w{i}.wmap.csv", dies=600, seed=i, slot=slot or 1)
+            if slot is None:
+                with open(path, encoding="utf-8") as f:
+                    text = re.sub(r"\nSLOT,*\n\d+,", "\nSLOT,\n,", f.read())
+                with open(path, "w", encoding="utf-8") as f:
+                    f.write(text)
+        return str(tmp_path)
+    return make
+
+
+def test_one_workbook_per_wafer(lot):
+    folder = lot(1, 2, 3)
+    messages = []
+    results = run_batch(folder, workers=2, status=messages.append)
+    assert sorted(result.slot for result in results) == [1, 2, 3]
+    for result in results:
+        assert not result.up_to_date
+        sheets = openpyxl.load_workbook(result.out_file, read_only=True).sheetnames
+        assert sheets[1:] == [f"W#{result.slot:02d}_wafermap_by_End_Test_No", "Pivot", "Fallout Limits"]
+
+    again = run_batch(folder, workers=2, status=messages.append)
+    assert all(result.up_to_date for result in again)
+    assert sum("up to date, skipped" in message for message in messages) == 3
+
+
+def test_lot_workbook(lot, tmp_path):
+    folder = lot(2, 1)
+    lot_file = str(tmp_path / "lot.xlsx")
+    results = run_batch(folder, lot_file=lot_file, workers=2, status=lambda message: None)
+    assert all(result.out_file is None for result in results)
+    assert not [path for path in os.listdir(folder) if path.endswith(".wmap.xlsx")]
+    wb = openpyxl.load_workbook(lot_file, read_only=True)
+    assert wb.sheetnames[:3] == ["Lot Summary", "Lot_Fail_Rate_Map", "Lot_Top_ET_Map"]
+    for slot in ("01", "02"):
+        for sheet in ("Fallout", "Fallout_Limits", "wafermap_by_End_Test_No"):
+            assert f"W#{slot}_{sheet}" in wb.sheetnames
+    summary = list(wb["Lot Summary"].iter_rows(min_row=2, values_only=True))
+    assert [row[:2] for row in summary] == [("w1.wmap.csv", 1), ("w0.wmap.csv", 2)]
+
+
+@pytest.mark.parametrize("slots, problem", [((1, None), "w1.wmap.csv has no SLOT value"),
+                                            ((3, 3), "W#03 is the SLOT of w0.wmap.csv, w1.wmap.csv")])
+def test_lot_workbook_needs_distinct_slots(lot, tmp_path, slots, problem):
+    folder = lot(*slots)
+    results = [process_file(path, write=False) for path in find_wafer_files(folder)]
+    assert lot_slot_problems(results) == [problem]
+    lot_file = str(tmp_path / "lot.xlsx")
+    with pytest.raises(ValueError, match="Cannot build one lot workbook"):
+        write_lot_workbook(results, lot_file)
+    assert not os.path.exists(lot_file)
+
+
+def test_failed_wafers_are_reported_and_skipped(lot):
+    folder = lot(1, 2)
+    with open(os.path.join(folder, "broken.wmap.csv"), "w", encoding="utf-8") as f:
+        f.write("not,a,wafer\n")
+    messages = []
+    results = run_batch(folder, workers=2, status=messages.append)
+    assert len(results) == 2
+    assert any(message.startswith("❌ broken.wmap.csv") for message in messages)
@@ -0,0 +1,84 @@
+import numpy as np
+import pytest
+
+from wafermap_deliver.bench import STAGES, bench_case, compare_reports, load_report, save_report
+from wafermap_deliver.cli import main
+from wafermap_deliver.parser import parse_wmap_csv
+from wafermap_deliver.synthetic import FAIL_MARKS, PASS_MARK, write_synthetic_wafer
+
+
+def _wafer(tmp_path, name="synth.wmap.csv", **shape):
+    return parse_wmap_csv(write_synthetic_wafer(str(tmp_path / name), **{"dies": 2000, **shape}))
+
+
+def test_generator_shape(tmp_path):
+    wafer = _wafer(tmp_path, dies=2000, fail_rate=0.2, et_count=20, limit_rows=40, slot=7)
+    assert wafer.die_count == 2000 and wafer.slot == 7
+    assert len(wafer.limit_rows) == 40
+    x, y = wafer.dies["X"], wafer.dies["Y"]
+    assert len(set(zip(x.tolist(), y.tolist()))) == 2000  # one die per grid cell
+    et = wafer.dies["ET"]
+    fails = et[et != 0]
+    assert 1 <= len(np.unique(fails)) <= 20
+    assert abs(len(fails) / 2000 - 0.2) < 0.05
+    assert set(wafer.c1_mark_values()) <= set(FAIL_MARKS + PASS_MARK)
+    # ~10% of the fail ETs are not in the limit table
+    assert len(wafer.limits.index_of([str(e) for e in np.unique(fails)]) < 0) >= 1
+
+
+def test_generator_is_deterministic(tmp_path):
+    a = write_synthetic_wafer(str(tmp_path / "a.wmap.csv"), dies=500, seed=5)
+    b = write_synthetic_wafer(str(tmp_path / "b.wmap.csv"), dies=500, seed=5)
+    c = write_synthetic_wafer(str(tmp_path / "c.wmap.csv"), dies=500, seed=6)
+    with open(a, "rb") as fa, open(b, "rb") as fb, open(c, "rb") as fc:
+        first = fa.read()
+        assert first == fb.read() and first != fc.read()
+
+
+def test_edge_ring_fails_more_often(tmp_path):
+    wafer = _wafer(tmp_path, dies=20000, fail_rate=0.1)
+    x, y = wafer.dies["X"].astype(float), wafer.dies["Y"].astype(float)
+    dist = np.hypot(x - x.mean(), y - y.mean())
+    failed = wafer.dies["ET"] != 0
+    edge = dist > np.percentile(dist, 95)
+    assert failed[edge].mean() > 2 * failed[~edge].mean()
+
+
+@pytest.mark.parametrize("shape", [{"et_count": 0}, {"limit_rows": 0}, {"dies": 1}])
+def test_generator_edge_cases(tmp_path, shape):
+    wafer = _wafer(tmp_path, **shape)
+    assert wafer.die_count == shape.get("dies", 2000)
+
+
+def test_bench_case_times_every_stage(tmp_path):
+    csv_path = write_synthetic_wafer(str(tmp_path / "synth.wmap.csv"), dies=300)
+    results = bench_case(csv_path, str(tmp_path))
+    assert list(results) == list(STAGES)
+    assert all(stage["seconds"] >= 0 and stage["peak_mib"] > 0 for stage in results.values())
+    assert "peak_mib" not in bench_case(csv_path, str(tmp_path), memory=False)["parse"]
+
+
+def _report(**seconds):
+    stages = {name: {"seconds": value} for name, value in seconds.items()}
+    return {"cases": [{"params": {"dies": 7458, "fail_rate": 0.1}, "stages": stages}]}
+
+
+def test_compare_reports(tmp_path):
+    path = str(tmp_path / "baseline.json")
+    save_report(_report(parse=1.0, convert=0.01, fallout=0.5), path)
+    baseline = load_report(path)
+    lines, regressions = compare_reports(_report(parse=1.5, convert=0.03, fallout=0.4), baseline)
+    assert regressions == [(7458, "parse", pytest.approx(0.5))]  # convert is too fast to call
+    assert any(line.startswith("parse") and line.endswith("⚠️") for line in lines)
+
+    other = {"cases": [{"params": {"dies": 50000}, "stages": {}}]}
+    lines, regressions = compare_reports(other, baseline)
+    assert lines == ["50000 dies: not in the baseline"] and regressions == []
+
+
+def test_synth_command(tmp_path, capsys):
+    out = str(tmp_path / "cli.wmap.csv")
+    assert main(["synth", out, "--dies", "800", "--slot", "3"]) == 0
+    assert "Synthetic wafer with 800 dies saved" in capsys.readouterr().out
+    wafer = parse_wmap_csv(out)
+    assert wafer.die_count == 800 and wafer.slot == 3
@@ -0,0 +1,80 @@
+import os
+
+from wafermap_deliver.cache import cache_path, load_wafer, read_cache
+from wafermap_deliver.metrics import collect
+
+
+def _load(path, **kwargs):
+    # (wafer, whether the CSV was parsed)
+    with collect("load") as metrics:
+        wafer = load_wafer(path, **kwargs)
+    return wafer, any(p.endswith("parse CSV") for p, _, _ in metrics.spans)
+
+
+def test_second_load_comes_from_the_cache(make_wafer_csv, outputs):
+    path = make_wafer_csv()
+    first, parsed = _load(path)
+    assert parsed and os.path.isdir(cache_path(path))
+    second, parsed = _load(path)
+    assert not parsed
+    assert outputs(second) == outputs(first)
+    assert second.digest == first.digest
+
+
+def test_cache_hit_replays_the_rows(make_wafer_csv):
+    path = make_wafer_csv()
+    expected = list(load_wafer(path).iter_rows())
+    rows = []
+    load_wafer(path, row_sink=rows.append)
+    assert rows == expected
+
+
+def test_touched_csv_is_hashed_not_parsed(make_wafer_csv):
+    path = make_wafer_csv()
+    load_wafer(path)
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+    _, parsed = _load(path)
+    assert not parsed
+
+
+def test_edited_csv_is_parsed_again(make_wafer_csv):
+    path = make_wafer_csv()
+    before, _ = _load(path)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write("99,99,1,1,NG,48,H,0,,0,1001\n")
+    after, parsed = _load(path)
+    assert parsed
+    assert after.die_count == before.die_count + 1
+    assert after.digest != before.digest
+
+
+def test_no_cache(make_wafer_csv):
+    path = make_wafer_csv()
+    _, parsed = _load(path, use_cache=False)
+    assert parsed and not os.path.exists(cache_path(path))
+
+
+def test_cache_dir(make_wafer_csv, tmp_path):
+    path = make_wafer_csv()
+    cache_dir = str(tmp_path / "caches")
+    load_wafer(path, cache_dir=cache_dir)
+    assert os.listdir(cache_dir) == [os.path.basename(path) + ".cache"]
+    assert read_cache(path, cache_dir) is not None and read_cache(path) is None
+
+
+def test_unwritable_cache_is_skipped(make_wafer_csv, tmp_path):
+    path = make_wafer_csv()
+    blocked = tmp_path / "not a folder"
+    blocked.write_text("")
+    wafer, parsed = _load(path, cache_dir=str(blocked))
+    assert parsed and wafer.die_count == 1500
+
+
+def test_half_written_cache_is_ignored(make_wafer_csv):
+    path = make_wafer_csv()
+    load_wafer(path)
+    os.remove(os.path.join(cache_path(path), "meta.json"))  # written last, so a crash mid-write leaves none
+    assert read_cache(path) is None
+    _, parsed = _load(path)
+    assert parsed
@@ -0,0 +1,72 @@
+import os
+
+import pytest
+
+from wafermap_deliver import chunked
+from wafermap_deliver.chunked import chunk_ranges, parse_parallel, scan_die_stats
+from wafermap_deliver.fallout import fallout_table
+from wafermap_deliver.metrics import collect
+from wafermap_deliver.parser import parse_wmap_csv, read_header
+from wafermap_deliver.pipeline import default_c1_mark
+from wafermap_deliver.wafermap import build_wafermap_grid
+
+CHUNK = 4096  # a few dozen chunks for a 1500-die wafer
+
+
+@pytest.fixture(autouse=True)
+def always_parallel(monkeypatch):
+    # The test wafers are far below the size where a pool pays off
+    monkeypatch.setattr(chunked, "PARALLEL_MIN_BYTES", 0)
+
+
+def test_chunks_cover_the_die_rows(wafer_csv):
+    _, start = read_header(wafer_csv)
+    ranges = chunk_ranges(wafer_csv, start, CHUNK)
+    with open(wafer_csv, "rb") as f:
+        data = f.read()
+    bounds = [start] + [end for _, end, _ in ranges]
+    assert [begin for begin, _, _ in ranges] == bounds[:-1]
+    assert bounds[-1] == len(data)
+    assert all(data[end - 1:end] == b"\n" for _, end, _ in ranges)
+    assert sum(lines for _, _, lines in ranges) == data[start:].count(b"\n")
+
+
+def test_parallel_matches_single_pass(wafer_csv, outputs):
+    serial = parse_wmap_csv(wafer_csv)
+    assert outputs(parse_parallel(wafer_csv, jobs=2, chunk_bytes=CHUNK)) == outputs(serial)
+
+
+def test_parallel_row_sink_gets_the_sheet_rows(wafer_csv):
+    rows = []
+    parse_parallel(wafer_csv, jobs=2, row_sink=rows.append, chunk_bytes=CHUNK)
+    assert rows == list(parse_wmap_csv(wafer_csv).iter_rows())
+
+
+@pytest.mark.parametrize("variant, fallback", [("plain", 0), ("negative", 0), ("long_mark", 1)])
+def test_only_wide_marks_fall_back_to_one_pass(make_wafer_csv, variant, fallback):
+    # Wide marks don't fit the shared text columns, so the whole file is parsed in one pass
+    with collect("parse") as metrics:
+        parse_parallel(make_wafer_csv(variant), jobs=2, chunk_bytes=CHUNK)
+    assert metrics.counters["chunked_parse_fallback"] == fallback
+
+
+def test_scan_matches_the_full_table(wafer_csv):
+    wafer = parse_wmap_csv(wafer_csv)
+    header, stats = scan_die_stats(wafer_csv, jobs=2, chunk_bytes=CHUNK)
+    assert stats.dies == wafer.die_count
+    assert stats.c1_mark_values() == wafer.c1_mark_values()
+    for mark in wafer.c1_mark_values():
+        assert stats.fallout_table(mark, header.theoretical_num) == fallout_table(wafer, mark)
+    if not wafer.die_count:
+        with pytest.raises(ValueError):
+            stats.wafermap_grid()
+        return
+    assert stats.default_c1_mark() == default_c1_mark(wafer)
+    for ours, theirs in zip(stats.wafermap_grid(), build_wafermap_grid(wafer)):
+        assert ours.tolist() == theirs.tolist()
+
+
+def test_single_job_skips_the_pool(make_wafer_csv, outputs, monkeypatch):
+    path = make_wafer_csv()
+    monkeypatch.setattr(chunked, "PARALLEL_MIN_BYTES", os.path.getsize(path) + 1)
+    assert outputs(parse_parallel(path, jobs=2, chunk_bytes=CHUNK)) == outputs(parse_wmap_csv(path))
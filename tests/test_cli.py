@@ -0,0 +1,68 @@
+import os
+
+import openpyxl
+import pytest
+
+from wafermap_deliver.cli import main
+from wafermap_deliver.pipeline import default_c1_mark, output_path, sheet_title
+from wafermap_deliver.parser import parse_wmap_csv
+
+
+def _sheets(path):
+    wb = openpyxl.load_workbook(path, read_only=True)
+    try:
+        return wb.sheetnames
+    finally:
+        wb.close()
+
+
+def test_convert_writes_the_data_sheet(make_wafer_csv, capsys):
+    path = make_wafer_csv()
+    assert main(["convert", path]) == 0
+    assert _sheets(output_path(path)) == [sheet_title(path)]
+    out = capsys.readouterr().out
+    assert "Conversion complete" in out
+    assert "C1_MARK values: " + " ".join(parse_wmap_csv(path).c1_mark_values()) in out
+
+
+def test_all_runs_every_stage(make_wafer_csv, tmp_path, capsys):
+    path = make_wafer_csv()
+    out_file = str(tmp_path / "out" / "wafer.xlsx")
+    os.makedirs(os.path.dirname(out_file))
+    assert main(["all", path, "-o", out_file, "--all-marks"]) == 0
+    assert _sheets(out_file) == [sheet_title(path), "W#01_wafermap_by_End_Test_No", "Pivot",
+                                 "Fallout Summary", "Fallout Limits"]
+    out = capsys.readouterr().out
+    assert f"Applied filter: {default_c1_mark(parse_wmap_csv(path))}" in out
+    assert "Wafermap created on W#01_wafermap_by_End_Test_No sheet." in out
+
+
+def test_stage_commands_build_on_the_converted_workbook(make_wafer_csv):
+    path = make_wafer_csv()
+    mark = parse_wmap_csv(path).c1_mark_values()[-1]
+    assert main(["fallout", path, "--mark", mark]) == 0
+    assert main(["map", path]) == 0
+    wb = openpyxl.load_workbook(output_path(path), read_only=True)
+    assert wb.sheetnames == [sheet_title(path), "W#01_wafermap_by_End_Test_No", "Pivot"]
+    assert wb["Pivot"]["B1"].value == mark
+    wb.close()
+
+
+def test_scan_without_a_workbook(make_wafer_csv, capsys):
+    path = make_wafer_csv()
+    assert main(["scan", path]) == 0
+    assert "1,500 dies, W#01" in capsys.readouterr().out
+    assert not os.path.exists(output_path(path))
+
+
+@pytest.mark.parametrize("argv", [["convert", "missing.wmap.csv"], ["fallout", "{csv}", "--mark", "no such mark"]])
+def test_errors_exit_with_1(make_wafer_csv, capsys, argv):
+    path = make_wafer_csv()
+    assert main([arg.format(csv=path) for arg in argv]) == 1
+    assert capsys.readouterr().err.startswith("❌ Error: ")
+
+
+def test_help_needs_a_command(capsys):
+    with pytest.raises(SystemExit) as exit_info:
+        main([])
+    assert exit_info.value.code == 2
@@ -0,0 +1,87 @@
+import numpy as np
+import pytest
+
+from wafermap_deliver.cache import read_cache, write_cache
+from wafermap_deliver.dietable import DieTable, encode_first_seen, encode_sorted, narrow_int
+from wafermap_deliver.parser import parse_wmap_csv
+
+
+@pytest.fixture
+def columns():
+    return {
+        "X": np.array([-3, 0, 5, 120, -3], dtype=np.int32),
+        "INDEX": np.array([1, 1, 1, 1, 1], dtype=np.int32),
+        "C1": np.array([47, 70000, 47, 48, 47], dtype=np.int32),
+        "C1_MARK": np.array(["/", "H", "", "12", "H"]),
+        "ET": np.array([0, 1007, 0, 50001, 1003], dtype=np.int32),
+    }
+
+
+def test_columns_round_trip(columns):
+    table = DieTable.from_columns(columns)
+    assert table.rows == 5
+    assert list(table) == list(columns)
+    for name, col in columns.items():
+        assert table[name].tolist() == col.tolist()
+        assert table.decode(name, 1, 4).tolist() == col[1:4].tolist()
+
+
+def test_narrow_types_and_codes(columns):
+    table = DieTable.from_columns(columns)
+    assert table.codes("X").dtype == np.int8
+    assert table.codes("C1").dtype == np.int32
+    assert table.is_coded("C1_MARK") and table.is_coded("ET") and not table.is_coded("X")
+    assert table.codes("C1_MARK").dtype == np.uint8
+    assert table.categories("C1_MARK").tolist() == ["/", "H", "", "12"]  # first appearance
+    assert table.categories("ET").tolist() == [0, 1003, 1007, 50001]     # sorted
+    assert table.code_of("ET", 1007) == 2
+    assert table.code_of("ET", 9999) is None
+    assert table.nbytes < sum(col.nbytes for col in columns.values())
+
+
+def test_sorted_codes_follow_value_order():
+    col = np.array([900, -7, 40, 40, 2 ** 30, -7])  # spans more than DENSE_RANGE
+    categories, codes = encode_sorted(col)
+    assert categories.tolist() == sorted(set(col.tolist()))
+    assert categories[codes].tolist() == col.tolist()
+    assert np.array_equal(np.argsort(codes, kind="stable"), np.argsort(col, kind="stable"))
+
+
+def test_text_codes_keep_whole_values():
+    col = np.array(["ab", "a", "", "ba", "ab", "é", "a"])
+    categories, codes = encode_first_seen(col)
+    assert categories.tolist() == ["ab", "a", "", "ba", "é"]
+    assert categories[codes].tolist() == col.tolist()
+
+
+def test_empty_columns():
+    table = DieTable.from_columns({"X": np.zeros(0, dtype=np.int32), "C1_MARK": np.array([], dtype="U1")})
+    assert table.rows == 0
+    assert table["X"].tolist() == [] and table["C1_MARK"].tolist() == []
+    assert narrow_int(np.zeros(0, dtype=np.int64)).dtype == np.int16
+    assert DieTable().rows == 0
+
+
+def test_cache_round_trip(wafer_csv, tmp_path):
+    wafer = parse_wmap_csv(wafer_csv)
+    cache_dir = tmp_path / "cache"
+    write_cache(wafer, str(cache_dir))
+    cached = read_cache(wafer_csv, str(cache_dir))
+    assert cached is not None
+    assert list(cached.dies) == list(wafer.dies)
+    for name in wafer.dies:
+        assert cached.dies.codes(name).dtype == wafer.dies.codes(name).dtype
+        assert cached.dies[name].tolist() == wafer.dies[name].tolist()
+        if wafer.dies.is_coded(name):
+            assert cached.dies.categories(name).tolist() == wafer.dies.categories(name).tolist()
+    assert list(cached.iter_rows()) == list(wafer.iter_rows())
+    assert cached.digest == wafer.digest
+
+
+def test_cache_goes_stale_with_the_csv(make_wafer_csv, tmp_path):
+    path = make_wafer_csv()
+    cache_dir = str(tmp_path / "cache")
+    write_cache(parse_wmap_csv(path), cache_dir)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write("99,99,1,1,NG,48,H,0,,0,1001\n")
+    assert read_cache(path, cache_dir) is None
@@ -0,0 +1,83 @@
+from collections import Counter
+
+import openpyxl
+import pytest
+
+from wafermap_deliver.fallout import et_counts, fallout_table, fallout_tables, write_fallout_summary_sheet
+from wafermap_deliver.parser import parse_wmap_csv
+
+from conftest import DEMO
+
+# The DEMO workbook's Pivot sheet was built by Excel (PivotCache, C1_MARK = H),
+# so it is the reference for the numpy group-by.
+
+
+@pytest.fixture(scope="module")
+def demo():
+    wb = openpyxl.load_workbook(DEMO + ".xlsx", read_only=True)
+    pivot = [list(row) for row in wb["Pivot"].iter_rows(max_col=6, values_only=True)]
+    wb.close()
+    return parse_wmap_csv(DEMO + ".csv"), pivot
+
+
+def test_fallout_table_matches_the_excel_pivot(demo):
+    wafer, pivot = demo
+    table = fallout_table(wafer, pivot[0][1])
+    assert table[0] == [pivot[2][3], pivot[2][4], pivot[2][5]]
+    excel = [row[3:6] for row in pivot[3:] if row[3] is not None]
+    ours = [[et, count, round(fallout, 4)] for et, count, fallout in table[1:-1]] + [table[-1]]
+    assert ours == excel
+
+
+def test_et_counts_match_the_pivot_row_labels(demo):
+    wafer, pivot = demo
+    ets, counts = et_counts(wafer, pivot[0][1])
+    excel = {row[0]: row[1] for row in pivot[3:] if row[0] not in (None, "Grand Total")}
+    assert dict(zip(ets.tolist(), counts.tolist())) == excel
+    assert ets.tolist() == sorted(ets.tolist())
+    assert [row[1] for row in pivot if row[0] == "Grand Total"] == [int(counts.sum())]
+
+
+def test_fallout_table_by_hand(make_wafer_csv):
+    wafer = parse_wmap_csv(make_wafer_csv())
+    rows = list(zip(wafer.dies["C1_MARK"].tolist(), wafer.dies["ET"].tolist()))
+    for mark in wafer.c1_mark_values():
+        counted = Counter(et for m, et in rows if m.strip() == mark and et != 0)
+        expected = sorted(counted.items(), key=lambda item: (-item[1], item[0]))
+        table = fallout_table(wafer, mark)
+        assert [(et, count) for et, count, _ in table[1:-1]] == expected
+        assert all(fallout == count / wafer.theoretical_num for _, count, fallout in table[1:-1])
+        assert table[-1] == ["Grand Total", wafer.theoretical_num, None]
+
+
+def test_unknown_mark_gives_an_empty_table(make_wafer_csv):
+    wafer = parse_wmap_csv(make_wafer_csv())
+    assert fallout_table(wafer, "no such mark")[1:-1] == []
+
+
+def test_one_group_by_gives_every_marks_table(wafer_csv):
+    wafer = parse_wmap_csv(wafer_csv)
+    tables = fallout_tables(wafer)
+    assert list(tables) == wafer.c1_mark_values()
+    assert tables == {mark: fallout_table(wafer, mark) for mark in wafer.c1_mark_values()}
+
+
+def test_chosen_marks_keep_their_order(make_wafer_csv):
+    wafer = parse_wmap_csv(make_wafer_csv())
+    marks = wafer.c1_mark_values()[:3][::-1]
+    assert list(fallout_tables(wafer, marks)) == marks
+    with pytest.raises(ValueError, match="not found in C1_MARK items"):
+        fallout_tables(wafer, marks + ["no such mark"])
+
+
+def test_summary_sheet_stacks_one_block_per_mark(make_wafer_csv):
+    wafer = parse_wmap_csv(make_wafer_csv())
+    tables = fallout_tables(wafer)
+    ws = write_fallout_summary_sheet(openpyxl.Workbook(), tables)
+    row = 1
+    for mark, table in tables.items():
+        assert ws.cell(row=row, column=1).value == f"C1_MARK: {mark}"
+        block = [[ws.cell(row=row + 1 + i, column=c).value for c in (1, 2, 3)] for i in range(len(table))]
+        assert block == table
+        row += len(table) + 2
+    assert ws.max_row == row - 2
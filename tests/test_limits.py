@@ -0,0 +1,80 @@
+import openpyxl
+
+from wafermap_deliver.cli import main
+from wafermap_deliver.fallout import fallout_table
+from wafermap_deliver.limits import LIMITS_HEADER, annotate_fallout, limit_positions, missing_end_tests
+from wafermap_deliver.parser import parse_wmap_csv
+from wafermap_deliver.pipeline import add_fallout, check_end_test, default_c1_mark
+
+from conftest import DEMO
+
+
+def _search(wafer, et):
+    # The old way: walk the TESTNO column top-down for one End Test No.
+    for row in wafer.limit_rows:
+        if str(row[1]).strip() == str(et).strip():
+            return row
+    return None
+
+
+def test_check_end_test_matches_the_demo_workbook():
+    wb = openpyxl.load_workbook(DEMO + ".xlsx", read_only=True)
+    excel = [list(row) for row in wb["Pivot"].iter_rows(min_row=3, max_row=4, min_col=8, max_col=13,
+                                                         values_only=True)]
+    wb.close()
+    wafer = parse_wmap_csv(DEMO + ".csv")
+    out = openpyxl.Workbook()
+    add_fallout(out, wafer, "H")
+    end_test_no, reference = check_end_test(out, wafer)
+    assert end_test_no == str(excel[1][1])
+    pivot = out["Pivot"]
+    assert [[pivot.cell(row=r, column=c).value for c in range(8, 14)] for r in (3, 4)] == excel
+
+
+def test_every_fallout_et_in_one_lookup(make_wafer_csv):
+    wafer = parse_wmap_csv(make_wafer_csv(limit_rows=30))
+    # Every fail ET on the wafer, so some are in the limit table and some are not
+    ets = [et for et in wafer.dies.categories("ET").tolist() if et != 0]
+    table = [["End Test No.", "Count", "Fallout%"]] + [[et, 1, 0.0] for et in ets] + [["Grand Total", 1, None]]
+    annotated = annotate_fallout(wafer, table)
+    assert annotated[0] == LIMITS_HEADER
+    assert [row[:3] for row in annotated[1:]] == table[1:-1]
+    for row in annotated[1:]:
+        found = _search(wafer, row[0])
+        if found is None:
+            assert row[3:] == ["", "", "", "", "", "No"]
+        else:
+            tsno, _, comment, mode, hilimit, lolimit = [str(v).strip() for v in found]
+            assert row[3:] == [tsno, comment, mode, hilimit, lolimit, "Yes"]
+    assert missing_end_tests(annotated) == [str(row[0]) for row in annotated[1:] if _search(wafer, row[0]) is None]
+    assert any(row[-1] == "No" for row in annotated[1:]) and any(row[-1] == "Yes" for row in annotated[1:])
+
+
+def test_top_n(make_wafer_csv):
+    wafer = parse_wmap_csv(make_wafer_csv())
+    table = fallout_table(wafer, wafer.c1_mark_values()[0])
+    assert annotate_fallout(wafer, table, top=3) == annotate_fallout(wafer, table)[:4]
+
+
+def test_first_repeated_testno_wins(make_wafer_csv):
+    wafer = parse_wmap_csv(make_wafer_csv())
+    first = wafer.limit_rows[0]
+    wafer.limit_rows.append(["T999", first[1], "later copy", "V", "1 V", "0 V"])
+    wafer = type(wafer)(wafer.path, wafer.header, wafer.preamble_rows, wafer.limit_rows, wafer.die_header,
+                        wafer.dies)
+    assert limit_positions(wafer, [first[1], str(first[1]), "nope"]).tolist() == [0, 0, -1]
+    assert wafer.limit_row(f" {first[1]} ") is wafer.limit_rows[0]
+    assert wafer.limit_row(424242) is None
+
+
+def test_check_command_lists_the_missing_end_tests(make_wafer_csv, capsys):
+    path = make_wafer_csv(limit_rows=30)
+    main(["fallout", path])
+    code = main(["check", path, "--top", "5"])
+    out = capsys.readouterr().out
+    wafer = parse_wmap_csv(path)
+    annotated = annotate_fallout(wafer, fallout_table(wafer, default_c1_mark(wafer)), top=5)
+    assert code == (0 if annotated[1][-1] == "Yes" else 1)  # fails when the top ET (Pivot!D4) is missing
+    assert f"Fallout Limits ({len(annotated) - 1} End Test No.):" in out
+    missing = missing_end_tests(annotated)
+    assert missing and f"Not in the TESTNO Column: {', '.join(missing)}" in out
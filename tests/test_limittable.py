@@ -0,0 +1,98 @@
+import math
+
+import numpy as np
+import pytest
+
+from wafermap_deliver.cli import main
+from wafermap_deliver.limittable import LIMIT_CHANGE_HEADER, LimitTable, limit_changes, parse_limit
+from wafermap_deliver.parser import parse_wmap_csv
+
+from conftest import DEMO
+
+
+@pytest.mark.parametrize("text, value, unit", [
+    (" 33.0uA", 33.0e-6, "A"),
+    ("12.3nS", 12.3e-9, "S"),
+    ("-1.42 V", -1.42, "V"),
+    ("0.033mA", 33.0e-6, "A"),
+    ("2.5µA", 2.5e-6, "A"),
+    ("1e3 mV", 1.0, "V"),
+    (".5", 0.5, ""),
+    ("7m", 7.0, "m"),  # a bare "m" is a unit, not a prefix
+    ("3MHz", 3e6, "Hz"),
+])
+def test_parse_limit(text, value, unit):
+    parsed, parsed_unit = parse_limit(text)
+    assert parsed == pytest.approx(value, rel=1e-12) and parsed_unit == unit
+
+
+@pytest.mark.parametrize("text", ["NON", " non ", "", "   "])
+def test_no_limit(text):
+    value, unit = parse_limit(text)
+    assert math.isnan(value) and unit == ""
+
+
+@pytest.mark.parametrize("text", ["abc", "1.2.3V", "uA", "--1V"])
+def test_unrecognised_limit(text):
+    with pytest.raises(ValueError):
+        parse_limit(text)
+
+
+ROWS = [
+    ["T1", "1001", "Leak", "A", " 33.0uA", " 19.1uA"],
+    ["T2", " 1002 ", "Open", "V", "NON", "-1.42 V"],
+    ["T3", "1003", "Short", "A", "NON", "NON"],
+    ["T4", "1004", "Bad", "S", "lots", "1nS"],
+    ["T5", "1002", "Repeat", "V", "9 V", "1 V"],
+]
+
+
+def test_limit_table_columns():
+    table = LimitTable(ROWS)
+    assert len(table) == 5
+    assert table.testno.tolist() == ["1001", "1002", "1003", "1004", "1002"]
+    assert table.hi[0] == pytest.approx(33.0e-6) and table.lo[1] == pytest.approx(-1.42)
+    assert table.hi_unit.tolist()[:2] == ["A", ""] and table.lo_unit[1] == "V"
+    assert table.unparsed == [("1004", "HILIMIT", "lots")]
+    assert table.no_limit.tolist() == [False, False, True, False, False]  # T4 keeps its LOLIMIT
+    band = table.guard_band()
+    assert band[0] == pytest.approx(13.9e-6) and np.isnan(band[1:4]).all() and band[4] == 8.0
+    assert table.describe(0) == ["A", "3.3e-05 A", "1.91e-05 A"]
+    assert table.describe(2) == ["A", "NON", "NON"]
+
+
+def test_index_of_first_match():
+    table = LimitTable(ROWS)
+    assert table.index_of(["1002", "1001", "9999", "1004", ""]).tolist() == [1, 0, -1, 3, -1]
+    assert LimitTable([]).index_of(["1001"]).tolist() == [-1]
+
+
+def test_limit_changes():
+    old = LimitTable(ROWS[:3])
+    new = LimitTable([
+        ["T1", "1001", "Leak", "A", "0.033mA", "19.1uA"],  # same limits, other prefix
+        ["T2", "1002", "Open", "V", "NON", "-1.40 V"],
+        ["T9", "1009", "New", "V", "1 V", "NON"],
+    ])
+    rows = limit_changes(old, new)
+    assert rows[0] == LIMIT_CHANGE_HEADER
+    assert [row[:2] for row in rows[1:]] == [["1002", "changed"], ["1003", "removed"], ["1009", "added"]]
+    assert rows[1][2:] == ["V", "NON", "-1.42 V", "V", "NON", "-1.4 V"]
+    assert limit_changes(old, LimitTable(ROWS[:3])) == [LIMIT_CHANGE_HEADER]
+
+
+def test_demo_limits_all_parse():
+    table = parse_wmap_csv(DEMO + ".csv").limits
+    assert len(table) and table.unparsed == []
+    i = int(table.index_of(["50021"])[0])
+    assert table.describe(i) == ["A", "2.33e-05 A", "1.91e-05 A"]
+
+
+def test_limits_command(make_wafer_csv, capsys):
+    path = make_wafer_csv()
+    assert main(["limits", path]) == 0
+    out = capsys.readouterr().out
+    assert "Guard band" in out and "⚠️" not in out
+    other = make_wafer_csv(name="other.wmap.csv", seed=4)
+    assert main(["limits", path, other]) == 0
+    assert "other.wmap.csv vs plain.wmap.csv:" in capsys.readouterr().out
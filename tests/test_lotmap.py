@@ -0,0 +1,73 @@
+import numpy as np
+import openpyxl
+import pytest
+
+from wafermap_deliver.lotmap import FAIL_RATE_SHEET, TOP_ET_SHEET, LotStack, write_lot_map_sheets
+from wafermap_deliver.parser import parse_wmap_csv
+from wafermap_deliver.wafermap import EMPTY, build_wafermap_grid
+
+E = EMPTY
+
+
+def _stack(*grids):
+    # grids: (x_labels, y_labels, rows) per wafer
+    stack = LotStack()
+    for x_labels, y_labels, rows in grids:
+        stack.add_grid(np.array(x_labels), np.array(y_labels), np.array(rows, dtype=np.int64))
+    return stack
+
+
+def test_counts_over_a_growing_bounding_box():
+    stack = _stack(([0, 1], [0], [[0, 7]]),
+                   ([1, 2], [-1, 0], [[E, 5], [7, 0]]))
+    x_labels, y_labels = stack.labels()
+    assert x_labels.tolist() == [0, 1, 2] and y_labels.tolist() == [-1, 0]
+    assert stack.tested.tolist() == [[0, 0, 1], [1, 2, 1]]
+    assert stack.failed.tolist() == [[0, 0, 1], [0, 2, 0]]
+    rate = stack.fail_rate()
+    assert np.isnan(rate[0, 0]) and rate[1].tolist() == [0.0, 1.0, 0.0]
+    assert stack.wafers == 2
+
+
+def test_top_et_is_the_most_frequent_fail():
+    stack = _stack(([0], [0], [[9]]), ([0], [0], [[4]]), ([0], [0], [[9]]))
+    assert stack.top_et().tolist() == [[9]]
+
+
+def test_top_et_ties_go_to_the_lowest_et():
+    stack = _stack(([0, 1], [0], [[9, 0]]), ([0, 1], [0], [[4, 0]]), ([0, 1], [0], [[30, 0]]))
+    assert stack.top_et().tolist() == [[4, 0]]
+    # Same counts whichever order the wafers came in
+    stack = _stack(([0, 1], [0], [[30, 0]]), ([0, 1], [0], [[9, 0]]), ([0, 1], [0], [[4, 0]]))
+    assert stack.top_et().tolist() == [[4, 0]]
+
+
+def test_top_et_marks_passing_and_missing_dies():
+    stack = _stack(([0, 2], [0], [[0, 3]]))
+    assert stack.top_et().tolist() == [[0, E, 3]]
+
+
+def test_stack_of_real_wafers(make_wafer_csv):
+    wafers = [parse_wmap_csv(make_wafer_csv(name=f"w{seed}.wmap.csv", seed=seed)) for seed in (1, 2, 3)]
+    stack = LotStack()
+    for wafer in wafers:
+        stack.add_wafer(wafer)
+    x_labels, y_labels = stack.labels()
+    tested = np.zeros(stack.shape, dtype=int)
+    for wafer in wafers:
+        xs, ys, grid = build_wafermap_grid(wafer)
+        for r, y in enumerate(ys.tolist()):
+            for c, x in enumerate(xs.tolist()):
+                tested[y - y_labels[0], x - x_labels[0]] += grid[r, c] != EMPTY
+    assert stack.tested.tolist() == tested.tolist()
+
+
+def test_lot_sheets(make_wafer_csv):
+    stack = LotStack()
+    stack.add_wafer(parse_wmap_csv(make_wafer_csv()))
+    wb = openpyxl.Workbook()
+    write_lot_map_sheets(wb, stack)
+    assert wb.sheetnames[1:] == [FAIL_RATE_SHEET, TOP_ET_SHEET]
+    assert len(wb[FAIL_RATE_SHEET].conditional_formatting) == 1
+    with pytest.raises(ValueError):
+        write_lot_map_sheets(openpyxl.Workbook(), LotStack())
@@ -0,0 +1,89 @@
+import json
+import os
+import time
+
+from wafermap_deliver.cli import main
+from wafermap_deliver.metrics import collect, count, span
+
+
+def _records(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_spans_nest_in_start_order():
+    with collect("run") as metrics:
+        with span("parse"):
+            with span("read"):
+                time.sleep(0.01)
+        with span("save"):
+            count("bytes_written", 10)
+            count("bytes_written", 5)
+            count("files")
+    assert [(path, depth) for path, depth, _ in metrics.spans] == [
+        ("run", 0), ("run/parse", 1), ("run/parse/read", 2), ("run/save", 1)]
+    seconds = {path: s for path, _, s in metrics.spans}
+    assert seconds["run"] >= seconds["run/parse"] >= seconds["run/parse/read"] >= 0.01
+    assert metrics.counters == {"bytes_written": 15, "files": 1}
+
+
+def test_nothing_is_recorded_outside_collect():
+    with span("loose"):
+        count("dies", 3)
+    with collect("outer") as outer:
+        with collect("inner") as inner:
+            count("dies")
+        count("dies", 2)
+    assert inner.counters == {"dies": 1} and outer.counters == {"dies": 2}
+    assert [path for path, _, _ in outer.spans] == ["outer"]
+
+
+def test_span_survives_an_error():
+    with collect("run") as metrics:
+        try:
+            with span("fails"):
+                raise ValueError
+        except ValueError:
+            pass
+        with span("next"):
+            pass
+    assert [path for path, _, _ in metrics.spans] == ["run", "run/fails", "run/next"]
+
+
+def test_breakdown_lines():
+    with collect("run") as metrics:
+        with span("step"):
+            count("dies", 1234567)
+    lines = metrics.breakdown_lines()
+    assert lines[0].split() == ["Step", "Seconds", "Share"]
+    assert lines[1].split()[0] == "run" and lines[1].endswith("100%")
+    assert lines[2].startswith("  step")
+    assert lines[-1] == "dies: 1,234,567"
+
+
+def test_metrics_file_gets_one_line_per_span(tmp_path):
+    path = str(tmp_path / "metrics.jsonl")
+    for run in ("first", "second"):
+        with collect(run, path):
+            with span("stage"):
+                count("dies", 7)
+    records = _records(path)
+    assert [(r["run"], r.get("span")) for r in records] == [
+        ("first", "first"), ("first", "first/stage"), ("first", None),
+        ("second", "second"), ("second", "second/stage"), ("second", None)]
+    assert records[2]["counters"] == {"dies": 7}
+    assert all(r["seconds"] >= 0 for r in records if "span" in r)
+
+
+def test_cli_timings_and_metrics(make_wafer_csv, tmp_path, capsys):
+    path = make_wafer_csv()
+    metrics_file = str(tmp_path / "cli.jsonl")
+    assert main(["--timings", "--metrics", metrics_file, "--no-cache", "all", path]) == 0
+    out = capsys.readouterr().out
+    assert "⏱️ Timing breakdown:" in out
+    records = _records(metrics_file)
+    spans = [r["span"] for r in records if "span" in r]
+    assert spans[0] == "all" and {"all/fallout", "all/end test check", "all/wafermap"} <= set(spans)
+    counters = records[-1]["counters"]
+    assert counters["dies"] == 1500 and counters["bytes_read"] == os.path.getsize(path)
+    assert counters["bytes_written"] > 0 and counters["cells_styled"] > 0
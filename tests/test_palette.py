@@ -0,0 +1,41 @@
+import subprocess
+import sys
+
+from wafermap_deliver import pipeline
+from wafermap_deliver.palette import FAIL_HIGH, FAIL_LOW, PASS_COLOR, et_color, et_fill, et_hex
+from wafermap_deliver.parser import parse_wmap_csv
+
+# Colors every wafer and lot has been drawn with since PALETTE_VERSION 1; a
+# change here must come with a PALETTE_VERSION bump.
+PINNED = {0: "00FF00", 1003: "D6FEF3", 10057: "BDE8D8", 50021: "ADE5BF"}
+
+
+def test_pinned_colors():
+    assert {et: et_hex(et) for et in PINNED} == PINNED
+    assert et_color(0) == PASS_COLOR
+
+
+def test_same_colors_in_a_fresh_process():
+    # Nothing may depend on str hash randomization or on the order ETs are first seen
+    code = "from wafermap_deliver.palette import et_hex; print(' '.join(et_hex(et) for et in (50021, 1003, 0)))"
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True,
+                         env={"PYTHONHASHSEED": "123", "PYTHONPATH": ":".join(sys.path)}).stdout
+    assert out.split() == [PINNED[50021], PINNED[1003], PINNED[0]]
+
+
+def test_fail_colors_stay_light():
+    for et in range(1, 3000):
+        assert all(FAIL_LOW <= channel <= FAIL_HIGH for channel in et_color(et))
+    assert et_color("1003") == et_color(1003) == et_color(1003.0)
+
+
+def test_fills_are_shared():
+    assert et_fill(1003) is et_fill(1003)
+    assert et_fill(1003).fgColor.rgb == "00" + PINNED[1003]
+
+
+def test_palette_version_invalidates_wafermap_stamps(make_wafer_csv, monkeypatch):
+    wafer = parse_wmap_csv(make_wafer_csv())
+    before = pipeline.wafermap_key(wafer)
+    monkeypatch.setattr(pipeline, "PALETTE_VERSION", pipeline.PALETTE_VERSION + 1)
+    assert pipeline.wafermap_key(wafer) != before
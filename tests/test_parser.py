@@ -0,0 +1,55 @@
+import pytest
+
+from wafermap_deliver.metrics import collect
+from wafermap_deliver.parser import parse_wmap_csv
+from wafermap_deliver.wafermap import build_wafermap_grid
+
+from conftest import LONG_MARK
+
+
+def test_fast_path_matches_csv_path(wafer_csv, outputs):
+    assert outputs(parse_wmap_csv(wafer_csv)) == outputs(parse_wmap_csv(wafer_csv, fast=False))
+
+
+@pytest.mark.parametrize("fast", [True, False])
+def test_row_sink_gets_the_sheet_rows(wafer_csv, fast):
+    rows = []
+    wafer = parse_wmap_csv(wafer_csv, row_sink=rows.append, fast=fast)
+    assert rows == list(wafer.iter_rows())
+
+
+@pytest.mark.parametrize("variant, fallback", [("plain", 0), ("crlf", 0), ("negative", 0), ("no_dies", 0),
+                                               ("long_mark", 1)])
+def test_only_wide_marks_leave_the_fast_path(make_wafer_csv, variant, fallback):
+    with collect("parse") as metrics:
+        parse_wmap_csv(make_wafer_csv(variant))
+    assert metrics.counters["die_table_csv_fallback"] == fallback
+
+
+def test_crlf_parses_like_lf(make_wafer_csv, outputs):
+    lf = outputs(parse_wmap_csv(make_wafer_csv("plain")))
+    crlf = outputs(parse_wmap_csv(make_wafer_csv("crlf")))
+    assert crlf == lf
+
+
+def test_negative_coordinates(make_wafer_csv):
+    wafer = parse_wmap_csv(make_wafer_csv("negative"))
+    x_labels, y_labels, _ = build_wafermap_grid(wafer)
+    assert x_labels.min() < 0 < x_labels.max()
+    assert y_labels.min() < 0 < y_labels.max()
+    assert wafer.dies["X"].min() == x_labels.min()
+
+
+def test_empty_die_table(make_wafer_csv):
+    wafer = parse_wmap_csv(make_wafer_csv("no_dies"))
+    assert wafer.die_header is not None
+    assert wafer.die_count == 0
+    assert wafer.c1_mark_values() == []
+    with pytest.raises(ValueError):
+        build_wafermap_grid(wafer)
+
+
+def test_wide_marks_are_kept_whole(make_wafer_csv):
+    wafer = parse_wmap_csv(make_wafer_csv("long_mark"))
+    assert LONG_MARK in wafer.c1_mark_values()
+    assert wafer.die_count == 1500
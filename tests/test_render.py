@@ -0,0 +1,122 @@
+import importlib.util
+import struct
+import xml.etree.ElementTree as ET
+import zlib
+
+import numpy as np
+import openpyxl
+import pytest
+
+from wafermap_deliver.cli import main
+from wafermap_deliver.metrics import collect
+from wafermap_deliver.palette import et_color, et_hex
+from wafermap_deliver.parser import parse_wmap_csv
+from wafermap_deliver.render import (AXIS_TEXT, BACKGROUND, GUTTER, embed_image, grid_rgb, png_bytes,
+                                     render_wafermap, svg_text, wafermap_rgb)
+from wafermap_deliver.wafermap import EMPTY, build_wafermap_grid
+
+E = EMPTY
+SVG = "{http://www.w3.org/2000/svg}"
+
+
+def _decode_png(data):
+    # Just enough of a PNG reader for what png_bytes writes: 8-bit RGB, filter 0 on every row
+    assert data[:8] == b"\x89PNG\r\n\x1a\n"
+    pos, chunks = 8, {}
+    while pos < len(data):
+        (length,), kind = struct.unpack(">I", data[pos:pos + 4]), data[pos + 4:pos + 8]
+        body = data[pos + 8:pos + 8 + length]
+        assert struct.unpack(">I", data[pos + 8 + length:pos + 12 + length])[0] == zlib.crc32(kind + body)
+        chunks[kind] = chunks.get(kind, b"") + body
+        pos += 12 + length
+    w, h, depth, color, _, _, _ = struct.unpack(">IIBBBBB", chunks[b"IHDR"])
+    assert (depth, color) == (8, 2)
+    raw = np.frombuffer(zlib.decompress(chunks[b"IDAT"]), dtype=np.uint8).reshape(h, 1 + 3 * w)
+    assert not raw[:, 0].any()
+    return raw[:, 1:].reshape(h, w, 3)
+
+
+GRID = np.array([[E, 0, 1003], [50021, 10057, E]], dtype=np.int64)
+X, Y = np.array([10, 11, 12]), np.array([-1, -2])
+
+
+def test_every_die_gets_its_palette_color():
+    rgb = grid_rgb(GRID, die_px=8)
+    assert rgb.shape == (16, 24, 3) and rgb.dtype == np.uint8
+    for r, c in np.ndindex(GRID.shape):
+        die = rgb[r * 8:r * 8 + 7, c * 8:c * 8 + 7]  # the last row/column is the gutter
+        expected = BACKGROUND if GRID[r, c] == E else et_color(int(GRID[r, c]))
+        assert (die == expected).all()
+    assert (rgb[7::8] == GUTTER).all() and (rgb[:, 7::8] == GUTTER).all()
+    assert not (grid_rgb(GRID, die_px=3) == GUTTER).all(axis=2).any()  # no gutter on small dies
+
+
+def test_labels_on_all_four_sides():
+    die_px = 8
+    canvas = wafermap_rgb(X, Y, GRID, die_px)
+    text = (canvas == AXIS_TEXT).all(axis=2)
+    h, w = GRID.shape[0] * die_px, GRID.shape[1] * die_px
+    band_h, band_w = (canvas.shape[0] - h) // 2, (canvas.shape[1] - w) // 2
+    assert (canvas[band_h:band_h + h, band_w:band_w + w] == grid_rgb(GRID, die_px)).all()
+    # The bottom labels mirror the top ones, the right labels the left ones
+    assert (text[:band_h].any(axis=0) == text[band_h + h:].any(axis=0)).all()
+    assert (text[:, :band_w].any(axis=1) == text[:, band_w + w:].any(axis=1)).all()
+    assert text[:band_h].any() and text[:, :band_w].any()
+    assert (wafermap_rgb(X, Y, GRID, die_px, labels=False) == grid_rgb(GRID, die_px)).all()
+    assert wafermap_rgb(X, Y, GRID, 4).shape == grid_rgb(GRID, 4).shape  # too small for labels
+
+
+def test_png_round_trip():
+    rgb = wafermap_rgb(X, Y, GRID, 12)
+    assert (_decode_png(png_bytes(rgb)) == rgb).all()
+
+
+def test_svg_has_one_path_per_et():
+    root = ET.fromstring(svg_text(X, Y, GRID, die_px=10))
+    assert (root.get("width"), root.get("height")) == ("70", "60")
+    paths = root.findall(SVG + "path")
+    assert [p.get("fill") for p in paths] == [f"#{et_hex(et)}" for et in (0, 1003, 10057, 50021)]
+    assert [p.get("d").count("M") for p in paths] == [1, 1, 1, 1]
+    texts = [t.text for t in root.iter(SVG + "text")]
+    assert sorted(texts) == sorted(["10", "11", "12"] * 2 + ["-1", "-2"] * 2)
+    bare = ET.fromstring(svg_text(X, Y, GRID, labels=False))
+    assert not list(bare.iter(SVG + "text")) and bare.get("viewBox") == "0 0 3 2"
+
+
+def test_render_wafermap_by_extension(make_wafer_csv, tmp_path):
+    wafer = parse_wmap_csv(make_wafer_csv())
+    x_labels, y_labels, grid = build_wafermap_grid(wafer)
+    with collect("render") as metrics:
+        png = render_wafermap(wafer, str(tmp_path / "map.png"), die_px=6)
+    with open(png, "rb") as f:
+        assert (_decode_png(f.read()) == wafermap_rgb(x_labels, y_labels, grid, 6)).all()
+    assert metrics.counters["dies_rendered"] == wafer.die_count
+    svg = render_wafermap(wafer, str(tmp_path / "map.SVG"))
+    with open(svg, encoding="utf-8") as f:
+        assert f.read() == svg_text(x_labels, y_labels, grid)
+
+
+def test_render_command(make_wafer_csv, capsys):
+    path = make_wafer_csv()
+    assert main(["render", path, "--die-px", "4"]) == 0
+    image = path[:-len(".csv")] + ".png"
+    assert f"Wafermap image saved at: {image}" in capsys.readouterr().out
+    with open(image, "rb") as f:
+        assert _decode_png(f.read()).shape[1] % 4 == 0
+
+
+@pytest.mark.skipif(importlib.util.find_spec("PIL") is not None, reason="Pillow is installed")
+def test_embed_without_pillow(tmp_path):
+    png = tmp_path / "map.png"
+    png.write_bytes(png_bytes(grid_rgb(GRID)))
+    with pytest.raises(RuntimeError, match="Pillow"):
+        embed_image(openpyxl.Workbook(), str(png), "W#01_image")
+
+
+@pytest.mark.skipif(importlib.util.find_spec("PIL") is None, reason="needs Pillow")
+def test_embed_image(tmp_path):
+    png = tmp_path / "map.png"
+    png.write_bytes(png_bytes(grid_rgb(GRID)))
+    wb = openpyxl.Workbook()
+    ws = embed_image(wb, str(png), "W#01_image")
+    assert len(ws._images) == 1 and not ws.sheet_view.showGridLines
@@ -0,0 +1,175 @@
+import os
+import zipfile
+
+import openpyxl
+import pytest
+from openpyxl.comments import Comment
+from openpyxl.formatting.rule import CellIsRule
+from openpyxl.styles import PatternFill
+from openpyxl.worksheet.datavalidation import DataValidation
+
+from wafermap_deliver.metrics import collect
+from wafermap_deliver.pipeline import (add_fallout, add_fallout_limits, add_wafermap, convert_csv, default_c1_mark,
+                                       open_converted, pivot_key, sheet_title, wafermap_key, wafermap_sheet_name)
+from wafermap_deliver.session import WorkbookSession, reusable_sheet, sheet_part
+from wafermap_deliver.stamps import read_stamps
+
+
+def _state(path):
+    st = os.stat(path)
+    return st.st_ino, st.st_mtime_ns
+
+
+def test_button_flow_keeps_one_workbook(make_wafer_csv):
+    # Convert, Pivot, Check and Wafermap as the GUI runs them: one save per button, and the
+    # converted file is loaded (without its data sheet) once, for the first stage
+    with collect("gui") as metrics:
+        wafer, session = convert_csv(make_wafer_csv())
+        mark = default_c1_mark(wafer)
+        session.run_stage("Pivot", pivot_key(wafer, mark), add_fallout, wafer, mark)
+        session.save()
+        session.run(add_fallout_limits, wafer)
+        session.save()
+        name = session.run(add_wafermap, wafer)
+        session.stamp(name, wafermap_key(wafer))
+        session.save()
+        session.close()
+    steps = [path.rsplit("/", 1)[-1] for path, _, _ in metrics.spans]
+    assert steps.count("load workbook") == 1
+    assert steps.count("save workbook") == 4
+
+    title = sheet_title(wafer.path)
+    assert read_stamps(session.out_file).keys() == {title, "Pivot", name}
+    wb = openpyxl.load_workbook(session.out_file, read_only=True)
+    assert wb.sheetnames == [title, wafermap_sheet_name(wafer.slot), "Pivot", "Fallout Limits"]
+    wb.close()
+
+
+def test_save_writes_only_when_something_changed(make_wafer_csv):
+    wafer, session = convert_csv(make_wafer_csv())
+    before = _state(session.out_file)
+    session.save()
+    session.close()
+    assert _state(session.out_file) == before
+
+
+def test_save_false_writes_nothing_until_the_session_saves(make_wafer_csv):
+    wafer, session = convert_csv(make_wafer_csv(), save=False)
+    mark = default_c1_mark(wafer)
+    session.run_stage("Pivot", pivot_key(wafer, mark), add_fallout, wafer, mark)
+    assert not os.path.exists(session.out_file)
+    session.close()
+    assert read_stamps(session.out_file)["Pivot"] == pivot_key(wafer, mark)
+
+
+def test_an_error_inside_the_block_saves_nothing(make_wafer_csv):
+    wafer, session = convert_csv(make_wafer_csv())
+    before = _state(session.out_file)
+    with pytest.raises(ValueError):
+        with session:
+            session.run_stage("Pivot", "key", add_fallout, wafer, "no such mark")
+    assert _state(session.out_file) == before
+
+
+def test_plain_workbook_session(tmp_path):
+    out_file = str(tmp_path / "plain.xlsx")
+    wb = openpyxl.Workbook()
+    wb.active["A1"] = "kept"
+    wb.save(out_file)
+
+    with WorkbookSession(out_file) as session:
+        session.run_stage("Extra", "k1", lambda wb: wb.create_sheet("Extra"))
+    assert read_stamps(out_file) == {"Extra": "k1"}
+
+    session = WorkbookSession(out_file)
+    assert session.is_fresh("Extra", "k1") and not session.is_fresh("Extra", "k2")
+    wb = openpyxl.load_workbook(out_file)
+    assert wb.sheetnames == ["Sheet", "Extra"] and wb["Sheet"]["A1"].value == "kept"
+
+
+def _trim(row):
+    row = list(row)
+    while row and row[-1] is None:
+        row.pop()
+    return row
+
+
+def _data_rows(path, title):
+    wb = openpyxl.load_workbook(path, read_only=True)
+    rows = [_trim(row) for row in wb[title].iter_rows(values_only=True)]
+    wb.close()
+    return rows
+
+
+def _part(path, title):
+    with zipfile.ZipFile(path) as z:
+        return z.read(sheet_part(z, title))
+
+
+def test_data_sheet_holds_the_csv_rows(wafer_csv):
+    wafer, session = convert_csv(wafer_csv)
+    assert _data_rows(session.out_file, sheet_title(wafer_csv)) == [_trim(row) for row in wafer.iter_rows()]
+
+
+def test_later_saves_copy_the_data_sheet(make_wafer_csv):
+    wafer, session = convert_csv(make_wafer_csv())
+    title = sheet_title(wafer.path)
+    written = _part(session.out_file, title)
+    for mark in wafer.c1_mark_values()[:2]:
+        session.run_stage("Pivot", pivot_key(wafer, mark), add_fallout, wafer, mark)
+        with collect("save") as metrics:
+            session.save()
+        assert _part(session.out_file, title) == written
+        assert not any(path.endswith("parse CSV") for path, _, _ in metrics.spans)
+
+
+def test_a_workbook_resaved_by_excel_gets_its_data_streamed_again(make_wafer_csv):
+    # Excel moves text into the shared string table; the data sheet XML then can't be copied as is
+    wafer, session = convert_csv(make_wafer_csv())
+    session.close()
+    resaved = session.out_file + ".excel"
+    with zipfile.ZipFile(session.out_file) as src, zipfile.ZipFile(resaved, "w") as dst:
+        for info in src.infolist():
+            dst.writestr(info, src.read(info))
+        dst.writestr("xl/sharedStrings.xml", '<sst xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"/>')
+    os.replace(resaved, session.out_file)
+    assert reusable_sheet(session.out_file, sheet_title(wafer.path)) is None
+
+    _, session = open_converted(wafer.path)
+    mark = default_c1_mark(wafer)
+    session.run_stage("Pivot", pivot_key(wafer, mark), add_fallout, wafer, mark)
+    session.close()
+    assert _data_rows(session.out_file, sheet_title(wafer.path)) == [_trim(row) for row in wafer.iter_rows()]
+
+
+def test_other_sheets_keep_their_layout(make_wafer_csv):
+    wafer, session = convert_csv(make_wafer_csv())
+    session.close()
+    wb = openpyxl.load_workbook(session.out_file)
+    notes = wb.create_sheet("Notes")
+    notes["A1"], notes["B2"] = "kept", 5
+    notes.merge_cells("A1:C1")
+    notes.column_dimensions["A"].width = 40
+    notes.row_dimensions[2].height = 30
+    notes.freeze_panes = "A2"
+    notes["B2"].comment = Comment("check", "QA")
+    notes["B3"].hyperlink = "https://example.com/lot"
+    validation = DataValidation(type="list", formula1='"OK,NG"')
+    validation.add("C2")
+    notes.add_data_validation(validation)
+    notes.conditional_formatting.add("B2:B9", CellIsRule(operator="greaterThan", formula=["3"],
+                                                         fill=PatternFill("solid", fgColor="FF0000")))
+    wb.save(session.out_file)
+
+    _, session = open_converted(wafer.path)
+    session.run(add_wafermap, wafer)
+    session.close()
+    notes = openpyxl.load_workbook(session.out_file)["Notes"]
+    assert (notes["A1"].value, notes["B2"].value) == ("kept", 5)
+    assert [str(r) for r in notes.merged_cells.ranges] == ["A1:C1"]
+    assert notes.column_dimensions["A"].width == 40 and notes.row_dimensions[2].height == 30
+    assert notes.freeze_panes == "A2"
+    assert notes["B2"].comment.text == "check"
+    assert notes["B3"].hyperlink.target == "https://example.com/lot"
+    assert [str(dv.sqref) for dv in notes.data_validations.dataValidation] == ["C2"]
+    assert [str(cf.sqref) for cf in notes.conditional_formatting] == ["B2:B9"]
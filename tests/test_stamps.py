@@ -0,0 +1,141 @@
+import os
+
+import openpyxl
+import pytest
+
+from wafermap_deliver import pipeline
+from wafermap_deliver.cache import load_wafer
+from wafermap_deliver.cli import main
+from wafermap_deliver.pipeline import (output_path, pivot_key, process_file, sheet_title, wafer_workbook_stamps,
+                                       wafermap_sheet_name)
+from wafermap_deliver.stamps import read_stamps, stage_key, write_stamps
+
+
+def _state(path):
+    st = os.stat(path)
+    return st.st_ino, st.st_mtime_ns
+
+
+def _sheets(path):
+    wb = openpyxl.load_workbook(path, read_only=True)
+    try:
+        return wb.sheetnames
+    finally:
+        wb.close()
+
+
+def test_stage_key_follows_every_input():
+    assert stage_key("abc", "Pivot", "H", 1) == stage_key("abc", "Pivot", "H", 1)
+    assert len({stage_key("abc", "Pivot", "H", 1), stage_key("abc", "Pivot", "L", 1),
+                stage_key("abc", "Pivot", "H", 2), stage_key("abd", "Pivot", "H", 1)}) == 4
+
+
+def test_stamps_round_trip(tmp_path):
+    path = str(tmp_path / "book.xlsx")
+    wb = openpyxl.Workbook()
+    wb.create_sheet("Pivot")
+    write_stamps(wb, {"Pivot": "k1", "Sheet": "k0", "Gone": "k9"})
+    wb.save(path)
+    assert read_stamps(path) == {"Pivot": "k1", "Sheet": "k0"}
+
+    # Stamps of a sheet deleted by hand are ignored, and a rewrite replaces all of them
+    wb = openpyxl.load_workbook(path)
+    del wb["Pivot"]
+    wb.save(path)
+    assert read_stamps(path) == {"Sheet": "k0"}
+    write_stamps(wb, {"Sheet": "k2"})
+    wb.save(path)
+    assert read_stamps(path) == {"Sheet": "k2"}
+
+
+def test_no_stamps(tmp_path):
+    path = tmp_path / "plain.xlsx"
+    openpyxl.Workbook().save(path)
+    assert read_stamps(str(path)) == {}
+    assert read_stamps(str(tmp_path / "missing.xlsx")) == {}
+    (tmp_path / "broken.xlsx").write_text("not a zip")
+    assert read_stamps(str(tmp_path / "broken.xlsx")) == {}
+
+
+def test_rerun_skips_up_to_date_sheets(make_wafer_csv, capsys):
+    path = make_wafer_csv()
+    assert main(["all", path]) == 0
+    capsys.readouterr()
+    before = _state(output_path(path))
+    assert main(["all", path]) == 0
+    out = capsys.readouterr().out
+    for sheet in ("Pivot", "Fallout Limits", wafermap_sheet_name(1)):
+        assert f"⏭️ {sheet} is up to date, skipped." in out
+    assert _state(output_path(path)) == before
+
+    assert main(["convert", path]) == 0
+    assert "is up to date with the CSV, skipped." in capsys.readouterr().out
+    assert main(["--force", "all", path]) == 0
+    assert "skipped" not in capsys.readouterr().out
+
+
+@pytest.mark.parametrize("layout, stale", [
+    ("DATA_LAYOUT", "data"),
+    ("FALLOUT_LAYOUT", "Pivot"),
+    ("WAFERMAP_LAYOUT", "W#"),
+])
+def test_layout_version_makes_sheets_stale(make_wafer_csv, monkeypatch, layout, stale):
+    path = make_wafer_csv()
+    result = process_file(path)
+    wafer = load_wafer(path)
+    old = wafer_workbook_stamps(wafer, result)
+    monkeypatch.setattr(pipeline, layout, getattr(pipeline, layout) + 1)
+    new = wafer_workbook_stamps(wafer, result)
+    changed = {sheet for sheet in old if old[sheet] != new[sheet]}
+    names = {"data": sheet_title(path), "Pivot": "Pivot", "W#": wafermap_sheet_name(result.slot)}
+    assert names[stale] in changed
+    assert not process_file(path).up_to_date
+    assert read_stamps(result.out_file) == new
+    assert process_file(path).up_to_date
+
+
+def test_process_file_only_rewrites_stale_sheets(make_wafer_csv):
+    path = make_wafer_csv()
+    result = process_file(path)
+    assert not result.up_to_date
+    out_file = result.out_file
+    wb = openpyxl.load_workbook(out_file)
+    wb.create_sheet("Notes")["A1"] = "kept"
+    wb.save(out_file)
+    stamps = read_stamps(out_file)
+
+    before = _state(out_file)
+    assert process_file(path).up_to_date
+    assert _state(out_file) == before
+
+    # Another C1_MARK: Pivot and Fallout Limits change, the data and W# sheets keep their stamps
+    wafer = load_wafer(path)
+    mark = [m for m in wafer.c1_mark_values() if m != result.c1_mark][0]
+    other = process_file(path, mark)
+    assert not other.up_to_date
+    new = read_stamps(out_file)
+    assert new["Pivot"] == pivot_key(wafer, mark) != stamps["Pivot"]
+    assert new["Fallout Limits"] != stamps["Fallout Limits"]
+    assert {sheet: new[sheet] for sheet in (sheet_title(path), wafermap_sheet_name(result.slot))} == \
+        {sheet: stamps[sheet] for sheet in (sheet_title(path), wafermap_sheet_name(result.slot))}
+    assert _sheets(out_file) == [sheet_title(path), wafermap_sheet_name(result.slot), "Pivot", "Fallout Limits",
+                                 "Notes"]
+    assert openpyxl.load_workbook(out_file)["Notes"]["A1"].value == "kept"
+
+    before = _state(out_file)
+    assert not process_file(path, mark, force=True).up_to_date
+    assert _state(out_file) != before and read_stamps(out_file) == new
+
+
+def test_changed_csv_restreams_the_data_sheet(make_wafer_csv):
+    path = make_wafer_csv()
+    process_file(path)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write("99,99,1,1,NG,48,H,0,,0,1001\n")
+    result = process_file(path)
+    assert not result.up_to_date
+    wafer = load_wafer(path)
+    assert read_stamps(result.out_file) == wafer_workbook_stamps(wafer, result)
+    wb = openpyxl.load_workbook(result.out_file, read_only=True)
+    assert sum(1 for _ in wb[sheet_title(path)].iter_rows()) == len(list(wafer.iter_rows()))
+    wb.close()
@@ -0,0 +1,73 @@
+import subprocess
+import sys
+
+import pytest
+
+import wafermap_deliver
+from wafermap_deliver.cli import main
+from wafermap_deliver.startup import (HEAVY_MODULES, PACKAGE_DIR, import_times, startup_lines, startup_problems,
+                                      startup_report)
+
+
+def _loaded_after(code):
+    # Heavy modules a fresh interpreter has loaded after running code
+    check = f"import sys\n{code}\nprint('\\n' + ' '.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    result = subprocess.run([sys.executable, "-c", check], capture_output=True, text=True, check=True,
+                            cwd=PACKAGE_DIR)
+    return result.stdout.splitlines()[-1].split()  # last line, after any --help text
+
+
+@pytest.mark.parametrize("code", [
+    "import wafermap_deliver",
+    "import wafermap_deliver.cli",
+    "from wafermap_deliver.cli import main\ntry:\n    main(['--help'])\nexcept SystemExit:\n    pass",
+])
+def test_entry_points_import_no_backend(code):
+    assert _loaded_after(code) == []
+
+
+def test_backends_load_on_first_use():
+    assert _loaded_after("import wafermap_deliver\nwafermap_deliver.parse_wmap_csv") == ["numpy"]
+    assert "openpyxl" in _loaded_after("import wafermap_deliver\nwafermap_deliver.WorkbookSession")
+    # Headless runs never need Tk
+    headless = "import wafermap_deliver.batch, wafermap_deliver.watch, wafermap_deliver.bench"
+    assert "tkinter" not in _loaded_after(headless)
+
+
+def test_lazy_exports():
+    from wafermap_deliver.parser import parse_wmap_csv
+
+    assert wafermap_deliver.parse_wmap_csv is parse_wmap_csv
+    assert "parse_wmap_csv" in vars(wafermap_deliver)  # resolved once, then a plain attribute
+    assert set(wafermap_deliver.__all__) == set(wafermap_deliver._MODULE_OF)
+    assert set(wafermap_deliver.__all__) <= set(dir(wafermap_deliver))
+    for name in wafermap_deliver.__all__:
+        assert getattr(wafermap_deliver, name) is not None
+    with pytest.raises(AttributeError):
+        wafermap_deliver.no_such_name
+
+
+def _report(seconds=0.05, heavy=()):
+    return {"seconds": seconds, "import_ms": 12.5, "heavy": list(heavy), "slowest": [("wafermap_deliver", 12.5)]}
+
+
+def test_startup_problems():
+    assert startup_problems(_report()) == []
+    assert startup_problems(_report(seconds=0.2)) == ["`--help` took 200 ms (budget 150 ms)"]
+    assert startup_problems(_report(seconds=0.2), budget_ms=300) == []
+    assert startup_problems(_report(heavy=["numpy", "openpyxl"])) == ["imported at startup: numpy, openpyxl"]
+    lines = startup_lines(_report())
+    assert lines[0].startswith("CLI startup: 50 ms") and lines[-1].split() == ["wafermap_deliver", "12.5"]
+
+
+def test_startup_report():
+    assert "wafermap_deliver.cli" in import_times()
+    report = startup_report(repeat=1)
+    assert report["heavy"] == [] and report["seconds"] > 0
+    assert [name for name, _ in report["slowest"]] != []
+
+
+def test_startup_command(capsys):
+    code = main(["startup", "--repeat", "1", "--budget", "100000"])
+    out = capsys.readouterr().out
+    assert code == 0 and "Within the 100000 ms startup budget" in out
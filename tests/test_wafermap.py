@@ -0,0 +1,48 @@
+import numpy as np
+import openpyxl
+
+from wafermap_deliver.parser import parse_wmap_csv
+from wafermap_deliver.wafermap import EMPTY, build_wafermap_grid, grid_from_points
+
+from conftest import DEMO
+
+
+def test_grid_matches_the_excel_wafermap():
+    # Excel's "Min of ET" pivot: X labels across row 1, Y labels down column A, empty where no die
+    wb = openpyxl.load_workbook(DEMO + ".xlsx", read_only=True)
+    excel = [list(row) for row in wb["W#08_wafermap_by_End_Test_No"].iter_rows(values_only=True)]
+    wb.close()
+    x_labels, y_labels, grid = build_wafermap_grid(parse_wmap_csv(DEMO + ".csv"))
+    width, height = len(x_labels), len(y_labels)
+    assert excel[0][1:width + 1] == x_labels.tolist()
+    assert [row[0] for row in excel[1:height + 1]] == y_labels.tolist()
+    assert [row[1:width + 1] for row in excel[1:height + 1]] == [
+        [None if et == EMPTY else et for et in row] for row in grid.tolist()]
+
+
+def test_grid_by_hand(make_wafer_csv):
+    wafer = parse_wmap_csv(make_wafer_csv("negative"))
+    lowest = {}
+    for x, y, et in zip(wafer.dies["X"].tolist(), wafer.dies["Y"].tolist(), wafer.dies["ET"].tolist()):
+        lowest[x, y] = min(et, lowest.get((x, y), et))
+    x_labels, y_labels, grid = build_wafermap_grid(wafer)
+    assert x_labels.tolist() == sorted({x for x, _ in lowest})
+    assert y_labels.tolist() == sorted({y for _, y in lowest})
+    cells = {(x, y): et for y, row in zip(y_labels.tolist(), grid.tolist())
+             for x, et in zip(x_labels.tolist(), row) if et != EMPTY}
+    assert cells == lowest
+
+
+def test_repeated_coordinates_keep_the_lowest_et():
+    x_labels, y_labels, grid = grid_from_points([0, 0, 3], [5, 5, 5], [1007, 1003, 2])
+    assert x_labels.tolist() == [0, 3] and y_labels.tolist() == [5]
+    assert grid.tolist() == [[1003, 2]]
+
+
+def test_compact_false_keeps_the_bounding_box():
+    x_labels, y_labels, grid = grid_from_points([0, 3], [-1, 1], [4, 5], compact=False)
+    assert x_labels.tolist() == [0, 1, 2, 3] and y_labels.tolist() == [-1, 0, 1]
+    assert grid.shape == (3, 4)
+    assert int((grid != EMPTY).sum()) == 2
+    assert grid[0, 0] == 4 and grid[2, 3] == 5
+    assert np.all(grid[1] == EMPTY)
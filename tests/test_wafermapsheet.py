@@ -0,0 +1,139 @@
+import io
+import re
+
+import numpy as np
+import openpyxl
+import pytest
+
+from wafermap_deliver import wafermapsheet
+from wafermap_deliver.palette import et_hex
+from wafermap_deliver.parser import parse_wmap_csv
+from wafermap_deliver.pipeline import add_wafermap, sheet_title
+from wafermap_deliver.wafermap import EMPTY
+from wafermap_deliver.wafermapsheet import write_wafermap_sheet
+
+from conftest import DEMO
+
+X_LABELS, Y_LABELS = np.array([-1, 0, 1]), np.array([7, 8])
+GRID = np.array([[0, 1003, EMPTY],
+                 [1003, EMPTY, 50021]], dtype=np.int64)
+
+
+def _sheet(**kwargs):
+    wb = openpyxl.Workbook()
+    return wb, write_wafermap_sheet(wb, X_LABELS, Y_LABELS, GRID, "W#01", **kwargs)
+
+
+def _die_cells(ws):
+    for r, row in enumerate(GRID.tolist(), start=2):
+        for c, et in enumerate(row, start=2):
+            yield ws.cell(row=r, column=c), et
+
+
+def test_dies_are_filled_with_their_et_color():
+    _, ws = _sheet()
+    for cell, et in _die_cells(ws):
+        if et == EMPTY:
+            assert cell.value is None and cell.fill.fill_type is None
+        else:
+            assert cell.value == et
+            assert cell.fill.fgColor.rgb == "00" + et_hex(et)
+        assert cell.border.left.style == "thin" and cell.alignment.horizontal == "center"
+
+
+def test_one_style_per_look():
+    # Cells that look alike share one style id instead of being styled one by one
+    _, ws = _sheet()
+    ids = {}
+    for cell, et in _die_cells(ws):
+        ids.setdefault(et, set()).add(cell.style_id)
+    assert all(len(styles) == 1 for styles in ids.values())
+    assert len({next(iter(styles)) for styles in ids.values()}) == len(ids)
+
+
+def test_styles_survive_a_save():
+    wb, _ = _sheet()
+    buffer = io.BytesIO()
+    wb.save(buffer)
+    ws = openpyxl.load_workbook(buffer)["W#01"]
+    for cell, et in _die_cells(ws):
+        if et != EMPTY:
+            assert cell.fill.fgColor.rgb == "00" + et_hex(et)
+
+
+
+def _values(ws, rows, cols):
+    return [[cell.value for cell in row] for row in ws.iter_rows(min_row=1, max_row=rows, max_col=cols)]
+
+
+def test_axis_labels_are_mirrored():
+    _, ws = _sheet()
+    assert _values(ws, 4, 5) == [
+        ["No.", -1, 0, 1, "No."],
+        [7, 0, 1003, None, 7],
+        [8, 1003, None, 50021, 8],
+        ["No.", -1, 0, 1, "No."],
+    ]
+    assert ws.max_row == 4 and ws.max_column == 5
+    for cell in (ws["A1"], ws["C1"], ws["C4"], ws["A3"], ws["E3"], ws["E4"]):
+        assert cell.font.b and cell.font.color.rgb == "002E6E9E"
+        assert cell.fill.fgColor.rgb == "00E4F1FD" and cell.alignment.horizontal == "center"
+    assert ws.sheet_view.showGridLines is False
+
+
+def test_layout_matches_the_demo_workbook():
+    # The die colors of the shipped workbook came from Excel's old per-run palette; the layout is the same
+    excel = openpyxl.load_workbook(DEMO + ".xlsx")["W#08_wafermap_by_End_Test_No"]
+    wb = openpyxl.Workbook()
+    title = add_wafermap(wb, parse_wmap_csv(DEMO + ".csv"))
+    ws = wb[title]
+    assert title == excel.title
+    assert (ws.max_row, ws.max_column) == (excel.max_row, excel.max_column)
+    assert _values(ws, ws.max_row, ws.max_column) == _values(excel, ws.max_row, ws.max_column)
+    assert ws.sheet_view.showGridLines == excel.sheet_view.showGridLines is False
+
+    def look(sheet):
+        return [[(cell.fill.fill_type is not None, cell.font.b, cell.alignment.horizontal, cell.border.top.style)
+                 for cell in row] for row in sheet.iter_rows(max_row=ws.max_row, max_col=ws.max_column)]
+    assert look(ws) == look(excel)
+    assert ws["A1"].fill.fgColor.rgb[2:] == excel["A1"].fill.fgColor.rgb[2:]
+
+
+def test_sheet_goes_right_after_the_data_sheet(make_wafer_csv):
+    wafer = parse_wmap_csv(make_wafer_csv())
+    wb = openpyxl.Workbook()
+    wb.active.title = sheet_title(wafer.path)
+    wb.create_sheet("Pivot")
+    name = add_wafermap(wb, wafer)
+    assert wb.sheetnames == [sheet_title(wafer.path), name, "Pivot"]
+
+    # Rebuilt in place, not appended next to the old one
+    wb[name]["A1"] = "stale"
+    add_wafermap(wb, wafer)
+    assert wb.sheetnames == [sheet_title(wafer.path), name, "Pivot"] and wb[name]["A1"].value == "No."
+
+    bare = openpyxl.Workbook()
+    name = add_wafermap(bare, wafer)
+    assert bare.sheetnames == ["Sheet", name]  # no data sheet: appended
+
+
+def test_no_slot_no_wafermap(make_wafer_csv):
+    path = make_wafer_csv()
+    with open(path, encoding="utf-8") as f:
+        text = re.sub(r"\nSLOT,*\n\d+,", "\nSLOT,\n,", f.read())
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+    wafer = parse_wmap_csv(path)
+    assert wafer.slot is None
+    with pytest.raises(ValueError, match="SLOT"):
+        add_wafermap(openpyxl.Workbook(), wafer)
+
+
+def test_dies_colored_progress(make_wafer_csv, monkeypatch):
+    monkeypatch.setattr(wafermapsheet, "PROGRESS_EVERY", 100)
+    wafer = parse_wmap_csv(make_wafer_csv())
+    calls = []
+    add_wafermap(openpyxl.Workbook(), wafer, progress=lambda what, n: calls.append((what, n)))
+    counts = [n for what, n in calls if what == "Dies colored"]
+    assert len(counts) == len(calls) > 5 and counts == sorted(counts) and counts[-1] <= wafer.die_count
+    assert all(b - a >= 100 for a, b in zip(counts, counts[1:]))
@@ -0,0 +1,149 @@
+import os
+import shutil
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import pytest
+
+from wafermap_deliver import watch
+from wafermap_deliver.pipeline import output_path
+from wafermap_deliver.watch import FolderWatcher, watch_folders
+
+TIMEOUT = 10
+MODES = [False, pytest.param(True, marks=pytest.mark.skipif(not sys.platform.startswith("linux"),
+                                                             reason="inotify is Linux only"))]
+
+
+def _until(predicate, timeout=TIMEOUT):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def _collect(watcher, rounds):
+    found = []
+    for _ in range(rounds):
+        found += watcher.ready()
+    return found
+
+
+def _write(path, text, mtime_ns=None):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+    if mtime_ns is not None:
+        os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+@pytest.mark.parametrize("use_inotify", MODES)
+def test_files_are_reported_once_settled(tmp_path, use_inotify):
+    (tmp_path / "old.wmap.csv").write_text("already there")
+    (tmp_path / "notes.csv").write_text("not a wafer")
+    (tmp_path / "empty.wmap.csv").write_text("")
+    watcher = FolderWatcher([str(tmp_path)], settle=0.2, poll=0.02, use_inotify=use_inotify)
+    try:
+        assert watcher.mode == ("inotify" if use_inotify else "polling")
+        assert watcher.ready() == []  # first sighting, not settled yet
+        assert _until(lambda: watcher.ready() == [str(tmp_path / "old.wmap.csv")])
+
+        new = tmp_path / "new.wmap.csv"
+        for part in range(5):  # still being written: never handed out
+            _write(new, "x" * (part + 1))
+            assert watcher.ready() == []
+        assert _until(lambda: watcher.ready() == [str(new)])
+        assert _collect(watcher, 15) == []  # unchanged since
+
+        _write(new, "rewritten by a retest")
+        assert _until(lambda: watcher.ready() == [str(new)])
+        _write(new, "gone before it settled")
+        watcher.ready()
+        new.unlink()
+        assert _collect(watcher, 15) == [] and not watcher.pending
+    finally:
+        watcher.close()
+
+
+def test_missing_folder_is_skipped(tmp_path):
+    watcher = FolderWatcher([str(tmp_path / "not yet"), str(tmp_path)], settle=0, poll=0.01, use_inotify=False)
+    (tmp_path / "a.wmap.csv").write_text("a")
+    assert _collect(watcher, 3) == [str(tmp_path / "a.wmap.csv")]
+
+
+def _watch(dirs, **kwargs):
+    messages, stop = [], threading.Event()
+    thread = threading.Thread(target=watch_folders, args=(dirs,), daemon=True,
+                              kwargs={"settle": 0.1, "poll": 0.02, "use_inotify": False, "status": messages.append,
+                                      "stop": stop, **kwargs})
+    thread.start()
+    return messages, stop, thread
+
+
+def test_watch_folders_processes_new_wafers(make_wafer_csv, tmp_path):
+    inbox, out_dir = tmp_path / "inbox", tmp_path / "results"
+    inbox.mkdir()
+    messages, stop, thread = _watch([str(inbox)], out_dir=str(out_dir), workers=1)
+    try:
+        source = make_wafer_csv()
+        shutil.copy(source, inbox / "A.wmap.csv")
+        assert _until(lambda: any(m.startswith("✅ A.wmap.csv (W#01)") for m in messages))
+        assert os.path.exists(output_path(str(inbox / "A.wmap.csv"), str(out_dir)))
+        (inbox / "B.wmap.csv").write_text("not a wafer file\n")
+        assert _until(lambda: any(m.startswith("❌ B.wmap.csv") for m in messages))
+    finally:
+        stop.set()
+        thread.join(TIMEOUT)
+    assert messages[0].startswith(f"👀 Watching {inbox} (polling, settle 0.1 s, 1 worker(s))")
+
+
+def test_several_folders_get_their_own_results_folder(make_wafer_csv, tmp_path):
+    dirs = [tmp_path / "tester1", tmp_path / "tester2"]
+    for d in dirs:
+        d.mkdir()
+        shutil.copy(make_wafer_csv(), d / "W.wmap.csv")
+    messages, stop, thread = _watch([str(d) for d in dirs], out_dir=str(tmp_path / "results"), workers=2)
+    try:
+        assert _until(lambda: sum(m.startswith("✅") for m in messages) == 2)
+    finally:
+        stop.set()
+        thread.join(TIMEOUT)
+    for d in dirs:
+        assert os.path.exists(output_path(str(d / "W.wmap.csv"), str(tmp_path / "results" / d.name)))
+
+
+def test_a_file_rewritten_mid_job_is_queued_again(tmp_path, monkeypatch):
+    # Threads instead of processes, and a process_file that holds its first job until the file is rewritten
+    release, calls, running = threading.Event(), [], []
+
+    def process_file(path, *args):
+        running.append(path)
+        assert running.count(path) == 1, "processed twice at the same time"
+        with open(path, encoding="utf-8") as f:
+            calls.append(f.read())
+        if len(calls) == 1:
+            release.wait(TIMEOUT)
+        running.remove(path)
+        return SimpleNamespace(up_to_date=False, slot=1, out_file=path + ".xlsx")
+
+    monkeypatch.setattr(watch, "ProcessPoolExecutor", ThreadPoolExecutor)
+    monkeypatch.setattr(watch, "process_file", process_file)
+    path = tmp_path / "W.wmap.csv"
+    path.write_text("first test")
+    messages, stop, thread = _watch([str(tmp_path)], workers=2)  # a free worker could take the rewrite at once
+    try:
+        assert _until(lambda: calls == ["first test"])
+        _write(str(path), "retest", time.time_ns() + 10 ** 9)
+        time.sleep(0.5)  # settled again while the first job still runs
+        assert calls == ["first test"]
+        release.set()
+        assert _until(lambda: calls == ["first test", "retest"])
+        assert _until(lambda: sum(m.startswith("✅ W.wmap.csv") for m in messages) == 2)
+    finally:
+        release.set()
+        stop.set()
+        thread.join(TIMEOUT)
+    assert not thread.is_alive()
@@ -0,0 +1,129 @@
+import os
+import threading
+
+import pytest
+
+from wafermap_deliver import parser, wafermapsheet
+from wafermap_deliver.pipeline import (add_fallout, add_wafermap, convert_csv, data_key, pivot_key, wafermap_key,
+                                       wafermap_sheet_name)
+from wafermap_deliver.stamps import read_stamps
+from wafermap_deliver.worker import Cancelled, StageWorker
+
+TIMEOUT = 10
+
+
+@pytest.fixture
+def worker():
+    worker = StageWorker()
+    yield worker
+    worker.stop(TIMEOUT)
+
+
+def _events(worker):
+    events = []
+    while not worker.events.empty():
+        events.append(worker.events.get())
+    return events
+
+
+def test_jobs_run_in_order_on_the_worker_thread(worker):
+    ran = []
+    worker.submit("first", lambda: ran.append(("first", threading.current_thread())))
+    worker.submit("second", lambda: ran.append(("second", threading.current_thread())))
+    worker.stop(TIMEOUT)
+    assert [name for name, _ in ran] == ["first", "second"]
+    assert all(thread is not threading.main_thread() for _, thread in ran)
+    assert [event[:2] for event in _events(worker)] == [("done", "first"), ("done", "second")]
+    assert not worker.alive and not worker.busy
+
+
+def test_errors_are_posted_not_raised(worker):
+    def fail():
+        raise ValueError("bad wafer")
+    worker.submit("job", fail)
+    worker.submit("next", lambda: None)
+    worker.stop(TIMEOUT)
+    (kind, name, error), done = _events(worker)
+    assert (kind, name, str(error)) == ("error", "job", "bad wafer")
+    assert done[:2] == ("done", "next")
+
+
+def test_cancel_takes_effect_at_the_next_progress_call(worker):
+    started = threading.Event()
+
+    def job():
+        count = 0
+        while True:
+            count += 1
+            worker.progress("Rows parsed", count)
+            started.set()
+
+    worker.submit("job", job)
+    assert started.wait(TIMEOUT)
+    worker.cancel()
+    worker.submit("after", lambda: None)  # the cancel must not carry over to the next job
+    worker.stop(TIMEOUT)
+    events = _events(worker)
+    assert events[0] == ("progress", "Rows parsed: 1")
+    assert [event[:2] for event in events if event[0] != "progress"] == [("cancelled", "job"), ("done", "after")]
+
+
+def test_close_lets_submitted_jobs_finish(worker):
+    gate, ran = threading.Event(), []
+    worker.submit("slow", lambda: gate.wait(TIMEOUT) and ran.append("slow"))
+    worker.close()
+    assert worker.alive
+    gate.set()
+    worker._thread.join(TIMEOUT)
+    assert ran == ["slow"] and not worker.alive
+
+
+@pytest.fixture
+def often(monkeypatch):
+    # Progress every few rows and dies, so a 1500-die wafer reports several times
+    monkeypatch.setattr(parser, "ROW_CHUNK", 100)
+    monkeypatch.setattr(parser, "PROGRESS_EVERY", 200)
+    monkeypatch.setattr(wafermapsheet, "PROGRESS_EVERY", 200)
+
+
+def _cancel_on(what, calls):
+    def progress(label, count):
+        calls.append(label)
+        if label == what:
+            raise Cancelled()
+    return progress
+
+
+def test_cancelled_save_keeps_the_previous_file(make_wafer_csv, often):
+    calls = []
+    wafer, session = convert_csv(make_wafer_csv(), progress=_cancel_on("Rows written", calls))
+    with open(session.out_file, "rb") as f:
+        before = f.read()
+    session.run_stage("W#", "key", add_wafermap, wafer)
+    session.restream(data_key(wafer))  # stream the data rows again instead of copying them
+    with pytest.raises(Cancelled):
+        session.save()
+    assert "Rows parsed" in calls and "Rows written" in calls
+    with open(session.out_file, "rb") as f:
+        assert f.read() == before
+    assert not os.path.exists(session.out_file + ".tmp")
+
+
+def test_cancelled_stage_drops_its_stamp(make_wafer_csv, often):
+    calls = []
+    wafer, session = convert_csv(make_wafer_csv())
+    name, key = wafermap_sheet_name(wafer.slot), wafermap_key(wafer)
+    session.run_stage(name, key, add_wafermap, wafer)
+    session.save()
+    with pytest.raises(Cancelled):
+        session.run_stage(name, key, add_wafermap, wafer, progress=_cancel_on("Dies colored", calls))
+    assert calls == ["Dies colored"]
+    assert not session.is_fresh(name, key)
+    session.save()  # nothing finished since the last save: the file keeps the whole sheet and its stamp
+    assert read_stamps(session.out_file)[name] == key
+
+    # Saved along with a later stage, the half-written sheet goes out unstamped, to be rebuilt next time
+    mark = wafer.c1_mark_values()[0]
+    session.run_stage("Pivot", pivot_key(wafer, mark), add_fallout, wafer, mark)
+    session.close()
+    assert name not in read_stamps(session.out_file)
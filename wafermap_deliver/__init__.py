@@ -0,0 +1,104 @@
+# Deliverables Automation core: headless parsing and analysis of qccsvout wafer CSVs
+#
+# Names are imported from their submodule on first access (PEP 562), so
+# `import wafermap_deliver` and short CLI runs don't pay for NumPy/openpyxl
+# (or anything else) they never use.
+
+import importlib
+
+_EXPORTS = {
+    "batch": ("find_wafer_files", "run_batch", "stack_lot"),
+    "bench": ("compare_reports", "run_bench"),
+    "chunked": ("DieStats", "parse_parallel", "scan_die_stats"),
+    "dietable": ("DieTable",),
+    "cache": ("load_wafer", "read_cache", "source_digest", "write_cache"),
+    "fallout": ("fallout_table", "fallout_tables", "write_fallout_sheet", "write_fallout_summary_sheet"),
+    "parser": ("DIE_COLUMNS", "LIMIT_COLUMNS", "WaferData", "coerce_value", "parse_wmap_csv"),
+    "limittable": ("LimitTable", "limit_changes", "parse_limit"),
+    "limits": ("annotate_fallout", "write_fallout_limits_sheet"),
+    "lotmap": ("LotStack", "write_lot_map_sheets"),
+    "palette": ("PALETTE_VERSION", "PASS_COLOR", "et_color", "et_fill"),
+    "pipeline": ("WaferResult", "add_fallout", "add_fallout_limits", "add_fallout_summary", "add_wafermap",
+                 "add_wafermap_image", "analyze_wafer", "check_end_test", "convert_csv", "process_file"),
+    "render": ("render_png", "render_svg", "render_wafermap", "wafermap_rgb"),
+    "session": ("WorkbookSession",),
+    "stamps": ("read_stamps", "stage_key"),
+    "synthetic": ("write_synthetic_wafer",),
+    "wafermap": ("build_wafermap_grid",),
+    "watch": ("FolderWatcher", "watch_folders"),
+    "worker": ("Cancelled", "StageWorker"),
+}
+_MODULE_OF = {name: module for module, names in _EXPORTS.items() for name in names}
+
+
+def __getattr__(name):
+    module = _MODULE_OF.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module}", __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_MODULE_OF))
+
+
+__all__ = [
+    "Cancelled",
+    "DIE_COLUMNS",
+    "DieStats",
+    "DieTable",
+    "FolderWatcher",
+    "LIMIT_COLUMNS",
+    "LimitTable",
+    "LotStack",
+    "PALETTE_VERSION",
+    "PASS_COLOR",
+    "StageWorker",
+    "WaferData",
+    "WaferResult",
+    "WorkbookSession",
+    "add_fallout",
+    "add_fallout_limits",
+    "add_fallout_summary",
+    "add_wafermap",
+    "add_wafermap_image",
+    "analyze_wafer",
+    "annotate_fallout",
+    "build_wafermap_grid",
+    "check_end_test",
+    "compare_reports",
+    "coerce_value",
+    "convert_csv",
+    "et_color",
+    "et_fill",
+    "fallout_table",
+    "fallout_tables",
+    "find_wafer_files",
+    "limit_changes",
+    "load_wafer",
+    "parse_limit",
+    "parse_parallel",
+    "parse_wmap_csv",
+    "process_file",
+    "read_cache",
+    "read_stamps",
+    "render_png",
+    "render_svg",
+    "render_wafermap",
+    "run_batch",
+    "run_bench",
+    "scan_die_stats",
+    "source_digest",
+    "stack_lot",
+    "stage_key",
+    "wafermap_rgb",
+    "watch_folders",
+    "write_cache",
+    "write_fallout_sheet",
+    "write_fallout_limits_sheet",
+    "write_fallout_summary_sheet",
+    "write_lot_map_sheets",
+    "write_synthetic_wafer",
+]
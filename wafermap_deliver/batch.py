@@ -0,0 +1,142 @@
+import glob
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import openpyxl
+
+from .cache import load_wafer
+from .fallout import style_percent, write_fallout_block
+from .limits import write_fallout_limits_sheet
+from .lotmap import LotStack, write_lot_map_sheets
+from .pipeline import process_file, wafermap_sheet_name, write_end_test_reference
+from .session import replacing
+from .wafermapsheet import AXIS_FILL, AXIS_FONT, write_wafermap_sheet
+
+# Batch / lot mode: run the full chain for every wafer CSV of a lot in a
+# process pool, writing one workbook per wafer or a single lot workbook.
+
+LOT_SUMMARY_HEADER = ["Wafer File", "Slot", "Dies", "C1_MARK", "Top End Test No.", "Count", "Fallout%"]
+
+
+def find_wafer_files(source):
+    """All .wmap.csv files in a directory, or the files matching a glob."""
+    if os.path.isdir(source):
+        return sorted(glob.glob(os.path.join(source, "*.wmap.csv")))
+    return sorted(glob.glob(source))
+
+
+def lot_slot_problems(results):
+    """Why the wafers can't go into one lot workbook (its sheets are named by SLOT); empty when they can."""
+    problems = []
+    by_slot = {}
+    for result in results:
+        name = os.path.basename(result.csv_path)
+        if result.slot is None:
+            problems.append(f"{name} has no SLOT value")
+        else:
+            by_slot.setdefault(result.slot, []).append(name)
+    for slot, names in sorted(by_slot.items()):
+        if len(names) > 1:
+            problems.append(f"W#{str(slot).zfill(2)} is the SLOT of {', '.join(sorted(names))}")
+    return problems
+
+
+def write_lot_workbook(results, lot_file):
+    """Lot Summary sheet, stacked lot maps, then fallout, fallout limits and wafermap sheets per wafer.
+
+    Raises ValueError (before writing anything) when a wafer has no SLOT or
+    two wafers share one, since their sheets would overwrite each other.
+    """
+    problems = lot_slot_problems(results)
+    if problems:
+        raise ValueError("Cannot build one lot workbook: " + "; ".join(problems))
+    wb = openpyxl.Workbook()
+    summary = wb.active
+    summary.title = "Lot Summary"
+    summary.append(LOT_SUMMARY_HEADER)
+
+    stack = LotStack()
+    for result in results:
+        stack.add_grid(result.x_labels, result.y_labels, result.grid)
+    write_lot_map_sheets(wb, stack)
+
+    for result in sorted(results, key=lambda r: r.slot):
+        top = result.top_fallout or ["", "", ""]
+        summary.append([os.path.basename(result.csv_path), result.slot, result.die_count,
+                        result.c1_mark] + top)
+        style_percent(summary.cell(row=summary.max_row, column=len(LOT_SUMMARY_HEADER)), top[2])
+
+        slot = str(result.slot).zfill(2)
+        fallout = wb.create_sheet(f"W#{slot}_Fallout")
+        write_fallout_block(fallout, result.fallout)
+        write_end_test_reference(fallout, result.reference)
+        write_fallout_limits_sheet(wb, result.limits, f"W#{slot}_Fallout_Limits")
+        write_wafermap_sheet(wb, result.x_labels, result.y_labels, result.grid,
+                             wafermap_sheet_name(result.slot))
+
+    for cell in summary[1]:
+        cell.fill, cell.font = AXIS_FILL, AXIS_FONT
+    with replacing(lot_file) as tmp:
+        wb.save(tmp)
+    wb.close()
+
+
+def stack_lot(source, status=print, use_cache=True):
+    """LotStack of every wafer in source, loading one wafer at a time."""
+    files = find_wafer_files(source)
+    if not files:
+        status(f"⚠️ No .wmap.csv files found in {source}")
+    stack = LotStack()
+    for path in files:
+        try:
+            wafer = load_wafer(path, use_cache=use_cache)
+            stack.add_wafer(wafer)
+        except Exception as e:
+            status(f"❌ {os.path.basename(path)}: {e}")
+            continue
+        status(f"✅ {os.path.basename(path)} (W#{str(wafer.slot).zfill(2)}) stacked")
+    return stack
+
+
+def write_lot_map_workbook(stack, out_file):
+    wb = openpyxl.Workbook()
+    wb.remove(wb.active)
+    write_lot_map_sheets(wb, stack)
+    with replacing(out_file) as tmp:
+        wb.save(tmp)
+    wb.close()
+
+
+def run_batch(source, c1_mark=None, out_dir=None, lot_file=None, workers=None, status=print, use_cache=True,
+              force=False):
+    """Process every wafer in source; returns the successful WaferResults."""
+    files = find_wafer_files(source)
+    if not files:
+        status(f"⚠️ No .wmap.csv files found in {source}")
+        return []
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+
+    status(f"ℹ️ Processing {len(files)} wafer file(s)...")
+    results = []
+    write_each = lot_file is None
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(process_file, path, c1_mark, out_dir, write_each, use_cache, force): path
+                   for path in files}
+        for future in as_completed(futures):
+            path = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                status(f"❌ {os.path.basename(path)}: {e}")
+                continue
+            results.append(result)
+            where = result.out_file or "lot workbook"
+            if result.up_to_date:
+                where += " (up to date, skipped)"
+            status(f"✅ {os.path.basename(path)} (W#{str(result.slot).zfill(2)}) → {where}")
+
+    if lot_file and results:
+        write_lot_workbook(results, lot_file)
+        status(f"✅ Lot workbook saved at: {lot_file}")
+    return results
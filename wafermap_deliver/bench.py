@@ -0,0 +1,147 @@
+import json
+import os
+import platform
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+import openpyxl
+
+from .parser import parse_wmap_csv
+from .pipeline import add_fallout, add_fallout_limits, add_wafermap, check_end_test, convert_csv, default_c1_mark
+from .startup import startup_report
+from .synthetic import write_synthetic_wafer
+
+# Stage benchmarks on synthetic wafers: parse, convert, fallout, End Test
+# lookup and wafermap rendering are timed (best of `repeat` runs) and
+# memory-profiled (tracemalloc peak, which includes NumPy buffers) one by one
+# for each wafer size, plus the CLI startup cost. Results are stored as JSON so
+# two runs can be compared.
+
+BENCH_VERSION = 1
+DEFAULT_SIZES = (7458, 50000, 200000)
+STAGES = ("parse", "convert", "fallout", "end_test", "wafermap")
+MIN_SECONDS = 0.05  # stages faster than this are too noisy to call a regression
+
+
+def _timed(func, repeat):
+    best, result = None, None
+    for _ in range(max(repeat, 1)):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+def _peak_mib(func):
+    # Separate run: tracemalloc slows Python-heavy code down too much to time it at the same time
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak / 2 ** 20
+
+
+def bench_case(csv_path, work_dir, repeat=1, memory=True):
+    """{stage: {"seconds", "peak_mib"}} for one wafer file."""
+    out_file = os.path.join(work_dir, "bench.xlsx")
+    wafer = parse_wmap_csv(csv_path)
+    mark = default_c1_mark(wafer)
+    wb = openpyxl.Workbook()
+
+    def convert():
+        convert_csv(csv_path, out_file, use_cache=False)[1].close()
+
+    stages = {
+        "parse": lambda: parse_wmap_csv(csv_path),
+        "convert": convert,
+        "fallout": lambda: add_fallout(wb, wafer, mark),
+        "end_test": lambda: (check_end_test(wb, wafer), add_fallout_limits(wb, wafer, mark)),
+        "wafermap": lambda: add_wafermap(wb, wafer),
+    }
+    results = {}
+    for name in STAGES:
+        _, seconds = _timed(stages[name], repeat)
+        results[name] = {"seconds": round(seconds, 4)}
+        if memory:
+            results[name]["peak_mib"] = round(_peak_mib(stages[name]), 2)
+    return results
+
+
+def run_bench(sizes=DEFAULT_SIZES, diameter_mm=300.0, fail_rate=0.1, et_count=50, limit_rows=100, repeat=1,
+              memory=True, work_dir=None, status=print):
+    """Generate one synthetic wafer per die count and benchmark every stage on it."""
+    report = {
+        "version": BENCH_VERSION,
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "openpyxl": openpyxl.__version__,
+        "platform": platform.platform(),
+        "cases": [],
+    }
+    with tempfile.TemporaryDirectory(dir=work_dir) as tmp:
+        for dies in sizes:
+            params = {"dies": dies, "diameter_mm": diameter_mm, "fail_rate": fail_rate, "et_count": et_count,
+                      "limit_rows": limit_rows}
+            csv_path = write_synthetic_wafer(os.path.join(tmp, f"SYNTH_{dies}.wmap.csv"), **params)
+            status(f"ℹ️ Benchmarking {dies} dies...")
+            stages = bench_case(csv_path, tmp, repeat, memory)
+            report["cases"].append({
+                "params": params,
+                "file_mib": round(os.path.getsize(csv_path) / 2 ** 20, 2),
+                "stages": stages,
+            })
+            status("\n".join(case_lines(report["cases"][-1])))
+    report["startup"] = startup_report()
+    return report
+
+
+def case_lines(case):
+    lines = [f"{'Stage':<12}{'Seconds':<12}{'Peak MiB'}"]
+    for name, stage in case["stages"].items():
+        peak = stage.get("peak_mib", "")
+        lines.append(f"{name:<12}{stage['seconds']:<12.4f}{peak}")
+    return lines
+
+
+def save_report(report, path):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+
+def load_report(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def compare_reports(current, baseline, threshold=0.2):
+    """(lines, regressions): per case and stage, baseline vs current seconds.
+
+    A stage is a regression when it got more than `threshold` (20%) slower and
+    takes at least MIN_SECONDS. Cases are matched on their generator parameters.
+    """
+    base_cases = {json.dumps(case["params"], sort_keys=True): case for case in baseline["cases"]}
+    lines, regressions = [], []
+    for case in current["cases"]:
+        base = base_cases.get(json.dumps(case["params"], sort_keys=True))
+        if base is None:
+            lines.append(f"{case['params']['dies']} dies: not in the baseline")
+            continue
+        lines.append(f"\n{case['params']['dies']} dies:")
+        lines.append(f"{'Stage':<12}{'Baseline':<12}{'Now':<12}{'Change'}")
+        for name, stage in case["stages"].items():
+            before = base["stages"].get(name, {}).get("seconds")
+            if not before:
+                continue
+            change = stage["seconds"] / before - 1
+            flag = " ⚠️" if change > threshold and stage["seconds"] >= MIN_SECONDS else ""
+            lines.append(f"{name:<12}{before:<12.4f}{stage['seconds']:<12.4f}{change:+.0%}{flag}")
+            if flag:
+                regressions.append((case["params"]["dies"], name, change))
+    return lines, regressions
@@ -0,0 +1,166 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from .metrics import count, span
+from .dietable import DieTable
+from .parser import WaferData, parse_wmap_csv
+
+# Sidecar columnar cache of parsed wafer data.
+# <name>.wmap.csv.cache/ holds one .npy file per DieTable column (memory-mapped
+# on load), plus the value dictionary of each coded column, and meta.json with the header block, limit table and the key of the
+# CSV it came from: size + mtime for the quick check, SHA-256 when the mtime
+# moved but the size did not (e.g. the file was copied or touched).
+
+CACHE_VERSION = 2
+HASH_CHUNK = 1 << 20
+
+
+def cache_path(csv_path, cache_dir=None):
+    name = os.path.basename(csv_path) + ".cache"
+    return os.path.join(cache_dir or os.path.dirname(os.path.abspath(csv_path)), name)
+
+
+def file_digest(path):
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_CHUNK), b""):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def _read_meta(folder):
+    try:
+        with open(os.path.join(folder, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return meta if meta.get("version") == CACHE_VERSION else None
+
+
+def _write_meta(folder, meta):
+    tmp = os.path.join(folder, "meta.json.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    os.replace(tmp, os.path.join(folder, "meta.json"))
+
+
+def source_digest(csv_path, cache_dir=None):
+    """SHA-256 of the CSV, reused from the cache when size and mtime still match."""
+    st = os.stat(csv_path)
+    meta = _read_meta(cache_path(csv_path, cache_dir))
+    if meta and meta["size"] == st.st_size and meta["mtime_ns"] == st.st_mtime_ns:
+        return meta["sha256"]
+    return file_digest(csv_path)
+
+
+def read_cache(csv_path, cache_dir=None):
+    """Cached WaferData for csv_path, or None when missing or stale."""
+    folder = cache_path(csv_path, cache_dir)
+    meta = _read_meta(folder)
+    if meta is None:
+        return None
+
+    st = os.stat(csv_path)
+    if meta["size"] != st.st_size:
+        return None
+    if meta["mtime_ns"] != st.st_mtime_ns:
+        if meta["sha256"] != file_digest(csv_path):
+            return None
+        meta["mtime_ns"] = st.st_mtime_ns
+        try:
+            _write_meta(folder, meta)
+        except OSError:
+            pass
+
+    try:
+        columns = {name: np.load(os.path.join(folder, f"col_{i:02d}.npy"), mmap_mode="r")
+                   for i, name in enumerate(meta["columns"])}
+        dictionary = {name: np.load(os.path.join(folder, f"dict_{i:02d}.npy"))
+                      for i, name in enumerate(meta["columns"]) if name in meta["coded"]}
+    except (OSError, ValueError):
+        return None
+    dies = DieTable(columns, dictionary)
+    wafer = WaferData(csv_path, meta["header"], meta["preamble_rows"], meta["limit_rows"],
+                      meta["die_header"], dies)
+    wafer.digest = meta["sha256"]
+    return wafer
+
+
+def write_cache(wafer, cache_dir=None):
+    folder = cache_path(wafer.path, cache_dir)
+    os.makedirs(folder, exist_ok=True)
+
+    # meta.json goes last, so a half-written cache is never picked up
+    meta_file = os.path.join(folder, "meta.json")
+    if os.path.exists(meta_file):
+        os.remove(meta_file)
+
+    dies = wafer.dies
+    columns = list(dies)
+    for i, name in enumerate(columns):
+        np.save(os.path.join(folder, f"col_{i:02d}.npy"), np.ascontiguousarray(dies.codes(name)))
+        if dies.is_coded(name):
+            np.save(os.path.join(folder, f"dict_{i:02d}.npy"), dies.categories(name))
+
+    st = os.stat(wafer.path)
+    if wafer.digest is None:
+        wafer.digest = file_digest(wafer.path)
+    _write_meta(folder, {
+        "version": CACHE_VERSION,
+        "size": st.st_size,
+        "mtime_ns": st.st_mtime_ns,
+        "sha256": wafer.digest,
+        "header": wafer.header,
+        "preamble_rows": wafer.preamble_rows,
+        "limit_rows": wafer.limit_rows,
+        "die_header": wafer.die_header,
+        "columns": columns,
+        "coded": [name for name in columns if dies.is_coded(name)],
+    })
+
+
+def wafer_digest(wafer):
+    """SHA-256 of the wafer's CSV, hashed at most once per WaferData."""
+    if wafer.digest is None:
+        wafer.digest = source_digest(wafer.path)
+    return wafer.digest
+
+
+def load_wafer(csv_path, progress=None, row_sink=None, cache_dir=None, use_cache=True, jobs=1):
+    """parse_wmap_csv with the sidecar cache in front of it.
+
+    A cache hit skips parsing entirely (row_sink still gets every row, replayed
+    from the cached columns). A miss parses the CSV and writes the cache; a
+    cache that cannot be written (read-only share) is silently skipped.
+    jobs > 1 (or None for every core) parses a large die table in parallel.
+    """
+    if use_cache:
+        with span("read cache"):
+            wafer = read_cache(csv_path, cache_dir)
+            if wafer is not None and row_sink:
+                for row in wafer.iter_rows():
+                    row_sink(row)
+        if wafer is not None:
+            count("dies", wafer.die_count)
+            return wafer
+
+    with span("parse CSV"):
+        if jobs == 1:
+            wafer = parse_wmap_csv(csv_path, progress, row_sink)
+        else:
+            from .chunked import parse_parallel
+
+            wafer = parse_parallel(csv_path, jobs, progress, row_sink)
+    count("dies", wafer.die_count)
+    count("die_table_bytes", wafer.dies.nbytes)
+    count("bytes_read", os.path.getsize(csv_path))
+    if use_cache:
+        try:
+            with span("write cache"):
+                write_cache(wafer, cache_dir)
+        except OSError:
+            pass
+    return wafer
@@ -0,0 +1,246 @@
+import mmap
+import multiprocessing
+import os
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from .dietable import DieTable
+from .metrics import count, span
+from .parser import FAST_TEXT_WIDTH, INT_COLUMNS, _die_rows, die_table_from_bytes, parse_wmap_csv, read_header
+from .wafermap import grid_from_points
+
+# Parallel parsing of one very large .wmap.csv. The die table is cut into
+# byte ranges that end on a newline and each range is parsed in its own
+# worker process. Workers write their rows straight into shared (anonymous
+# mmap) column arrays at their own row offset, so the parent never copies or
+# concatenates the integer columns. Each worker also returns DieStats
+# partial aggregates, which merge into the fallout counts and the wafermap
+# grid without the full die table ever existing in one process.
+
+CHUNK_BYTES = 16 * 2 ** 20
+PARALLEL_MIN_BYTES = 8 * 2 ** 20  # below this, one core finishes before a pool has started
+XY_MASK = 0xFFFFFFFF
+
+_SHARED = {}  # column -> shared array; filled before the pool forks so every worker inherits it
+
+
+def _pack_xy(x, y):
+    return (np.asarray(x, dtype=np.int64) << 32) | (np.asarray(y, dtype=np.int64) & XY_MASK)
+
+
+def _unpack_xy(keys):
+    y = keys & XY_MASK
+    return keys >> 32, np.where(y > 0x7FFFFFFF, y - (1 << 32), y)
+
+
+def _min_per_key(keys, et):
+    # Lowest ET for each distinct key: sort by (key, ET) and keep each key's first row
+    order = np.lexsort((et, keys))
+    keys, first = np.unique(keys[order], return_index=True)
+    return keys, et[order][first]
+
+
+class DieStats:
+    """Mergeable die-table aggregates: die count, (C1_MARK, ET) counts and min ET per (X, Y)."""
+
+    def __init__(self):
+        self.dies = 0
+        self.mark_et = Counter()  # (mark, ET) -> dies
+        self.first_seen = {}      # mark -> first row it appears on
+        self.xy = np.zeros(0, dtype=np.int64)      # packed (X, Y) keys, ascending
+        self.min_et = np.zeros(0, dtype=np.int64)  # lowest ET per key
+
+    @classmethod
+    def from_columns(cls, dies, row0=0):
+        stats = cls()
+        if "ET" not in dies or not len(dies["ET"]):
+            return stats
+        et = dies["ET"].astype(np.int64)
+        marks, first, mark_codes = np.unique(np.char.strip(dies["C1_MARK"]), return_index=True,
+                                             return_inverse=True)
+        ets, et_codes = np.unique(et, return_inverse=True)
+        counts = np.bincount(mark_codes * len(ets) + et_codes, minlength=len(marks) * len(ets))
+        rows, cols = np.nonzero(counts.reshape(len(marks), len(ets)))
+        mark_list, et_list = marks.tolist(), ets.tolist()
+        flat = (rows * len(ets) + cols).tolist()
+        stats.dies = len(et)
+        stats.mark_et.update({(mark_list[r], et_list[c]): int(counts[i])
+                              for r, c, i in zip(rows.tolist(), cols.tolist(), flat)})
+        stats.first_seen = {mark: row0 + int(i) for mark, i in zip(mark_list, first.tolist())}
+        stats.xy, stats.min_et = _min_per_key(_pack_xy(dies["X"], dies["Y"]), et)
+        return stats
+
+    @classmethod
+    def merged(cls, parts):
+        """One DieStats for the whole file from the per-chunk ones."""
+        stats = cls()
+        for part in parts:
+            stats.dies += part.dies
+            stats.mark_et.update(part.mark_et)
+            for mark, row in part.first_seen.items():
+                stats.first_seen[mark] = min(row, stats.first_seen.get(mark, row))
+        if parts:
+            stats.xy, stats.min_et = _min_per_key(np.concatenate([part.xy for part in parts]),
+                                                  np.concatenate([part.min_et for part in parts]))
+        return stats
+
+    def c1_mark_values(self):
+        """Same as WaferData.c1_mark_values(): non-empty marks in order of first appearance."""
+        return [mark for mark in sorted(self.first_seen, key=self.first_seen.get) if mark]
+
+    def default_c1_mark(self):
+        """Same as pipeline.default_c1_mark(): most frequent fail mark, else the first mark."""
+        fails = Counter()
+        for (mark, et), n in self.mark_et.items():
+            if et != 0:
+                fails[mark] += n
+        if fails:
+            return max(sorted(fails), key=lambda mark: fails[mark])
+        values = self.c1_mark_values()
+        return values[0] if values else None
+
+    def et_counts(self, c1_mark):
+        """(ETs ascending, die counts) for one C1_MARK, like fallout.et_counts."""
+        pairs = sorted((et, n) for (mark, et), n in self.mark_et.items() if mark == c1_mark)
+        ets = np.array([et for et, _ in pairs], dtype=np.int64)
+        return ets, np.array([n for _, n in pairs], dtype=np.int64)
+
+    def fallout_table(self, c1_mark, theoretical_num):
+        from .fallout import _table_from_counts
+
+        return _table_from_counts(*self.et_counts(c1_mark), theoretical_num)
+
+    def wafermap_grid(self, compact=True):
+        """(x_labels, y_labels, grid) like build_wafermap_grid, from the per-coordinate minimums."""
+        if not self.dies:
+            raise ValueError("Die table is empty, nothing to map")
+        x, y = _unpack_xy(self.xy)
+        return grid_from_points(x, y, self.min_et, compact)
+
+
+def chunk_ranges(path, start, chunk_bytes=CHUNK_BYTES):
+    """[(begin, end, lines)] byte ranges covering the file from start, each ending on a newline."""
+    size = os.path.getsize(path)
+    ranges = []
+    if start >= size:
+        return ranges
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        begin = start
+        while begin < size:
+            end = min(begin + chunk_bytes, size)
+            if end < size:
+                newline = mm.find(b"\n", end - 1)
+                end = size if newline < 0 else newline + 1
+            lines = mm[begin:end].count(b"\n") + (mm[end - 1] != ord("\n"))
+            ranges.append((begin, end, lines))
+            begin = end
+    return ranges
+
+
+def _parse_range(path, begin, end, die_header, row0, mode):
+    # Worker: parse one byte range; mode is "shared" (write into _SHARED), "return" or "stats"
+    with open(path, "rb") as f:
+        f.seek(begin)
+        dies = die_table_from_bytes(f.read(end - begin), die_header)
+    rows = len(next(iter(dies.values()))) if dies else 0
+    stats = DieStats.from_columns(dies, row0)
+    if mode == "shared":
+        for name, col in dies.items():
+            target = _SHARED[name]
+            if col.dtype.itemsize > target.dtype.itemsize:
+                raise ValueError(f"{name} values are too wide for the shared column")
+            target[row0:row0 + rows] = col
+    return rows, stats, dies if mode == "return" else None
+
+
+def _shared_columns(die_header, rows):
+    for name in die_header:
+        dtype = np.dtype(np.int32 if name in INT_COLUMNS else f"U{FAST_TEXT_WIDTH}")
+        buf = mmap.mmap(-1, max(rows * dtype.itemsize, 1))  # anonymous and MAP_SHARED: forked workers write here
+        _SHARED[name] = np.frombuffer(buf, dtype=dtype, count=rows)
+
+
+def _run_chunks(path, jobs, chunk_bytes, mode, progress=None):
+    """(header-only WaferData, merged DieStats, DieTable or None) for one file."""
+    wafer, start = read_header(path)
+    if wafer.die_header is None:
+        return wafer, DieStats(), DieTable()
+    ranges = chunk_ranges(path, start, chunk_bytes)
+    row0s = np.concatenate([[0], np.cumsum([lines for _, _, lines in ranges], dtype=np.int64)]).tolist()
+    if mode == "shared" and "fork" not in multiprocessing.get_all_start_methods():
+        mode = "return"  # workers can't inherit the shared columns; they send theirs back instead
+    context = multiprocessing.get_context("fork") if mode == "shared" else None
+
+    count("chunks", len(ranges))
+    partials, parts, done = [], [], 0
+    if mode == "shared":
+        _shared_columns(wafer.die_header, row0s[-1])
+    try:
+        with ProcessPoolExecutor(max_workers=jobs, mp_context=context) as pool:
+            futures = [pool.submit(_parse_range, path, begin, end, wafer.die_header, row0, mode)
+                       for (begin, end, _), row0 in zip(ranges, row0s)]
+            for future, row0 in zip(futures, row0s):
+                rows, partial, dies = future.result()
+                partials.append(partial)
+                parts.append((row0, rows, dies))
+                done += rows
+                if progress:
+                    progress("Rows parsed", done)
+        shared = dict(_SHARED)
+    finally:
+        _SHARED.clear()
+    stats = DieStats.merged(partials)
+
+    if mode == "stats":
+        return wafer, stats, None
+    names = list(dict.fromkeys(wafer.die_header))
+    if mode == "return":
+        columns = {name: np.concatenate([dies[name] for _, _, dies in parts]) for name in names}
+    elif all(rows == lines for (_, rows, _), (_, _, lines) in zip(parts, ranges)):
+        columns = {name: shared[name][:done] for name in names}  # rows are already contiguous
+    else:
+        # Blank or skipped lines left gaps after some chunks: one compacting copy
+        columns = {name: np.concatenate([shared[name][row0:row0 + rows] for row0, rows, _ in parts])
+                   for name in names}
+    return wafer, stats, DieTable.from_columns(columns)
+
+
+def parse_parallel(path, jobs=None, progress=None, row_sink=None, chunk_bytes=CHUNK_BYTES):
+    """parse_wmap_csv with the die table parsed by `jobs` worker processes (default: CPU count).
+
+    Files under PARALLEL_MIN_BYTES are parsed in-process. If any chunk can't be
+    parsed on its own, the whole file goes through parse_wmap_csv instead.
+    """
+    jobs = jobs or os.cpu_count() or 1
+    if jobs == 1 or os.path.getsize(path) < PARALLEL_MIN_BYTES:
+        return parse_wmap_csv(path, progress, row_sink)
+    try:
+        with span("parse chunks"):
+            wafer, _, dies = _run_chunks(path, jobs, chunk_bytes, "shared", progress)
+    except ValueError:
+        count("chunked_parse_fallback")
+        return parse_wmap_csv(path, progress, row_sink)
+    wafer.dies = dies
+    if row_sink:
+        for row in wafer.preamble_rows:
+            row_sink(row)
+        if wafer.die_header is not None:
+            row_sink(wafer.die_header)
+            for row in _die_rows(dies, wafer.die_header, progress):
+                row_sink(row)
+    return wafer
+
+
+def scan_die_stats(path, jobs=None, progress=None, chunk_bytes=CHUNK_BYTES):
+    """(WaferData without die rows, DieStats): fallout and wafermap inputs without keeping the die table."""
+    jobs = jobs or os.cpu_count() or 1
+    if jobs == 1 or os.path.getsize(path) < PARALLEL_MIN_BYTES:
+        wafer = parse_wmap_csv(path, progress)
+        stats = DieStats.from_columns(wafer.dies)
+        wafer.dies = DieTable()
+        return wafer, stats
+    with span("scan chunks"):
+        wafer, stats, _ = _run_chunks(path, jobs, chunk_bytes, "stats", progress)
+    return wafer, stats
@@ -0,0 +1,423 @@
+import argparse
+import os
+import sys
+
+from .metrics import collect, span
+from .startup import STARTUP_BUDGET_MS
+
+# Command-line entry point:
+# python -m wafermap_deliver convert|fallout|check|map|all|render|scan|batch|watch|stack|limits|synth|bench|startup
+# Runs the same stages as the GUI buttons, without Tk or Excel.
+# Each command imports what it needs when it runs, so --help, limits or render
+# never load openpyxl (see `startup`).
+
+
+def _status(message, color=None):
+    stream = sys.stderr if color == "#d32f2f" else sys.stdout
+    print(message, file=stream, flush=True)  # flushed so `watch` logs show up as they happen
+
+
+def _open_session(args):
+    # fallout/check/map build on the converted workbook, converting first if it is
+    # missing or its data sheet no longer matches the CSV
+    from .pipeline import convert_csv, open_converted, output_path
+
+    out_file = args.output or output_path(args.csv)
+    opened = open_converted(args.csv, out_file, use_cache=not args.no_cache, jobs=args.jobs)
+    if opened is not None:
+        return opened
+    wafer, session = convert_csv(args.csv, out_file, save=False, use_cache=not args.no_cache, jobs=args.jobs)
+    _status(f"✅ Conversion complete: CSV → .xlsx\nFile saved at: {out_file}")
+    return wafer, session
+
+
+def _skip(session, sheet, key, force):
+    # True (and say so) when sheet was already built from the same inputs
+    if force or not session.is_fresh(sheet, key):
+        return False
+    _status(f"⏭️ {sheet} is up to date, skipped.")
+    return True
+
+
+def _run_fallout(session, wafer, mark, force=False):
+    from .pipeline import add_fallout, default_c1_mark, fallout_preview_lines, pivot_key
+
+    mark = mark or default_c1_mark(wafer)
+    key = pivot_key(wafer, mark)
+    if _skip(session, "Pivot", key, force):
+        return
+    table = session.run_stage("Pivot", key, add_fallout, wafer, mark)
+    _status(f"Applied filter: {mark}\n\nPreview Table:")
+    _status("\n".join(fallout_preview_lines(table)))
+
+
+def _run_summary(session, wafer, marks, force=False):
+    from .pipeline import add_fallout_summary, summary_key, summary_preview_lines
+
+    key = summary_key(wafer, marks)
+    if _skip(session, "Fallout Summary", key, force):
+        return
+    tables = session.run_stage("Fallout Summary", key, add_fallout_summary, wafer, marks)
+    _status(f"✅ Fallout Summary sheet created for {len(tables)} C1_MARK value(s).")
+    _status("\n".join(summary_preview_lines(tables)))
+
+
+def _run_check(session, wafer, top=None, force=False):
+    from .limits import missing_end_tests
+    from .pipeline import (add_fallout_limits, check_end_test, limits_key, limits_preview_lines,
+                           reference_preview_lines)
+
+    key = limits_key(wafer, session.stamps.get("Pivot"), top)
+    if _skip(session, "Fallout Limits", key, force):
+        return True
+    end_test_no, reference = session.run(check_end_test, wafer)
+    _status(f"🔍Checking End Test No.: {end_test_no}")
+    if reference is None:
+        _status("❌ No End Test No. found in the TESTNO Column", color="#d32f2f")
+    else:
+        _status("End Test No. Reference:\n" + "\n".join(reference_preview_lines(reference)))
+        _status("✅ Found with Limits" if reference[-1] != "" else "⚠️ Found with no Limit")
+
+    annotated = session.run_stage("Fallout Limits", key, add_fallout_limits, wafer, None, top)
+    _status(f"\nFallout Limits ({len(annotated) - 1} End Test No.):")
+    _status("\n".join(limits_preview_lines(annotated)))
+    missing = missing_end_tests(annotated)
+    if missing:
+        _status(f"⚠️ Not in the TESTNO Column: {', '.join(missing)}")
+    return reference is not None
+
+
+def _run_map(session, wafer, force=False):
+    from .pipeline import add_wafermap, wafermap_key, wafermap_sheet_name
+
+    if wafer.slot is not None and _skip(session, wafermap_sheet_name(wafer.slot), wafermap_key(wafer), force):
+        return
+    sheet_name = session.run(add_wafermap, wafer)
+    session.stamp(sheet_name, wafermap_key(wafer))
+    _status(f"✅ Wafermap created on {sheet_name} sheet.")
+
+
+def _run_image(session, wafer, die_px, force=False):
+    from .pipeline import add_wafermap_image, wafermap_image_key, wafermap_image_name
+
+    key = wafermap_image_key(wafer, die_px)
+    if wafer.slot is not None and _skip(session, wafermap_image_name(wafer.slot), key, force):
+        return
+    sheet_name = session.run(add_wafermap_image, wafer, die_px)
+    session.stamp(sheet_name, key)
+    _status(f"✅ Wafermap image embedded on {sheet_name} sheet.")
+
+
+def cmd_convert(args):
+    from .pipeline import convert_csv, open_converted, sheet_title
+
+    if not args.force:
+        opened = open_converted(args.csv, args.output, use_cache=not args.no_cache, jobs=args.jobs)
+        if opened is not None and sheet_title(args.csv) in opened[1].stamps:
+            wafer, session = opened
+            _status(f"⏭️ {session.out_file} is up to date with the CSV, skipped.")
+            _status("C1_MARK values: " + " ".join(wafer.c1_mark_values()))
+            return 0
+    wafer, session = convert_csv(args.csv, args.output, use_cache=not args.no_cache, jobs=args.jobs)
+    session.close()
+    _status(f"✅ Conversion complete: CSV → .xlsx\nFile saved at: {session.out_file}")
+    _status("C1_MARK values: " + " ".join(wafer.c1_mark_values()))
+    return 0
+
+
+def cmd_stage(args):
+    with span("open"):
+        wafer, session = _open_session(args)
+    ok = True
+    with session:
+        if args.command in ("fallout", "all"):
+            with span("fallout"):
+                _run_fallout(session, wafer, args.mark, args.force)
+            if args.all_marks or args.marks:
+                with span("fallout summary"):
+                    _run_summary(session, wafer, args.marks, args.force)
+        if args.command in ("check", "all"):
+            with span("end test check"):
+                ok = _run_check(session, wafer, args.top, args.force)
+        if args.command in ("map", "all"):
+            with span("wafermap"):
+                _run_map(session, wafer, args.force)
+    return 0 if ok else 1
+
+
+def cmd_render(args):
+    from .cache import load_wafer
+    from .render import render_wafermap
+
+    wafer = load_wafer(args.csv, use_cache=not args.no_cache, jobs=args.jobs)
+    image = args.image or os.path.splitext(args.csv)[0] + ".png"
+    render_wafermap(wafer, image, args.die_px, labels=not args.no_labels)
+    _status(f"✅ Wafermap image saved at: {image}")
+    if args.embed:
+        with span("open"):
+            _, session = _open_session(args)
+        with session:
+            _run_image(session, wafer, args.die_px, args.force)
+    return 0
+
+
+def cmd_scan(args):
+    from .chunked import scan_die_stats
+    from .pipeline import fallout_preview_lines
+
+    wafer, stats = scan_die_stats(args.csv, args.jobs)
+    mark = args.mark or stats.default_c1_mark()
+    slot = "no SLOT value" if wafer.slot is None else f"W#{str(wafer.slot).zfill(2)}"
+    _status(f"{stats.dies:,} dies, {slot}")
+    _status("C1_MARK values: " + " ".join(stats.c1_mark_values()))
+    _status(f"Applied filter: {mark}\n\nPreview Table:")
+    _status("\n".join(fallout_preview_lines(stats.fallout_table(mark, wafer.theoretical_num))))
+    if args.image:
+        from .render import render_png, render_svg
+
+        render = render_svg if args.image.lower().endswith(".svg") else render_png
+        render(*stats.wafermap_grid(), args.image)
+        _status(f"✅ Wafermap image saved at: {args.image}")
+    return 0
+
+
+def cmd_batch(args):
+    from .batch import run_batch
+
+    results = run_batch(args.source, args.mark, args.out_dir, args.lot, args.workers, status=_status,
+                        use_cache=not args.no_cache, force=args.force)
+    return 0 if results else 1
+
+
+def cmd_watch(args):
+    from .watch import watch_folders
+
+    try:
+        watch_folders(args.dirs, args.mark, args.out_dir, args.workers, args.settle, args.poll,
+                      use_inotify=not args.no_inotify, status=_status, use_cache=not args.no_cache,
+                      force=args.force)
+    except KeyboardInterrupt:
+        _status("ℹ️ Stopped watching.")
+    return 0
+
+
+def cmd_stack(args):
+    from .batch import stack_lot, write_lot_map_workbook
+    from .lotmap import lot_map_preview_lines
+
+    stack = stack_lot(args.source, status=_status, use_cache=not args.no_cache)
+    if not stack.wafers:
+        return 1
+    write_lot_map_workbook(stack, args.output)
+    _status(f"✅ Stacked {stack.wafers} wafer(s) → {args.output}")
+    _status("Worst die positions:\n" + "\n".join(lot_map_preview_lines(stack)))
+    return 0
+
+
+def _limit_lines(rows):
+    return [f"{row[0]:<10}" + "".join(f"{str(v):<14}" for v in row[1:]) for row in rows]
+
+
+def cmd_limits(args):
+    from .cache import load_wafer
+    from .limittable import limit_changes
+
+    base = load_wafer(args.csv[0], use_cache=not args.no_cache).limits
+    for testno, column, text in base.unparsed:
+        _status(f"⚠️ TESTNO {testno}: {column} {text!r} is not a limit value")
+    if len(args.csv) == 1:
+        gb = base.guard_band()
+        rows = [["TESTNO", "MODE", "HILIMIT", "LOLIMIT", "Guard band"]]
+        for i in range(len(base)):
+            band = "" if gb[i] != gb[i] else f"{gb[i]:.6g} {base.hi_unit[i]}".strip()
+            rows.append([str(base.testno[i])] + base.describe(i) + [band])
+        _status("\n".join(_limit_lines(rows)))
+        return 0
+
+    for other in args.csv[1:]:
+        rows = limit_changes(base, load_wafer(other, use_cache=not args.no_cache).limits)
+        _status(f"\n{os.path.basename(other)} vs {os.path.basename(args.csv[0])}: {len(rows) - 1} change(s)")
+        if len(rows) > 1:
+            _status("\n".join(_limit_lines(rows)))
+    return 0
+
+
+def _synthetic_params(args):
+    return {"diameter_mm": args.diameter, "fail_rate": args.fail_rate, "et_count": args.ets,
+            "limit_rows": args.limit_rows}
+
+
+def cmd_synth(args):
+    from .synthetic import write_synthetic_wafer
+
+    write_synthetic_wafer(args.output, dies=args.dies, slot=args.slot, seed=args.seed, **_synthetic_params(args))
+    _status(f"✅ Synthetic wafer with {args.dies} dies saved at: {args.output}")
+    return 0
+
+
+def cmd_bench(args):
+    from .bench import DEFAULT_SIZES, compare_reports, load_report, run_bench, save_report
+
+    from .startup import startup_lines, startup_problems
+
+    report = run_bench(args.sizes or DEFAULT_SIZES, repeat=args.repeat, memory=not args.no_memory, status=_status,
+                       **_synthetic_params(args))
+    _status("\n".join(startup_lines(report["startup"])))
+    problems = startup_problems(report["startup"], args.startup_budget)
+    if args.output:
+        save_report(report, args.output)
+        _status(f"✅ Benchmark results saved at: {args.output}")
+    if args.compare:
+        lines, regressions = compare_reports(report, load_report(args.compare), args.threshold)
+        _status("\n".join(lines))
+        if regressions:
+            _status(f"❌ {len(regressions)} stage(s) slower than the baseline", color="#d32f2f")
+            return 1
+    for problem in problems:
+        _status(f"❌ Startup over budget: {problem}", color="#d32f2f")
+    return 1 if problems else 0
+
+
+def cmd_startup(args):
+    from .startup import startup_lines, startup_problems, startup_report
+
+    report = startup_report(args.repeat)
+    _status("\n".join(startup_lines(report)))
+    problems = startup_problems(report, args.budget)
+    for problem in problems:
+        _status(f"❌ Startup over budget: {problem}", color="#d32f2f")
+    if not problems:
+        _status(f"✅ Within the {args.budget:.0f} ms startup budget")
+    return 1 if problems else 0
+
+
+def _add_synthetic_args(p):
+    p.add_argument("--diameter", type=float, default=300.0, help="wafer diameter in mm (default: 300)")
+    p.add_argument("--fail-rate", type=float, default=0.1, help="share of failing dies (default: 0.1)")
+    p.add_argument("--ets", type=int, default=50, help="distinct fail End Test Nos. (default: 50)")
+    p.add_argument("--limit-rows", type=int, default=100, help="limit-table rows (default: 100)")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="python -m wafermap_deliver",
+        description="Deliverables automation for qccsvout .wmap.csv wafer files, without the GUI.",
+    )
+    parser.add_argument("--no-cache", action="store_true",
+                        help="always re-parse the CSV instead of using its .cache sidecar")
+    parser.add_argument("--timings", action="store_true",
+                        help="print a per-step timing breakdown when the command finishes")
+    parser.add_argument("--metrics", metavar="FILE",
+                        help="append per-step timings and counters to a JSON-lines metrics file")
+    parser.add_argument("--force", action="store_true",
+                        help="rebuild every sheet, even the ones whose inputs have not changed")
+    parser.add_argument("--jobs", type=int, default=1, metavar="N",
+                        help="parse a large CSV's die table in N processes (0: one per CPU; default: 1)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    for name, help_text in [
+        ("convert", "convert the CSV to an .xlsx data sheet"),
+        ("fallout", "add the fallout table for one C1_MARK (Pivot sheet)"),
+        ("check", "look up the fallout End Test Nos. in the limit table"),
+        ("map", "add the wafermap sheet for the wafer's SLOT"),
+        ("all", "fallout, check and map in one go"),
+    ]:
+        p = sub.add_parser(name, help=help_text)
+        p.add_argument("csv", help="input .wmap.csv file")
+        p.add_argument("-o", "--output", help="output .xlsx (default: next to the CSV)")
+        if name in ("fallout", "all"):
+            p.add_argument("--mark", help="C1_MARK filter (default: most common fail mark)")
+            p.add_argument("--all-marks", action="store_true",
+                           help="also write a Fallout Summary sheet with a table for every C1_MARK")
+            p.add_argument("--marks", nargs="+", metavar="MARK",
+                           help="Fallout Summary sheet for just these C1_MARK values")
+        if name in ("check", "all"):
+            p.add_argument("--top", type=int, metavar="N",
+                           help="Fallout Limits sheet for the top N fallout ETs only (default: all)")
+        p.set_defaults(func=cmd_convert if name == "convert" else cmd_stage)
+
+    p = sub.add_parser("render", help="wafermap as a PNG or SVG image, without Excel")
+    p.add_argument("csv", help="input .wmap.csv file")
+    p.add_argument("image", nargs="?", help="output .png or .svg (default: .png next to the CSV)")
+    p.add_argument("--die-px", type=int, default=8, help="pixels per die (default: 8)")
+    p.add_argument("--no-labels", action="store_true", help="leave out the X/Y axis labels")
+    p.add_argument("--embed", action="store_true",
+                   help="also put the PNG on its own sheet of the converted workbook (needs Pillow)")
+    p.add_argument("-o", "--output", help="workbook for --embed (default: next to the CSV)")
+    p.set_defaults(func=cmd_render)
+
+    p = sub.add_parser("scan", help="fallout and wafermap of a huge CSV from per-chunk aggregates, no workbook")
+    p.add_argument("csv", help="input .wmap.csv file")
+    p.add_argument("--mark", help="C1_MARK filter (default: most common fail mark)")
+    p.add_argument("--image", help="also render the wafermap to this .png or .svg")
+    p.set_defaults(func=cmd_scan)
+
+    p = sub.add_parser("batch", help="run the full chain for every wafer of a lot")
+    p.add_argument("source", help="directory of .wmap.csv files, or a glob pattern")
+    p.add_argument("--mark", help="C1_MARK filter (default: most common fail mark)")
+    p.add_argument("--out-dir", help="where per-wafer workbooks go (default: next to each CSV)")
+    p.add_argument("--lot", help="write one combined lot workbook to this path instead")
+    p.add_argument("--workers", type=int, help="worker processes (default: CPU count)")
+    p.set_defaults(func=cmd_batch)
+
+    p = sub.add_parser("watch", help="process every .wmap.csv dropped into the given folders, until Ctrl+C")
+    p.add_argument("dirs", nargs="+", metavar="DIR", help="folders the tester writes its .wmap.csv files to")
+    p.add_argument("--mark", help="C1_MARK filter (default: most common fail mark)")
+    p.add_argument("--out-dir", help="results folder (default: next to each CSV)")
+    p.add_argument("--workers", type=int, help="worker processes (default: CPU count)")
+    p.add_argument("--settle", type=float, default=2.0,
+                   help="seconds a file must stay unchanged before it is processed (default: 2)")
+    p.add_argument("--poll", type=float, default=1.0, help="seconds between folder checks (default: 1)")
+    p.add_argument("--no-inotify", action="store_true", help="poll the folders even where inotify is available")
+    p.set_defaults(func=cmd_watch)
+
+    p = sub.add_parser("stack", help="stacked fail-rate and top-ET maps over every wafer of a lot")
+    p.add_argument("source", help="directory of .wmap.csv files, or a glob pattern")
+    p.add_argument("-o", "--output", default="lot_map.xlsx", help="output .xlsx (default: lot_map.xlsx)")
+    p.set_defaults(func=cmd_stack)
+
+    p = sub.add_parser("limits", help="limit table in SI units, or its changes against other test programs")
+    p.add_argument("csv", nargs="+", help="base .wmap.csv, then any files to compare against it")
+    p.set_defaults(func=cmd_limits)
+
+    p = sub.add_parser("synth", help="write a synthetic qccsvout .wmap.csv for testing")
+    p.add_argument("output", help="output .wmap.csv")
+    p.add_argument("--dies", type=int, default=7458, help="die count (default: 7458)")
+    p.add_argument("--slot", type=int, default=1, help="SLOT value (default: 1)")
+    p.add_argument("--seed", type=int, default=0, help="random seed (default: 0)")
+    _add_synthetic_args(p)
+    p.set_defaults(func=cmd_synth)
+
+    p = sub.add_parser("bench", help="time and memory-profile every stage on synthetic wafers")
+    p.add_argument("--sizes", type=int, nargs="+", metavar="DIES",
+                   help="die counts to benchmark (default: 7458 50000 200000)")
+    p.add_argument("--repeat", type=int, default=1, help="timed runs per stage, best one kept (default: 1)")
+    p.add_argument("--no-memory", action="store_true", help="skip the tracemalloc peak-memory runs")
+    p.add_argument("-o", "--output", help="save the results as JSON")
+    p.add_argument("--compare", metavar="JSON", help="baseline results to compare against")
+    p.add_argument("--threshold", type=float, default=0.2,
+                   help="slowdown that counts as a regression with --compare (default: 0.2)")
+    p.add_argument("--startup-budget", type=float, default=STARTUP_BUDGET_MS, metavar="MS",
+                   help="fail when CLI startup takes longer (default: %(default).0f)")
+    _add_synthetic_args(p)
+    p.set_defaults(func=cmd_bench)
+
+    p = sub.add_parser("startup", help="CLI startup and import time, checked against the startup budget")
+    p.add_argument("--budget", type=float, default=STARTUP_BUDGET_MS, metavar="MS",
+                   help="fail when `--help` takes longer than this (default: %(default).0f)")
+    p.add_argument("--repeat", type=int, default=5, help="fresh runs timed, best one kept (default: 5)")
+    p.set_defaults(func=cmd_startup)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        with collect(args.command, args.metrics) as metrics:
+            code = args.func(args)
+    except Exception as e:
+        _status(f"❌ Error: {e}", color="#d32f2f")
+        return 1
+    if args.timings:
+        _status("\n⏱️ Timing breakdown:\n" + "\n".join(metrics.breakdown_lines()))
+    return code
@@ -0,0 +1,140 @@
+from collections.abc import Mapping
+
+import numpy as np
+
+# Compact in-memory die table. Coordinate and counter columns (X, Y, INDEX,
+# DUT, C1, C2) are stored in the narrowest integer type their range fits.
+# Text columns (G/N, C1_MARK, C2_MARK) are dictionary-encoded: small unsigned
+# codes plus the distinct values in order of first appearance. FT/ET are codes
+# into their sorted TESTNO values, so comparing codes compares test numbers.
+# A synthetic 1M-die wafer takes 13 MB instead of 44 MB of int32/str columns.
+
+SORTED_COLUMNS = ("FT", "ET")  # integer columns coded by value order
+DENSE_RANGE = 1 << 20          # int columns spanning fewer values are coded with a lookup table
+
+
+def code_dtype(n):
+    """Smallest unsigned type that can index n categories."""
+    for dtype in (np.uint8, np.uint16, np.uint32):
+        if n <= np.iinfo(dtype).max + 1:
+            return np.dtype(dtype)
+    return np.dtype(np.uint64)
+
+
+def narrow_int(col):
+    """col in the smallest signed integer type its values fit."""
+    col = np.asarray(col)
+    if not len(col):
+        return col.astype(np.int16)
+    lo, hi = int(col.min()), int(col.max())
+    for dtype in (np.int8, np.int16, np.int32):
+        info = np.iinfo(dtype)
+        if info.min <= lo and hi <= info.max:
+            return col.astype(dtype, copy=False)
+    return col
+
+
+def encode_sorted(col):
+    """(categories ascending, codes) for an integer column."""
+    col = np.asarray(col)
+    if len(col):
+        lo, hi = int(col.min()), int(col.max())
+        if hi - lo < DENSE_RANGE:
+            # Linear time: mark the values present, then a cumulative count is the code of each value
+            offset = col.astype(np.int64) - lo
+            present = np.zeros(hi - lo + 1, dtype=bool)
+            present[offset] = True
+            lookup = (np.cumsum(present) - 1).astype(code_dtype(int(present.sum())))
+            return narrow_int(np.flatnonzero(present) + lo), lookup[offset]
+    categories, codes = np.unique(col, return_inverse=True)
+    return narrow_int(categories), codes.astype(code_dtype(len(categories)))
+
+
+def encode_first_seen(col):
+    """(categories in order of first appearance, codes) for a text column."""
+    col = np.asarray(col)
+    keys = np.zeros(len(col), dtype=np.int64)
+    if len(col) and col.dtype.itemsize:
+        # Linear time, no string sort: fold the per-character codes into one dense key per value
+        chars = col.view(np.uint32).reshape(len(col), -1)
+        for i in range(chars.shape[1]):
+            values, codes = encode_sorted(chars[:, i])
+            keys = encode_sorted(keys * len(values) + codes)[1].astype(np.int64)
+    n = int(keys.max()) + 1 if len(col) else 0
+    first = np.full(n, len(col), dtype=np.int64)
+    np.minimum.at(first, keys, np.arange(len(col)))
+    order = np.argsort(first, kind="stable")
+    rank = np.empty(n, dtype=code_dtype(n))
+    rank[order] = np.arange(n)
+    categories = col[first[order]]
+    width = int(np.char.str_len(categories).max()) if n else 1
+    return categories.astype(f"U{max(width, 1)}"), rank[keys]
+
+
+class DieTable(Mapping):
+    """Die table columns, narrowed and dictionary-encoded.
+
+    Reads like the old {column: array} dict: table[name] decodes a whole
+    column. Stages that scan the table work on codes(name) and
+    categories(name) instead, so they never materialize the decoded values.
+    """
+
+    def __init__(self, columns=None, dictionary=None):
+        self.columns = dict(columns or {})        # name -> int values, or codes for coded columns
+        self.dictionary = dict(dictionary or {})  # coded column name -> its distinct values
+
+    @classmethod
+    def from_columns(cls, columns):
+        """Encode plain {name: array} columns (as the parser builds them)."""
+        table = cls()
+        for name, col in columns.items():
+            col = np.asarray(col)
+            if col.dtype.kind == "U":
+                table.dictionary[name], table.columns[name] = encode_first_seen(col)
+            elif name in SORTED_COLUMNS:
+                table.dictionary[name], table.columns[name] = encode_sorted(col)
+            else:
+                table.columns[name] = narrow_int(col)
+        return table
+
+    def __getitem__(self, name):
+        return self.decode(name)
+
+    def __iter__(self):
+        return iter(self.columns)
+
+    def __len__(self):
+        return len(self.columns)
+
+    def __contains__(self, name):
+        return name in self.columns
+
+    @property
+    def rows(self):
+        return len(next(iter(self.columns.values()))) if self.columns else 0
+
+    @property
+    def nbytes(self):
+        return sum(col.nbytes for col in self.columns.values()) + sum(
+            cat.nbytes for cat in self.dictionary.values())
+
+    def is_coded(self, name):
+        return name in self.dictionary
+
+    def codes(self, name):
+        return self.columns[name]
+
+    def categories(self, name):
+        return self.dictionary[name]
+
+    def code_of(self, name, value):
+        """Code of one value in a coded column, or None when it never occurs."""
+        hits = np.flatnonzero(self.dictionary[name] == value)
+        return int(hits[0]) if len(hits) else None
+
+    def decode(self, name, start=0, stop=None):
+        """Values of one column (or of rows start:stop) in their original types."""
+        col = self.columns[name][start:stop]
+        if name in self.dictionary:
+            return self.dictionary[name][col]
+        return col
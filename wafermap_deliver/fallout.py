@@ -0,0 +1,159 @@
+import numpy as np
+from openpyxl.styles import Alignment, Border, Font, PatternFill, Side
+
+# Excel-free replacement for the C1_MARK / ET / Count of FT pivot table
+# and the fallout table built from it.
+
+FALLOUT_HEADER = ["End Test No.", "Count", "Fallout%"]
+PERCENT_FORMAT = "0.00%"  # fallout is stored as a fraction, shown like Excel's 0.91%
+
+HEADER_FILL = PatternFill("solid", fgColor="C0E6F5")   # light blue
+TOP_FAIL_FILL = PatternFill("solid", fgColor="FF9F9F")  # light red
+BOLD = Font(bold=True)
+CENTER = Alignment(horizontal="center", vertical="center", indent=0)
+THIN = Side(style="thin")
+BORDER = Border(left=THIN, right=THIN, top=THIN, bottom=THIN)
+
+
+def _as_number(value):
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def et_counts(wafer, c1_mark):
+    """Count of dies per ET for one C1_MARK value, ET ascending (pivot order)."""
+    dies = wafer.dies
+    ets = dies.categories("ET")
+    mark = dies.code_of("C1_MARK", c1_mark)
+    if mark is None:
+        return ets[:0], np.zeros(0, dtype=np.int64)
+    counts = np.bincount(dies.codes("ET")[dies.codes("C1_MARK") == mark], minlength=len(ets))
+    found = counts > 0
+    return ets[found], counts[found]
+
+
+def _table_from_counts(ets, counts, theoretical_num):
+    # ET 0 is a passing die, never a fallout bin
+    keep = (ets != 0) & (counts > 0)
+    ets, counts = ets[keep], counts[keep]
+    order = np.argsort(-counts, kind="stable")
+
+    table = [FALLOUT_HEADER]
+    for et, count in zip(ets[order].tolist(), counts[order].tolist()):
+        fallout = (count / theoretical_num) if theoretical_num else 0.0
+        table.append([et, count, fallout])
+    table.append(["Grand Total", _as_number(theoretical_num), None])
+    return table
+
+
+def format_fallout(value):
+    """Text for a Fallout% cell in the previews: 0.0091 -> '0.91%'."""
+    if isinstance(value, float):
+        return f"{value:.2%}"
+    return "" if value is None else str(value)
+
+
+def style_percent(cell, value):
+    if isinstance(value, float):
+        cell.number_format = PERCENT_FORMAT
+
+
+def fallout_table(wafer, c1_mark):
+    """Fallout rows sorted by count, with header and Grand Total rows."""
+    ets, counts = et_counts(wafer, c1_mark)
+    return _table_from_counts(ets, counts, wafer.theoretical_num)
+
+
+def fallout_tables(wafer, c1_marks=None):
+    """Fallout table for every C1_MARK (or the given subset) from one (C1_MARK, ET) group-by.
+
+    Returns {mark: table} in order of first appearance on the wafer.
+    """
+    # Group by the codes directly: (mark code, ET code) -> one bincount slot
+    dies = wafer.dies
+    mark_values, ets = dies.categories("C1_MARK"), dies.categories("ET")
+    keys = dies.codes("C1_MARK").astype(np.int64) * len(ets) + dies.codes("ET")
+    counts = np.bincount(keys, minlength=len(mark_values) * len(ets)).reshape(len(mark_values), len(ets))
+
+    row_of = {}
+    for i, mark in enumerate(mark_values.tolist()):
+        row_of.setdefault(mark.strip(), i)  # same keys as c1_mark_values()
+    wanted = wafer.c1_mark_values() if c1_marks is None else list(c1_marks)
+    missing = [mark for mark in wanted if mark not in row_of]
+    if missing:
+        raise ValueError(f"C1_MARK value(s) {missing} not found in C1_MARK items {wafer.c1_mark_values()}")
+    return {mark: _table_from_counts(ets, counts[row_of[mark]], wafer.theoretical_num) for mark in wanted}
+
+
+def write_fallout_block(ws, table, top_row=3, left_col=4):
+    """Styled fallout table: header and Grand Total light blue, top fail light red."""
+    for r, row in enumerate(table, start=top_row):
+        for c, value in enumerate(row, start=left_col):
+            cell = ws.cell(row=r, column=c, value=value)
+            cell.alignment = CENTER
+            cell.border = BORDER
+            if c == left_col + 2:
+                style_percent(cell, value)
+
+    last_row = top_row + len(table) - 1
+    styled_rows = [(top_row, HEADER_FILL), (last_row, HEADER_FILL)]
+    if len(table) > 2:
+        styled_rows.insert(1, (top_row + 1, TOP_FAIL_FILL))
+    for r, fill in styled_rows:
+        for c in range(left_col, left_col + 3):
+            ws.cell(row=r, column=c).fill = fill
+            ws.cell(row=r, column=c).font = BOLD
+    return last_row
+
+
+def write_fallout_sheet(wb, data_sheet_name, c1_mark, wafer, table, sheet_name="Pivot", progress=None):
+    """Write the ET summary (A1) and fallout table (D3) to a fresh sheet.
+
+    progress, if given, is called as progress("ET rows written", count) before
+    the fallout table; it may raise to cancel.
+    """
+    index = wb.sheetnames.index(data_sheet_name) + 1 if data_sheet_name in wb.sheetnames else None
+    if sheet_name in wb.sheetnames:
+        index = wb.sheetnames.index(sheet_name)  # a rebuilt sheet keeps its place
+        del wb[sheet_name]
+    ws = wb.create_sheet(sheet_name, index)
+
+    # --- Pivot-style summary: filter, ET rows, Count of FT ---
+    ws["A1"], ws["B1"] = "C1_MARK", c1_mark
+    ws["A3"], ws["B3"] = "Row Labels", "Count of FT"
+    ets, counts = et_counts(wafer, c1_mark)
+    for r, (et, count) in enumerate(zip(ets.tolist(), counts.tolist()), start=4):
+        ws.cell(row=r, column=1, value=et)
+        ws.cell(row=r, column=2, value=count)
+    ws.cell(row=4 + len(ets), column=1, value="Grand Total")
+    ws.cell(row=4 + len(ets), column=2, value=int(counts.sum()))
+    if progress:
+        progress("ET rows written", len(ets))
+
+    # --- Fallout table ---
+    write_fallout_block(ws, table)
+    return ws
+
+
+def write_fallout_summary_sheet(wb, tables, sheet_name="Fallout Summary", progress=None):
+    """All fallout tables stacked on one sheet, one titled block per C1_MARK.
+
+    progress, if given, is called as progress("Fallout tables written", count)
+    after each block; it may raise to cancel.
+    """
+    index = None
+    if sheet_name in wb.sheetnames:
+        index = wb.sheetnames.index(sheet_name)  # a rebuilt sheet keeps its place
+        del wb[sheet_name]
+    ws = wb.create_sheet(sheet_name, index)
+
+    row = 1
+    for n, (mark, table) in enumerate(tables.items(), start=1):
+        title = ws.cell(row=row, column=1, value=f"C1_MARK: {mark}")
+        title.font = BOLD
+        last_row = write_fallout_block(ws, table, top_row=row + 1, left_col=1)
+        row = last_row + 2
+        if progress:
+            progress("Fallout tables written", n)
+    return ws
@@ -0,0 +1,59 @@
+from openpyxl.styles import PatternFill
+
+from .fallout import BOLD, BORDER, CENTER, HEADER_FILL, style_percent
+
+# End Test No. -> limit-table join for the whole fallout table.
+# Every fallout ET is matched against the wafer's LimitTable TESTNO column,
+# so the limits of the top N fails come out of one lookup instead of one
+# Pivot!D4 check per ET.
+
+LIMITS_HEADER = ["End Test No.", "Count", "Fallout%", "TSNO", "COMMENT", "MODE", "HILIMIT", "LOLIMIT",
+                 "In Limit Table"]
+MISSING_FILL = PatternFill("solid", fgColor="FF9F9F")  # light red, ET not in the limit table
+
+
+def limit_positions(wafer, ets):
+    """limit_rows position for every ET (-1 when the TESTNO is missing)."""
+    return wafer.limits.index_of([str(et).strip() for et in ets])
+
+
+def annotate_fallout(wafer, table, top=None):
+    """Fallout rows (top N, or all) with their TSNO/COMMENT/MODE/HILIMIT/LOLIMIT; header first."""
+    rows = table[1:-1][:top]
+    positions = limit_positions(wafer, [row[0] for row in rows])
+    annotated = [LIMITS_HEADER]
+    for row, pos in zip(rows, positions.tolist()):
+        if pos < 0:
+            annotated.append(list(row) + ["", "", "", "", "", "No"])
+            continue
+        tsno, _, comment, mode, hilimit, lolimit = [str(v).strip() for v in wafer.limit_rows[pos]]
+        annotated.append(list(row) + [tsno, comment, mode, hilimit, lolimit, "Yes"])
+    return annotated
+
+
+def missing_end_tests(annotated):
+    """End Test No.s of the annotated rows that are not in the limit table."""
+    return [str(row[0]) for row in annotated[1:] if row[-1] == "No"]
+
+
+def write_fallout_limits_sheet(wb, annotated, sheet_name="Fallout Limits"):
+    """Annotated fallout table at A1, rows missing from the limit table in red."""
+    index = None
+    if sheet_name in wb.sheetnames:
+        index = wb.sheetnames.index(sheet_name)  # a rebuilt sheet keeps its place
+        del wb[sheet_name]
+    ws = wb.create_sheet(sheet_name, index)
+
+    for r, row in enumerate(annotated, start=1):
+        fill = HEADER_FILL if r == 1 else MISSING_FILL if row[-1] == "No" else None
+        for c, value in enumerate(row, start=1):
+            cell = ws.cell(row=r, column=c, value=value)
+            cell.alignment = CENTER
+            cell.border = BORDER
+            if c == 3:
+                style_percent(cell, value)
+            if fill is not None:
+                cell.fill = fill
+            if r == 1:
+                cell.font = BOLD
+    return ws
@@ -0,0 +1,120 @@
+import re
+
+import numpy as np
+
+# Numeric view of the TSNO/TESTNO limit table.
+# Limit cells such as " 33.0uA", " 12.3nS", "-1.42 V" or "NON" are parsed once
+# into float64 arrays in SI base units (33.0uA -> 3.3e-05, unit "A"), so limits
+# can be compared across test programs and guard bands computed column-wise.
+
+SI_PREFIXES = {"f": 1e-15, "p": 1e-12, "n": 1e-9, "u": 1e-6, "µ": 1e-6, "m": 1e-3,
+               "k": 1e3, "M": 1e6, "G": 1e9}
+NO_LIMIT = ("", "NON")
+LIMIT_PATTERN = re.compile(r"^([-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)\s*([A-Za-zµ]*)$")
+
+
+def parse_limit(text):
+    """(value in SI base units, base unit) for one limit cell; (nan, "") for NON/blank.
+
+    Raises ValueError for text that is neither a limit nor NON.
+    """
+    text = str(text).strip()
+    if text.upper() in NO_LIMIT:
+        return float("nan"), ""
+    match = LIMIT_PATTERN.match(text)
+    if not match:
+        raise ValueError(f"Unrecognised limit value {text!r}")
+    value, unit = float(match.group(1)), match.group(2)
+    # A leading SI prefix only counts when a unit follows it ("mV", not a bare "m")
+    if len(unit) > 1 and unit[0] in SI_PREFIXES:
+        value, unit = value * SI_PREFIXES[unit[0]], unit[1:]
+    return value, unit
+
+
+class LimitTable:
+    """The limit table as columns: TESTNO/MODE strings, HILIMIT/LOLIMIT floats in SI units.
+
+    NaN marks a missing (NON) limit; cells that do not parse are NaN as well
+    and listed in `unparsed` as (TESTNO, column, text).
+    """
+
+    def __init__(self, limit_rows):
+        rows = [[str(v).strip() for v in row] for row in limit_rows]
+        self.tsno = np.array([row[0] for row in rows], dtype=str)
+        self.testno = np.array([row[1] for row in rows], dtype=str)
+        self.comment = np.array([row[2] for row in rows], dtype=str)
+        self.mode = np.array([row[3] for row in rows], dtype=str)
+        self.unparsed = []
+        self.hi, self.hi_unit = self._parse_column(rows, 4, "HILIMIT")
+        self.lo, self.lo_unit = self._parse_column(rows, 5, "LOLIMIT")
+
+    def _parse_column(self, rows, col, name):
+        values = np.full(len(rows), np.nan)
+        units = []
+        for i, row in enumerate(rows):
+            try:
+                values[i], unit = parse_limit(row[col])
+            except ValueError:
+                self.unparsed.append((row[1], name, row[col]))
+                unit = ""
+            units.append(unit)
+        return values, np.array(units, dtype=str)
+
+    def __len__(self):
+        return len(self.testno)
+
+    @property
+    def no_limit(self):
+        """True where neither HILIMIT nor LOLIMIT is set."""
+        return np.isnan(self.hi) & np.isnan(self.lo)
+
+    def guard_band(self):
+        """HILIMIT - LOLIMIT per row in SI units, NaN unless both limits are set."""
+        return self.hi - self.lo
+
+    def index_of(self, testnos):
+        """Row of each TESTNO (first match), -1 where the TESTNO is missing."""
+        testnos = np.asarray(testnos, dtype=str)
+        if not len(self):
+            return np.full(len(testnos), -1)
+        order = np.argsort(self.testno, kind="stable")
+        sorted_testno = self.testno[order]
+        pos = np.minimum(np.searchsorted(sorted_testno, testnos), len(order) - 1)
+        return np.where(sorted_testno[pos] == testnos, order[pos], -1)
+
+    def describe(self, i):
+        """[MODE, HILIMIT, LOLIMIT] of row i as display strings in SI units."""
+        return [str(self.mode[i]), _si(self.hi[i], self.hi_unit[i]), _si(self.lo[i], self.lo_unit[i])]
+
+
+LIMIT_CHANGE_HEADER = ["TESTNO", "Change", "MODE", "HILIMIT", "LOLIMIT", "New MODE", "New HILIMIT", "New LOLIMIT"]
+
+
+def limit_changes(old, new):
+    """Rows of TESTNOs added, removed or with different MODE/limits between two LimitTables.
+
+    Limits are compared numerically, so " 33.0uA" and "0.033mA" are the same limit.
+    """
+    rows = [LIMIT_CHANGE_HEADER]
+    in_new = new.index_of(old.testno)
+    in_old = old.index_of(new.testno)
+
+    # --- TESTNOs in both tables: compare MODE and both limits in SI units ---
+    both = in_new >= 0
+    o, n = np.flatnonzero(both), in_new[both]
+    same = old.mode[o] == new.mode[n]
+    for a, b, a_unit, b_unit in ((old.hi, new.hi, old.hi_unit, new.hi_unit), (old.lo, new.lo, old.lo_unit, new.lo_unit)):
+        same &= np.isclose(a[o], b[n], rtol=1e-9, atol=0, equal_nan=True) & (a_unit[o] == b_unit[n])
+    changed = ~same
+
+    for i, j in zip(o[changed].tolist(), n[changed].tolist()):
+        rows.append([str(old.testno[i]), "changed"] + old.describe(i) + new.describe(j))
+    for i in np.flatnonzero(~both).tolist():
+        rows.append([str(old.testno[i]), "removed"] + old.describe(i) + ["", "", ""])
+    for j in np.flatnonzero(in_old < 0).tolist():
+        rows.append([str(new.testno[j]), "added", "", "", ""] + new.describe(j))
+    return rows
+
+
+def _si(value, unit):
+    return "NON" if np.isnan(value) else f"{value:.6g} {unit}".strip()
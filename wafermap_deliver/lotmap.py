@@ -0,0 +1,156 @@
+import numpy as np
+from openpyxl.formatting.rule import ColorScaleRule
+from openpyxl.utils import get_column_letter
+
+from .wafermapsheet import write_axis_labels, write_wafermap_sheet
+from .wafermap import EMPTY, build_wafermap_grid
+
+# Lot-level stacked wafermap: per-(X, Y) tested / failed counts and per-ET
+# hit counts summed over every wafer of a lot, one wafer at a time, so edge
+# rings and probe-card patterns show up on one composite map.
+
+FAIL_RATE_SHEET = "Lot_Fail_Rate_Map"
+TOP_ET_SHEET = "Lot_Top_ET_Map"
+
+# Green (0%) -> yellow (50%) -> red (100%), same scale on every lot
+FAIL_RATE_SCALE = dict(start_type="num", start_value=0, start_color="63BE7B",
+                       mid_type="num", mid_value=0.5, mid_color="FFEB84",
+                       end_type="num", end_value=1, end_color="F8696B")
+
+
+class LotStack:
+    """Per-die-coordinate counts accumulated over the wafers of a lot.
+
+    Counts live in dense int32 arrays over the lot's X/Y bounding box. The box
+    is sized by the first wafer and only regrown when a later wafer reaches
+    past it, so adding a wafer is a handful of vectorized adds.
+    """
+
+    def __init__(self):
+        self.x0 = self.y0 = None
+        self.tested = np.zeros((0, 0), dtype=np.int32)  # wafers with a die at (Y, X)
+        self.failed = np.zeros((0, 0), dtype=np.int32)  # wafers where that die failed
+        self.et_hits = {}                               # fail ET -> wafers failing it at (Y, X)
+        self.wafers = 0
+
+    @property
+    def shape(self):
+        return self.tested.shape
+
+    def _fit(self, x_labels, y_labels):
+        # Grow the bounding box (and every count array) to cover the new labels
+        x_lo, x_hi = int(x_labels.min()), int(x_labels.max())
+        y_lo, y_hi = int(y_labels.min()), int(y_labels.max())
+        if self.x0 is None:
+            self.x0, self.y0 = x_lo, y_lo
+            self.tested = np.zeros((y_hi - y_lo + 1, x_hi - x_lo + 1), dtype=np.int32)
+            self.failed = np.zeros_like(self.tested)
+            return
+
+        ny, nx = self.shape
+        top, left = max(self.y0 - y_lo, 0), max(self.x0 - x_lo, 0)
+        bottom = max(y_hi - (self.y0 + ny - 1), 0)
+        right = max(x_hi - (self.x0 + nx - 1), 0)
+        if top or left or bottom or right:
+            pad = ((top, bottom), (left, right))
+            self.tested = np.pad(self.tested, pad)
+            self.failed = np.pad(self.failed, pad)
+            self.et_hits = {et: np.pad(hits, pad) for et, hits in self.et_hits.items()}
+            self.x0, self.y0 = self.x0 - left, self.y0 - top
+
+    def add_grid(self, x_labels, y_labels, grid):
+        """Stack one wafer's Min-of-ET grid (as built by build_wafermap_grid)."""
+        x_labels = np.asarray(x_labels, dtype=np.int64)
+        y_labels = np.asarray(y_labels, dtype=np.int64)
+        if not len(x_labels) or not len(y_labels):
+            return
+        self._fit(x_labels, y_labels)
+
+        cells = np.ix_(y_labels - self.y0, x_labels - self.x0)
+        present = grid != EMPTY
+        fails = present & (grid != 0)
+        self.tested[cells] += present
+        self.failed[cells] += fails
+        for et in np.unique(grid[fails]).tolist():
+            hits = self.et_hits.setdefault(et, np.zeros_like(self.tested))
+            hits[cells] += grid == et
+        self.wafers += 1
+
+    def add_wafer(self, wafer):
+        self.add_grid(*build_wafermap_grid(wafer))
+
+    def labels(self):
+        ny, nx = self.shape
+        x0, y0 = (self.x0, self.y0) if self.x0 is not None else (0, 0)
+        return np.arange(x0, x0 + nx), np.arange(y0, y0 + ny)
+
+    def fail_rate(self):
+        """failed / tested per coordinate, NaN where no wafer had a die."""
+        rate = np.full(self.shape, np.nan)
+        np.divide(self.failed, self.tested, out=rate, where=self.tested > 0)
+        return rate
+
+    def top_et(self):
+        """Most frequent fail ET per coordinate (lowest ET on ties).
+
+        0 where the die never failed, EMPTY where no wafer had a die.
+        """
+        top = np.where(self.tested > 0, 0, EMPTY).astype(np.int64)
+        # One pass per ET with a running best, instead of stacking every ET's counts;
+        # ETs go in ascending order and only a strictly higher count wins, so ties keep the lowest
+        best_count = np.zeros(self.shape, dtype=np.int32)
+        best_et = np.zeros(self.shape, dtype=np.int64)
+        for et in sorted(self.et_hits):
+            hits = self.et_hits[et]
+            better = hits > best_count
+            best_count[better] = hits[better]
+            best_et[better] = et
+        return np.where(self.failed > 0, best_et, top)
+
+    def occupied(self):
+        """(rows, cols) masks of the Y rows / X columns any wafer had a die in."""
+        tested = self.tested > 0
+        return tested.any(axis=1), tested.any(axis=0)
+
+
+def write_lot_map_sheets(wb, stack):
+    """Fail-rate heat map and top-ET map of a LotStack; returns the two sheets."""
+    if not stack.wafers:
+        raise ValueError("No wafers stacked, nothing to map")
+    x_labels, y_labels = stack.labels()
+    rows, cols = stack.occupied()
+    x_labels, y_labels = x_labels[cols], y_labels[rows]
+
+    # --- Fail rate per die position, one color-scale rule over the grid ---
+    if FAIL_RATE_SHEET in wb.sheetnames:
+        del wb[FAIL_RATE_SHEET]
+    ws = wb.create_sheet(FAIL_RATE_SHEET)
+    write_axis_labels(ws, x_labels, y_labels)
+    rate = stack.fail_rate()[rows][:, cols]
+    for r, row in enumerate(rate.tolist(), start=2):
+        for c, value in enumerate(row, start=2):
+            if value == value:  # skip NaN (no die on any wafer)
+                ws.cell(row=r, column=c, value=round(value, 4)).number_format = "0%"
+    grid_range = f"B2:{get_column_letter(len(x_labels) + 1)}{len(y_labels) + 1}"
+    ws.conditional_formatting.add(grid_range, ColorScaleRule(**FAIL_RATE_SCALE))
+
+    # --- Most frequent fail ET per die position, shared ET palette ---
+    top_et = stack.top_et()[rows][:, cols]
+    top_ws = write_wafermap_sheet(wb, x_labels, y_labels, top_et, TOP_ET_SHEET)
+    return ws, top_ws
+
+
+def lot_map_preview_lines(stack, limit=5):
+    # Worst die positions first: fail rate, fails / tested, top ET
+    x_labels, y_labels = stack.labels()
+    rate = np.nan_to_num(stack.fail_rate(), nan=-1.0)
+    top_et = stack.top_et()
+    order = np.argsort(-rate, axis=None, kind="stable")[:limit]
+    lines = [f"{'X':<6}{'Y':<6}{'Fail%':<10}{'Fails':<10}{'Top ET'}"]
+    for flat in order.tolist():
+        r, c = divmod(flat, stack.shape[1])
+        if rate[r, c] <= 0:
+            break
+        fails = f"{stack.failed[r, c]}/{stack.tested[r, c]}"
+        lines.append(f"{x_labels[c]:<6}{y_labels[r]:<6}{rate[r, c] * 100:<10.2f}{fails:<10}{top_et[r, c]}")
+    return lines
@@ -0,0 +1,86 @@
+import json
+import time
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+
+# Lightweight instrumentation: nested timing spans and counters (dies
+# processed, bytes written, Excel calls, ...) for one command or GUI job.
+# Core code calls span()/count() unconditionally; they only record while a
+# collect() block is active, so headless library use pays nothing.
+
+_active = None
+
+
+class Metrics:
+    """Spans (in start order, with their nesting depth) and counters of one run."""
+
+    def __init__(self, name):
+        self.name = name
+        self.started = datetime.now().isoformat(timespec="seconds")
+        self.spans = []  # [path, depth, seconds]
+        self.counters = Counter()
+        self._stack = []
+
+    @contextmanager
+    def span(self, name):
+        self._stack.append(name)
+        record = ["/".join(self._stack), len(self._stack) - 1, 0.0]
+        self.spans.append(record)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            record[2] = time.perf_counter() - start
+            self._stack.pop()
+
+    def count(self, name, n=1):
+        self.counters[name] += n
+
+    def breakdown_lines(self):
+        """Indented per-step timings with each step's share of the whole run."""
+        total = sum(seconds for _, depth, seconds in self.spans if depth == 0) or 1.0
+        lines = [f"{'Step':<30}{'Seconds':>9}{'Share':>8}"]
+        for path, depth, seconds in self.spans:
+            label = "  " * depth + path.rsplit("/", 1)[-1]
+            lines.append(f"{label:<30}{seconds:>9.3f}{seconds / total:>8.0%}")
+        for name, value in sorted(self.counters.items()):
+            lines.append(f"{name}: {value:,}")
+        return lines
+
+    def records(self):
+        base = {"run": self.name, "started": self.started}
+        for path, depth, seconds in self.spans:
+            yield dict(base, span=path, seconds=round(seconds, 6))
+        if self.counters:
+            yield dict(base, counters=dict(self.counters))
+
+    def write_jsonl(self, path):
+        """Append one JSON line per span, then one with the counters."""
+        with open(path, "a", encoding="utf-8") as f:
+            for record in self.records():
+                f.write(json.dumps(record) + "\n")
+
+
+@contextmanager
+def collect(name, metrics_file=None):
+    """Record spans/counts made anywhere inside the block under one top-level span."""
+    global _active
+    metrics, previous = Metrics(name), _active
+    _active = metrics
+    try:
+        with metrics.span(name):
+            yield metrics
+    finally:
+        _active = previous
+        if metrics_file:
+            metrics.write_jsonl(metrics_file)
+
+
+def span(name):
+    return _active.span(name) if _active is not None else nullcontext()
+
+
+def count(name, n=1):
+    if _active is not None:
+        _active.count(name, n)
@@ -0,0 +1,36 @@
+import hashlib
+from functools import lru_cache
+
+# Deterministic End Test No. -> color palette.
+# Colors are derived from a hash of the TESTNO, so the same bin gets the same
+# color on every die, every wafer and every run. Bump PALETTE_VERSION whenever
+# the mapping changes so cached/generated sheets can tell they are stale.
+
+PALETTE_VERSION = 1
+
+PASS_COLOR = (0, 255, 0)  # ET 0 -> green
+FAIL_LOW, FAIL_HIGH = 150, 255  # keep fail colors light enough to read the ET on top
+
+
+@lru_cache(maxsize=None)
+def et_color(et):
+    """(r, g, b) for one End Test No."""
+    et = int(et)
+    if et == 0:
+        return PASS_COLOR
+    digest = hashlib.md5(str(et).encode("ascii")).digest()
+    span = FAIL_HIGH - FAIL_LOW + 1
+    return tuple(FAIL_LOW + b % span for b in digest[:3])
+
+
+@lru_cache(maxsize=None)
+def et_hex(et):
+    return "%02X%02X%02X" % et_color(et)
+
+
+@lru_cache(maxsize=None)
+def et_fill(et):
+    """Shared openpyxl fill for one End Test No., built once per process."""
+    from openpyxl.styles import PatternFill  # image rendering uses the palette without openpyxl
+
+    return PatternFill("solid", fgColor=et_hex(et))
@@ -0,0 +1,296 @@
+import csv
+import io
+import warnings
+from array import array
+
+import numpy as np
+
+from .dietable import DieTable
+from .limittable import LimitTable
+from .metrics import count
+
+# Streaming parser for qccsvout .wmap.csv files
+# Walks the file once and splits it into the free-form header block,
+# the TSNO/TESTNO limit table and the X/Y/.../FT/ET die table.
+# The header block goes through csv.reader; the die table, which is nearly
+# the whole file, is bulk-loaded by NumPy's C reader with one fixed dtype per
+# column, falling back to csv.reader when a row doesn't fit that schema.
+# The parsed columns are then kept as a compact DieTable.
+
+DIE_COLUMNS = ("X", "Y", "INDEX", "DUT", "G/N", "C1", "C1_MARK", "C2", "C2_MARK", "FT", "ET")
+INT_COLUMNS = ("X", "Y", "INDEX", "DUT", "C1", "C2", "FT", "ET")
+LIMIT_COLUMNS = ("TSNO", "TESTNO", "COMMENT", "MODE", "HILIMIT", "LOLIMIT")
+
+ROW_CHUNK = 4096
+PROGRESS_EVERY = 50000  # rows between progress(what, count) callbacks
+FAST_TEXT_WIDTH = 8     # G/N and mark cells are 1-2 chars; anything this wide takes the csv path
+
+
+def coerce_value(value):
+    # Same typing rules the Excel conversion has always used:
+    # digits -> int, anything float() accepts -> float, everything else stays text
+    if value == "":
+        return None
+    try:
+        if value.isdigit():
+            return int(value)
+        return float(value)
+    except ValueError:
+        return value
+
+
+def _to_int(value):
+    value = value.strip()
+    if not value:
+        return 0
+    try:
+        return int(value)
+    except ValueError:
+        return int(float(value))
+
+
+def _trim(row):
+    # Drop the trailing empty cells qccsvout pads every row with
+    end = len(row)
+    while end and row[end - 1] in ("", None):
+        end -= 1
+    return row[:end]
+
+
+def _decoded_lines(f, offset):
+    # Lines of a binary file for csv.reader; offset[0] tracks the bytes consumed
+    for i, raw in enumerate(f):
+        offset[0] += len(raw)
+        yield raw.decode("utf-8-sig" if i == 0 else "utf-8")
+
+
+def _fast_die_table(text, die_header):
+    """{column: array} bulk-loaded from the rest of text; ValueError when a row needs the csv path."""
+    dtype = [(f"f{i}", "i4" if name in INT_COLUMNS else f"U{FAST_TEXT_WIDTH}") for i, name in enumerate(die_header)]
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", UserWarning)  # "Empty input file" for a die table without rows
+        table = np.loadtxt(text, dtype=dtype, delimiter=",", comments=None, quotechar='"',
+                           usecols=range(len(die_header)), ndmin=1)
+    dies = {}
+    for i, name in enumerate(die_header):
+        col = table[f"f{i}"]
+        if name in INT_COLUMNS:
+            dies[name] = np.ascontiguousarray(col)
+            continue
+        if len(col) and np.char.str_len(col).max() >= FAST_TEXT_WIDTH:
+            raise ValueError(f"{name} values may be cut off")
+        col = np.char.strip(col)
+        width = int(np.char.str_len(col).max()) if len(col) else 1
+        dies[name] = col.astype(f"U{max(width, 1)}")
+    return dies
+
+
+def _die_rows(dies, die_header, progress=None, what="Rows parsed"):
+    # Typed sheet rows from a DieTable, in file order, decoded one chunk at a time
+    names = [name for name in die_header if name in dies]
+    total = dies.rows if names else 0
+    # Text cells get the same typing as every other cell (digit-only marks -> int), once per distinct value
+    typed = {name: np.array([coerce_value(v) for v in dies.categories(name).tolist()], dtype=object)
+             for name in names if dies.is_coded(name) and dies.categories(name).dtype.kind == "U"}
+    for start in range(0, total, ROW_CHUNK):
+        if progress and start and start % PROGRESS_EVERY < ROW_CHUNK:
+            progress(what, start)
+        stop = start + ROW_CHUNK
+        chunk = [(typed[name][dies.codes(name)[start:stop]] if name in typed
+                  else dies.decode(name, start, stop)).tolist() for name in names]
+        for row in zip(*chunk):
+            yield list(row)
+
+
+class WaferData:
+    """Parsed contents of one .wmap.csv file."""
+
+    def __init__(self, path, header, preamble_rows, limit_rows, die_header, dies):
+        self.path = path
+        self.header = header                # key -> list of non-empty values
+        self.preamble_rows = preamble_rows  # typed rows above the die table header
+        self.limit_rows = limit_rows        # raw TSNO..LOLIMIT rows, TESTNO as int
+        self.die_header = die_header        # die table header row, None if missing
+        self.dies = dies if isinstance(dies, DieTable) else DieTable.from_columns(dies)  # compact columns
+        self.limits = LimitTable(limit_rows)  # TESTNO lookups, numeric HILIMIT/LOLIMIT in SI units
+        self.digest = None                    # SHA-256 of the CSV, once known
+
+    @property
+    def die_count(self):
+        return self.dies.rows if "ET" in self.dies else 0
+
+    def header_value(self, key, default=None):
+        values = self.header.get(key)
+        return values[-1] if values else default
+
+    @property
+    def slot(self):
+        value = self.header_value("SLOT")
+        return int(value) if isinstance(value, (int, float)) else None
+
+    @property
+    def theoretical_num(self):
+        value = self.header_value("THEORETICAL_NUM")
+        return value if isinstance(value, (int, float)) else None
+
+    def c1_mark_values(self):
+        # Unique C1_MARK values in order of first appearance (case-sensitive)
+        if "C1_MARK" not in self.dies:
+            return []
+        values = self.dies.categories("C1_MARK").tolist()  # already in order of first appearance
+        return list(dict.fromkeys(v.strip() for v in values if v.strip()))
+
+    def limit_row(self, testno):
+        """Limit-table row for one TESTNO (int or str), or None."""
+        pos = int(self.limits.index_of([str(testno).strip()])[0])
+        return None if pos < 0 else self.limit_rows[pos]
+
+    def iter_rows(self, progress=None):
+        # Typed rows for the whole sheet, in file order; progress("Rows written", count) as they go
+        yield from self.preamble_rows
+        if self.die_header is None:
+            return
+        yield self.die_header
+        yield from _die_rows(self.dies, self.die_header, progress, "Rows written")
+
+
+def _header_block(reader, row_sink=None):
+    """(header, preamble_rows, limit_rows, die_header) from the rows above and including the die header."""
+    header = {}
+    preamble_rows = []
+    limit_rows = []
+    last_key = None
+    in_limits = False
+
+    for row in reader:
+        first = row[0].strip() if row else ""
+
+        if "C1_MARK" in row:
+            die_header = _trim([v.strip() for v in row])
+            if row_sink:
+                row_sink(die_header)
+            return header, preamble_rows, limit_rows, die_header
+
+        preamble_rows.append([coerce_value(v) for v in row])
+        if row_sink:
+            row_sink(preamble_rows[-1])
+
+        if first == "TSNO":
+            in_limits = True
+            continue
+        if in_limits:
+            if first:
+                cells = [v.strip() for v in row[:len(LIMIT_COLUMNS)]]
+                cells += [""] * (len(LIMIT_COLUMNS) - len(cells))
+                testno = coerce_value(cells[1])
+                cells[1] = int(testno) if isinstance(testno, float) and testno.is_integer() else testno
+                limit_rows.append(cells)
+            continue
+
+        if not first or first.startswith("#"):
+            continue
+        value = coerce_value(first)
+        if isinstance(value, (int, float)) and last_key and not header[last_key]:
+            # Bare value row under a key row (e.g. SLOT)
+            header[last_key] = [coerce_value(v.strip()) for v in row if v.strip()]
+            continue
+        last_key = first
+        header[first] = [coerce_value(v.strip()) for v in row[1:] if v.strip()]
+    return header, preamble_rows, limit_rows, None
+
+
+def _csv_die_table(reader, die_header, progress=None, row_sink=None):
+    """{column: array} from die rows, one csv row at a time (the fallback for odd rows)."""
+    int_cols = {}
+    str_cols = {}
+    columns = []
+    for name in die_header:
+        if name in INT_COLUMNS:
+            int_cols[name] = array("i")
+            columns.append((int_cols[name], _to_int))
+        else:
+            str_cols[name] = []
+            columns.append((str_cols[name], str.strip))
+    n_cols = len(columns)
+    n_rows = 0
+
+    for row in reader:
+        if not row or not row[0]:
+            continue
+        n_rows += 1
+        if progress and not n_rows % PROGRESS_EVERY:
+            progress("Rows parsed", n_rows)
+        if len(row) < n_cols:
+            row += [""] * (n_cols - len(row))
+        if row_sink:
+            values = [convert(value) for (sink, convert), value in zip(columns, row)]
+            for (sink, convert), value in zip(columns, values):
+                sink.append(value)
+            row_sink([coerce_value(v) if isinstance(v, str) else v for v in values])
+        else:
+            for (sink, convert), value in zip(columns, row):
+                sink.append(convert(value))
+
+    dies = {name: np.asarray(col, dtype=np.int32) for name, col in int_cols.items()}
+    dies.update({name: np.array(col, dtype=str) for name, col in str_cols.items()})
+    return dies
+
+
+def die_table_from_bytes(data, die_header):
+    """{column: array} for a run of whole die rows (bytes), fast path first."""
+    try:
+        return _fast_die_table(io.TextIOWrapper(io.BytesIO(data), encoding="utf-8", newline=""), die_header)
+    except (ValueError, UnicodeError):
+        count("die_table_csv_fallback")
+        return _csv_die_table(csv.reader(io.StringIO(data.decode("utf-8"), newline="")), die_header)
+
+
+def read_header(path):
+    """(WaferData without die rows, byte offset where the die rows start) for one .wmap.csv."""
+    with open(path, "rb") as f:
+        offset = [0]
+        header, preamble_rows, limit_rows, die_header = _header_block(csv.reader(_decoded_lines(f, offset)))
+    return WaferData(path, header, preamble_rows, limit_rows, die_header, {}), offset[0]
+
+
+def parse_wmap_csv(path, progress=None, row_sink=None, fast=True):
+    """Parse a qccsvout .wmap.csv file in a single pass.
+
+    progress, if given, is called as progress("Rows parsed", count) every
+    PROGRESS_EVERY die rows; an exception raised from it aborts the parse.
+    row_sink, if given, receives every typed sheet row as soon as it is parsed
+    (same rows as WaferData.iter_rows), so a writer can stream the file.
+    fast=False always parses the die table with csv.reader.
+    """
+    dies = None
+    with open(path, "rb") as f:
+        offset = [0]  # bytes up to the end of the row csv.reader last returned
+        reader = csv.reader(_decoded_lines(f, offset))
+        header, preamble_rows, limit_rows, die_header = _header_block(reader, row_sink)
+
+        # --- Die table: bulk load, or row by row when that fails ---
+        if die_header is not None and fast:
+            f.seek(offset[0])
+            text = io.TextIOWrapper(f, encoding="utf-8", newline="")
+            try:
+                dies = _fast_die_table(text, die_header)
+            except (ValueError, UnicodeError):
+                dies = None
+            finally:
+                text.detach()  # keep f open for the fallback
+            if dies is not None:
+                dies = DieTable.from_columns(dies)
+            if dies is not None and row_sink:
+                for row in _die_rows(dies, die_header, progress):
+                    row_sink(row)
+            elif dies is not None and progress:
+                progress("Rows parsed", dies.rows)
+            elif dies is None:
+                count("die_table_csv_fallback")
+                f.seek(offset[0])
+                reader = csv.reader(_decoded_lines(f, [0]))
+
+        if die_header is not None and dies is None:
+            dies = DieTable.from_columns(_csv_die_table(reader, die_header, progress, row_sink))
+
+    return WaferData(path, header, preamble_rows, limit_rows, die_header, dies or DieTable())
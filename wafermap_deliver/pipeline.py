@@ -0,0 +1,398 @@
+import io
+import os
+
+import numpy as np
+import openpyxl
+from openpyxl.styles import PatternFill
+
+from .fallout import (BOLD, BORDER, CENTER, HEADER_FILL, fallout_table, fallout_tables, format_fallout,
+                      write_fallout_sheet, write_fallout_summary_sheet)
+from .limits import annotate_fallout, write_fallout_limits_sheet
+from .metrics import count, span
+from .palette import PALETTE_VERSION
+from .cache import load_wafer, wafer_digest
+from .parser import LIMIT_COLUMNS, coerce_value
+from .render import embed_image, png_bytes, wafermap_rgb
+from .session import WorkbookSession, replacing
+from .stamps import stage_key, write_stamps
+from .wafermap import EMPTY, build_wafermap_grid
+from .wafermapsheet import write_wafermap_sheet
+
+# Headless convert -> fallout -> End Test check -> wafermap chain.
+# Everything here runs on openpyxl alone, so it works without Excel.
+
+WHITE_FILL = PatternFill("solid", fgColor="FFFFFF")
+
+
+def sheet_title(path):
+    name = os.path.splitext(os.path.basename(path))[0]
+    return name[:31].replace(":", "_").replace("/", "_").replace("\\", "_")
+
+
+def output_path(csv_path, out_dir=None):
+    out_file = os.path.splitext(csv_path)[0] + ".xlsx"
+    if out_dir:
+        out_file = os.path.join(out_dir, os.path.basename(out_file))
+    return out_file
+
+
+def wafermap_sheet_name(slot):
+    return f"W#{str(slot).zfill(2)}_wafermap_by_End_Test_No"
+
+
+def wafermap_image_name(slot):
+    return f"W#{str(slot).zfill(2)}_wafermap_image"
+
+
+def default_c1_mark(wafer):
+    """Most frequent C1_MARK among failing dies (ET != 0), else the first mark."""
+    dies = wafer.dies
+    passing = dies.code_of("ET", 0)
+    fails = dies.codes("C1_MARK") if passing is None else dies.codes("C1_MARK")[dies.codes("ET") != passing]
+    if len(fails):
+        values = dies.categories("C1_MARK")
+        counts = np.bincount(fails, minlength=len(values))
+        order = np.argsort(values)  # ties go to the first mark in sort order
+        return str(values[order][counts[order].argmax()])
+    values = wafer.c1_mark_values()
+    return values[0] if values else None
+
+
+def end_test_reference(wafer, end_test_no):
+    """Limit-table row (as strings) whose TESTNO matches end_test_no, or None."""
+    row = wafer.limit_row(end_test_no)
+    return None if row is None else [str(v).strip() for v in row]
+
+
+# --- Stage stamps: what each generated sheet was built from ---
+
+# Bump a sheet's layout version when its cell types or formatting change,
+# so sheets stamped by older code are rebuilt instead of skipped.
+DATA_LAYOUT = 1
+FALLOUT_LAYOUT = 1
+WAFERMAP_LAYOUT = 1
+
+
+def data_key(wafer):
+    return stage_key(wafer_digest(wafer), "data", DATA_LAYOUT)
+
+
+def pivot_key(wafer, c1_mark):
+    return stage_key(wafer_digest(wafer), "Pivot", c1_mark, FALLOUT_LAYOUT)
+
+
+def summary_key(wafer, c1_marks=None):
+    return stage_key(wafer_digest(wafer), "Fallout Summary", c1_marks, FALLOUT_LAYOUT)
+
+
+def limits_key(wafer, pivot_stamp, top=None):
+    # Fallout Limits (and the Pivot H3:M4 reference) follow whatever the Pivot sheet holds
+    return stage_key(wafer_digest(wafer), "Fallout Limits", pivot_stamp, top)
+
+
+def wafermap_key(wafer):
+    return stage_key(wafer_digest(wafer), "wafermap", PALETTE_VERSION, WAFERMAP_LAYOUT)
+
+
+def wafermap_image_key(wafer, die_px):
+    return stage_key(wafer_digest(wafer), "wafermap image", PALETTE_VERSION, die_px)
+
+
+class WaferResult:
+    """Everything the chain computed for one wafer, without the die table."""
+
+    def __init__(self, csv_path, slot, die_count, c1_mark, fallout, end_test_no, reference, limits,
+                 x_labels, y_labels, grid, out_file=None, up_to_date=False):
+        self.csv_path = csv_path
+        self.slot = slot
+        self.die_count = die_count
+        self.c1_mark = c1_mark
+        self.fallout = fallout
+        self.end_test_no = end_test_no
+        self.reference = reference
+        self.limits = limits  # fallout rows joined with the limit table, as on the Fallout Limits sheet
+        self.x_labels = x_labels
+        self.y_labels = y_labels
+        self.grid = grid
+        self.out_file = out_file
+        self.up_to_date = up_to_date  # existing workbook was already current, nothing written
+
+    @property
+    def top_fallout(self):
+        # First data row of the fallout table, None when nothing failed
+        return self.fallout[1] if len(self.fallout) > 2 else None
+
+
+def analyze_wafer(wafer, c1_mark=None):
+    if c1_mark is None:
+        c1_mark = default_c1_mark(wafer)
+    table = fallout_table(wafer, c1_mark)
+    end_test_no = str(table[1][0]) if len(table) > 2 else ""
+    x_labels, y_labels, grid = build_wafermap_grid(wafer)
+    return WaferResult(wafer.path, wafer.slot, wafer.die_count, c1_mark, table, end_test_no,
+                       end_test_reference(wafer, end_test_no), annotate_fallout(wafer, table),
+                       x_labels, y_labels, grid)
+
+
+# --- Sheet writers ---
+
+def write_end_test_reference(ws, reference):
+    """Header + limit row at H3:M4, as check_end_test lays it out."""
+    if reference is None:
+        return
+    # Numeric limit cells (TSNO, TESTNO, bare numbers) go in as numbers, like Excel typed them
+    for r, row in enumerate([list(LIMIT_COLUMNS), [coerce_value(v) for v in reference]], start=3):
+        for c, value in enumerate(row, start=8):
+            cell = ws.cell(row=r, column=c, value=value)
+            cell.fill = HEADER_FILL if r == 3 else WHITE_FILL
+            cell.font = BOLD
+            cell.alignment = CENTER
+            cell.border = BORDER
+
+
+# --- Workbook-level stages (shared by the GUI and the CLI) ---
+
+def convert_csv(csv_path, out_file=None, save=True, progress=None, use_cache=True, jobs=1):
+    """Parse csv_path and write its data sheet; returns (wafer, session).
+
+    Rows go to a write-only workbook as they are parsed, so memory stays flat
+    whatever the file size. The returned WorkbookSession never reloads the
+    data sheet: later saves copy its XML from the file already written.
+    With save=False nothing is written until the session saves (one write for
+    a whole convert + stages run). Parsed data comes from the sidecar cache
+    when the CSV hasn't changed since it was last parsed. The data sheet is
+    stamped with the CSV hash so later runs can tell it is still current.
+    jobs > 1 parses a large die table in that many processes. progress is
+    also handed to the session, which reports the rows it writes on save.
+    """
+    out_file = out_file or output_path(csv_path)
+    title = sheet_title(csv_path)
+    if save:
+        wb = openpyxl.Workbook(write_only=True)
+        ws = wb.create_sheet(title)
+        try:
+            wafer = load_wafer(csv_path, progress, row_sink=ws.append, use_cache=use_cache, jobs=jobs)
+        except BaseException:
+            ws.close()  # finish its row stream before the workbook is dropped
+            raise
+        write_stamps(wb, {title: data_key(wafer)})
+        with span("save workbook"), replacing(out_file) as tmp:
+            wb.save(tmp)
+        count("bytes_written", os.path.getsize(out_file))
+    else:
+        wafer = load_wafer(csv_path, progress, use_cache=use_cache, jobs=jobs)
+    session = WorkbookSession(out_file, data_sheet=(title, wafer), existing=save, progress=progress)
+    session.stamps[title] = data_key(wafer)
+    session.dirty = not save
+    return wafer, session
+
+
+def open_converted(csv_path, out_file=None, progress=None, use_cache=True, jobs=1):
+    """(wafer, session) on an existing workbook whose data sheet still matches the CSV, else None.
+
+    Workbooks written before stage stamps existed have no data stamp and are
+    taken as they are. Like convert_csv, the session never loads the data
+    sheet: only the other sheets are read, and saves copy its XML back (or
+    stream the rows from the parsed wafer when Excel has re-saved the file).
+    """
+    out_file = out_file or output_path(csv_path)
+    if not os.path.exists(out_file):
+        return None
+    title = sheet_title(csv_path)
+    wafer = load_wafer(csv_path, progress, use_cache=use_cache, jobs=jobs)
+    session = WorkbookSession(out_file, data_sheet=(title, wafer), existing=True, progress=progress)
+    stamp = session.stamps.get(title)
+    if stamp is not None and stamp != data_key(wafer):
+        return None
+    return wafer, session
+
+
+def add_fallout(wb, wafer, c1_mark, progress=None):
+    """Fallout table for one C1_MARK on the Pivot sheet; returns the table."""
+    valid_items = wafer.c1_mark_values()
+    if c1_mark not in valid_items:
+        raise ValueError(f"Selected '{c1_mark}' not found in C1_MARK items {valid_items}")
+    with span("group-by"):
+        table = fallout_table(wafer, c1_mark)
+    with span("write sheet"):
+        write_fallout_sheet(wb, sheet_title(wafer.path), c1_mark, wafer, table, progress=progress)
+    return table
+
+
+def add_fallout_summary(wb, wafer, c1_marks=None, progress=None):
+    """Fallout tables for every C1_MARK (or the given ones) on one stacked sheet; returns {mark: table}."""
+    with span("group-by"):
+        tables = fallout_tables(wafer, c1_marks)
+    with span("write sheet"):
+        write_fallout_summary_sheet(wb, tables, progress=progress)
+    return tables
+
+
+def check_end_test(wb, wafer):
+    """Look up the top fallout ET (Pivot!D4) in the limit table; returns (end_test_no, reference)."""
+    if "Pivot" in wb.sheetnames:
+        pivot = wb["Pivot"]
+    else:
+        pivot = wb.create_sheet("Pivot")
+
+    raw_val = pivot["D4"].value
+    if raw_val is None:
+        end_test_no = ""
+    elif isinstance(raw_val, float) and raw_val.is_integer():
+        end_test_no = str(int(raw_val))
+    else:
+        end_test_no = str(raw_val).strip()
+
+    with span("lookup"):
+        reference = end_test_reference(wafer, end_test_no)
+    write_end_test_reference(pivot, reference)
+    return end_test_no, reference
+
+
+def add_fallout_limits(wb, wafer, c1_mark=None, top=None):
+    """Limits for every fallout ET (or the top N) on the Fallout Limits sheet; returns the rows.
+
+    The C1_MARK defaults to the one on the Pivot sheet, else the most common fail mark.
+    """
+    if c1_mark is None and "Pivot" in wb.sheetnames:
+        c1_mark = wb["Pivot"]["B1"].value
+    if c1_mark is None:
+        c1_mark = default_c1_mark(wafer)
+    with span("limit join"):
+        annotated = annotate_fallout(wafer, fallout_table(wafer, str(c1_mark)), top)
+    with span("write sheet"):
+        write_fallout_limits_sheet(wb, annotated)
+    return annotated
+
+
+def after_data_sheet(wb, wafer):
+    """Sheet index right after the wafer's data sheet (None: append)."""
+    data_title = sheet_title(wafer.path)
+    return wb.sheetnames.index(data_title) + 1 if data_title in wb.sheetnames else None
+
+
+def add_wafermap(wb, wafer, progress=None):
+    """Wafermap sheet for the wafer's SLOT, placed after the data sheet; returns its name."""
+    if wafer.slot is None:
+        raise ValueError("SLOT value not found in the CSV header")
+    with span("grid"):
+        x_labels, y_labels, grid = build_wafermap_grid(wafer)
+    title = wafermap_sheet_name(wafer.slot)
+    with span("write sheet"):
+        write_wafermap_sheet(wb, x_labels, y_labels, grid, title, after_data_sheet(wb, wafer), progress)
+    count("cells_styled", int((grid != EMPTY).sum()))
+    return title
+
+
+def add_wafermap_image(wb, wafer, die_px=8):
+    """Sheet with the rendered PNG wafermap, placed after the wafermap sheet; returns its name."""
+    if wafer.slot is None:
+        raise ValueError("SLOT value not found in the CSV header")
+    with span("grid"):
+        x_labels, y_labels, grid = build_wafermap_grid(wafer)
+    with span("render"):
+        png = io.BytesIO(png_bytes(wafermap_rgb(x_labels, y_labels, grid, die_px)))
+    title = wafermap_image_name(wafer.slot)
+    with span("write sheet"):
+        ws = embed_image(wb, png, title)
+    map_title = wafermap_sheet_name(wafer.slot)
+    if map_title in wb.sheetnames:
+        wb.move_sheet(ws, wb.sheetnames.index(map_title) + 1 - wb.sheetnames.index(title))
+    return title
+
+
+# --- Text previews for the status box / terminal ---
+
+def fallout_preview_lines(table):
+    return [f"{str(et_val):<15}{str(count_val):<10}{format_fallout(fallout_val)}"
+            for et_val, count_val, fallout_val in table]
+
+
+def summary_preview_lines(tables):
+    # One line per C1_MARK: its top fallout ET, or that nothing failed
+    lines = [f"{'C1_MARK':<10}{'Top ET':<15}{'Count':<10}{'Fallout%'}"]
+    for mark, table in tables.items():
+        et_val, count_val, fallout_val = table[1] if len(table) > 2 else ("-", "0", "")
+        lines.append(f"{str(mark):<10}{str(et_val):<15}{str(count_val):<10}{format_fallout(fallout_val)}")
+    return lines
+
+
+def limits_preview_lines(annotated):
+    lines = [f"{'ET':<10}{'Count':<8}{'COMMENT':<15}{'MODE':<8}{'HILIMIT':<12}{'LOLIMIT'}"]
+    for et_val, count_val, _, _, comment, mode, hilimit, lolimit, found in annotated[1:]:
+        if found == "No":
+            lines.append(f"{et_val:<10}{str(count_val):<8}❌ not in the TESTNO column")
+        else:
+            lines.append(f"{et_val:<10}{str(count_val):<8}{comment:<15}{mode:<8}{hilimit:<12}{lolimit}")
+    return lines
+
+
+def reference_preview_lines(reference):
+    tsno, testno, comment, mode, hilimit, lolimit = reference
+    return [
+        f"{'TSNO':<10}{'TESTNO':<10}{'COMMENT':<15}{'MODE':<10}{'HILIMIT':<10}{'LOLIMIT'}",
+        "-" * 70,
+        f"{tsno:<10}{testno:<10}{comment:<15}{mode:<10}{hilimit:<10}{lolimit}",
+    ]
+
+
+def wafer_workbook_stamps(wafer, result):
+    pivot = pivot_key(wafer, result.c1_mark)
+    return {
+        sheet_title(wafer.path): data_key(wafer),
+        "Pivot": pivot,
+        "Fallout Limits": limits_key(wafer, pivot),
+        wafermap_sheet_name(result.slot): wafermap_key(wafer),
+    }
+
+
+def write_result_pivot(wb, wafer, result):
+    pivot = write_fallout_sheet(wb, sheet_title(wafer.path), result.c1_mark, wafer, result.fallout)
+    write_end_test_reference(pivot, result.reference)
+
+
+def write_result_wafermap(wb, wafer, result):
+    write_wafermap_sheet(wb, result.x_labels, result.y_labels, result.grid, wafermap_sheet_name(result.slot),
+                         after_data_sheet(wb, wafer))
+
+
+def write_wafer_workbook(wafer, result, out_file, force=False):
+    """Bring out_file's data, Pivot, Fallout Limits and W# sheets up to date; returns whether it wrote.
+
+    An existing workbook is built on, not replaced: only the sheets whose
+    stamps don't match (all four with force=True) are rewritten, so the
+    Fallout Summary, image sheets and sheets added by hand are kept.
+    """
+    title = sheet_title(wafer.path)
+    stages = {
+        "Pivot": (write_result_pivot, wafer, result),
+        "Fallout Limits": (write_fallout_limits_sheet, result.limits),
+        wafermap_sheet_name(result.slot): (write_result_wafermap, wafer, result),
+    }
+    with WorkbookSession(out_file, data_sheet=(title, wafer), existing=os.path.exists(out_file)) as session:
+        for sheet, key in wafer_workbook_stamps(wafer, result).items():
+            if session.is_fresh(sheet, key) and not force:
+                continue
+            if sheet == title:
+                session.restream(key)
+            else:
+                session.run_stage(sheet, key, *stages[sheet])
+        wrote = session.dirty
+    result.out_file = out_file
+    return wrote
+
+
+def process_file(csv_path, c1_mark=None, out_dir=None, write=True, use_cache=True, force=False):
+    """Parse one CSV and run the full chain; write its workbook unless write=False.
+
+    Only the sheets whose stamps don't match (CSV, C1_MARK, palette) are
+    rewritten, all of them with force=True; a workbook that is fully up to
+    date is left untouched.
+    """
+    wafer = load_wafer(csv_path, use_cache=use_cache)
+    if wafer.die_header is None:
+        raise ValueError("C1_MARK header row not found in the CSV")
+    result = analyze_wafer(wafer, c1_mark)
+    if write:
+        result.up_to_date = not write_wafer_workbook(wafer, result, output_path(csv_path, out_dir), force)
+    return result
@@ -0,0 +1,179 @@
+import struct
+import zlib
+from xml.sax.saxutils import escape
+
+import numpy as np
+
+from .metrics import count, span
+from .palette import et_color, et_hex
+from .wafermap import EMPTY, build_wafermap_grid
+
+# Image wafermaps straight from the Y x X ET grid, no Excel involved.
+# PNG: one palette lookup maps the grid to RGB, np.repeat scales each die to
+# die_px x die_px pixels and the rows are zlib-compressed into a plain RGB
+# PNG. SVG: one <path> per ET color. Both keep the mirrored axis labels.
+
+BACKGROUND = (255, 255, 255)
+GUTTER = (200, 200, 200)      # 1 px line between dies when they are big enough
+AXIS_BG = (228, 241, 253)     # same light blue / dark blue as the Excel axis cells
+AXIS_TEXT = (46, 110, 158)
+MIN_LABEL_PX = 6              # smaller dies leave no room for the 3x5 digit font
+
+# 3x5 bitmap digits for the axis labels
+GLYPHS = {
+    "0": ("###", "#.#", "#.#", "#.#", "###"),
+    "1": (".#.", "##.", ".#.", ".#.", "###"),
+    "2": ("###", "..#", "###", "#..", "###"),
+    "3": ("###", "..#", "###", "..#", "###"),
+    "4": ("#.#", "#.#", "###", "..#", "..#"),
+    "5": ("###", "#..", "###", "..#", "###"),
+    "6": ("###", "#..", "###", "#.#", "###"),
+    "7": ("###", "..#", "..#", "..#", "..#"),
+    "8": ("###", "#.#", "###", "#.#", "###"),
+    "9": ("###", "#.#", "###", "..#", "###"),
+    "-": ("...", "...", "###", "...", "..."),
+}
+GLYPH_MASKS = {ch: np.array([[c == "#" for c in row] for row in rows]) for ch, rows in GLYPHS.items()}
+
+
+def grid_rgb(grid, die_px=8):
+    """(H, W, 3) uint8 image of the grid, die_px pixels per die."""
+    ets, inverse = np.unique(grid, return_inverse=True)
+    colors = np.array([BACKGROUND if et == EMPTY else et_color(et) for et in ets.tolist()], dtype=np.uint8)
+    rgb = colors[inverse.reshape(grid.shape)]
+    rgb = np.repeat(np.repeat(rgb, die_px, axis=0), die_px, axis=1)
+    if die_px >= 4:
+        rgb[die_px - 1::die_px, :] = GUTTER
+        rgb[:, die_px - 1::die_px] = GUTTER
+    return rgb
+
+
+def _text_mask(text, scale, vertical=False):
+    # Glyphs side by side (or stacked for X labels), 1 px apart before scaling
+    masks = [GLYPH_MASKS[ch] for ch in text if ch in GLYPH_MASKS]
+    if not masks:
+        return np.zeros((5 * scale, 3 * scale), dtype=bool)
+    gap = np.zeros((1, 3) if vertical else (5, 1), dtype=bool)
+    parts = [part for mask in masks for part in (mask, gap)][:-1]
+    mask = np.vstack(parts) if vertical else np.hstack(parts)
+    return np.kron(mask, np.ones((scale, scale), dtype=bool))
+
+
+def _stamp(canvas, mask, top, left):
+    h, w = mask.shape
+    canvas[top:top + h, left:left + w][mask] = AXIS_TEXT
+
+
+def wafermap_rgb(x_labels, y_labels, grid, die_px=8, labels=True):
+    """Full wafermap image: grid plus X labels above/below and Y labels left/right."""
+    body = grid_rgb(grid, die_px)
+    if not labels or die_px < MIN_LABEL_PX:
+        return body
+
+    scale = max(1, die_px // 6)
+    x_text = [str(x) for x in x_labels.tolist()]
+    y_text = [str(y) for y in y_labels.tolist()]
+    band_h = max(len(t) for t in x_text) * 6 * scale + 2 * scale  # stacked digits
+    band_w = max(len(t) for t in y_text) * 4 * scale + 2 * scale
+
+    h, w = body.shape[:2]
+    canvas = np.empty((h + 2 * band_h, w + 2 * band_w, 3), dtype=np.uint8)
+    canvas[:] = AXIS_BG
+    canvas[band_h:band_h + h, band_w:band_w + w] = body
+
+    for i, text in enumerate(x_text):
+        mask = _text_mask(text, scale, vertical=True)
+        left = band_w + i * die_px + (die_px - mask.shape[1]) // 2
+        for top in (band_h - mask.shape[0] - scale, band_h + h + scale):
+            _stamp(canvas, mask, top, left)
+    for i, text in enumerate(y_text):
+        mask = _text_mask(text, scale)
+        top = band_h + i * die_px + (die_px - mask.shape[0]) // 2
+        for left in (band_w - mask.shape[1] - scale, band_w + w + scale):
+            _stamp(canvas, mask, top, left)
+    return canvas
+
+
+def png_bytes(rgb):
+    """Encode an (H, W, 3) uint8 array as an RGB PNG."""
+    h, w = rgb.shape[:2]
+    raw = np.zeros((h, 1 + 3 * w), dtype=np.uint8)  # filter byte 0 (None) per row
+    raw[:, 1:] = rgb.reshape(h, 3 * w)
+
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    header = struct.pack(">IIBBBBB", w, h, 8, 2, 0, 0, 0)  # 8-bit RGB
+    return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header)
+            + chunk(b"IDAT", zlib.compress(raw.tobytes(), 6)) + chunk(b"IEND", b""))
+
+
+def render_png(x_labels, y_labels, grid, path, die_px=8, labels=True):
+    with open(path, "wb") as f:
+        f.write(png_bytes(wafermap_rgb(x_labels, y_labels, grid, die_px, labels)))
+    return path
+
+
+def svg_text(x_labels, y_labels, grid, die_px=8, labels=True):
+    """SVG wafermap in die units: one path per ET color, <text> axis labels on all four sides."""
+    ny, nx = grid.shape
+    pad = 2 if labels else 0  # label rows/columns, in dies
+    width, height = nx + 2 * pad, ny + 2 * pad
+    out = [f'<svg xmlns="http://www.w3.org/2000/svg" width="{width * die_px}" height="{height * die_px}" '
+           f'viewBox="{-pad} {-pad} {width} {height}" shape-rendering="crispEdges">']
+    if labels:
+        out.append(f'<rect x="{-pad}" y="{-pad}" width="{width}" height="{height}" fill="#E4F1FD"/>')
+    out.append(f'<rect width="{nx}" height="{ny}" fill="#FFFFFF"/>')
+
+    rows, cols = np.nonzero(grid != EMPTY)
+    ets = grid[rows, cols]
+    for et in np.unique(ets).tolist():
+        hit = ets == et
+        d = "".join(f"M{c} {r}h1v1h-1z" for r, c in zip(rows[hit].tolist(), cols[hit].tolist()))
+        out.append(f'<path fill="#{et_hex(et)}" stroke="#C8C8C8" stroke-width="0.05" d="{d}"/>')
+
+    if labels:
+        style = 'font-family="Arial, sans-serif" font-size="0.55" font-weight="bold" fill="#2E6E9E" ' \
+                'text-anchor="middle" dominant-baseline="central"'
+        out.append(f"<g {style}>")
+        for c, x in enumerate(x_labels.tolist()):
+            for y in (-pad / 2, ny + pad / 2):
+                out.append(f'<text x="{c + 0.5}" y="{y}" transform="rotate(-90 {c + 0.5} {y})">{escape(str(x))}</text>')
+        for r, y_label in enumerate(y_labels.tolist()):
+            for x in (-pad / 2, nx + pad / 2):
+                out.append(f'<text x="{x}" y="{r + 0.5}">{escape(str(y_label))}</text>')
+        out.append("</g>")
+    out.append("</svg>")
+    return "\n".join(out)
+
+
+def render_svg(x_labels, y_labels, grid, path, die_px=8, labels=True):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(svg_text(x_labels, y_labels, grid, die_px, labels))
+    return path
+
+
+def render_wafermap(wafer, path, die_px=8, labels=True):
+    """Wafermap as a .png or .svg image (by extension), without Excel; returns path."""
+    with span("grid"):
+        x_labels, y_labels, grid = build_wafermap_grid(wafer)
+    render = render_svg if path.lower().endswith(".svg") else render_png
+    with span("render"):
+        render(x_labels, y_labels, grid, path, die_px, labels)
+    count("dies_rendered", int((grid != EMPTY).sum()))
+    return path
+
+
+def embed_image(wb, png, sheet_name, anchor="A1"):
+    """Put a rendered PNG (path or file object) on its own sheet; openpyxl needs Pillow for images."""
+    try:
+        from openpyxl.drawing.image import Image
+        image = Image(png)
+    except ImportError as e:
+        raise RuntimeError("Embedding the wafermap image needs Pillow (pip install pillow)") from e
+    if sheet_name in wb.sheetnames:
+        del wb[sheet_name]
+    ws = wb.create_sheet(sheet_name)
+    ws.sheet_view.showGridLines = False
+    ws.add_image(image, anchor)
+    return ws
@@ -0,0 +1,239 @@
+import io
+import os
+import posixpath
+import shutil
+import tempfile
+import zipfile
+from contextlib import contextmanager
+
+import openpyxl
+from openpyxl.xml.functions import fromstring
+
+from .metrics import count, span
+from .stamps import SHEET_TAG, read_stamps, write_stamps
+
+# One open output workbook shared by every stage, instead of each step
+# launching Excel, reopening the file, saving and quitting.
+
+REL_ID = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}id"
+REL_TAG = "{http://schemas.openxmlformats.org/package/2006/relationships}Relationship"
+EMPTY_SHEET = b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData/></worksheet>'
+
+
+@contextmanager
+def replacing(out_file):
+    """Path of a temp file next to out_file, moved over it only if the block completes.
+
+    A failed or cancelled save leaves the previous workbook untouched.
+    """
+    tmp = out_file + ".tmp"
+    try:
+        yield tmp
+        os.replace(tmp, out_file)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def sheet_part(z, title):
+    """Zip member holding worksheet title, or None when there is no such sheet."""
+    rel_id = next((el.get(REL_ID) for el in fromstring(z.read("xl/workbook.xml")).iter(SHEET_TAG)
+                   if el.get("name") == title), None)
+    rels = fromstring(z.read("xl/_rels/workbook.xml.rels")).iter(REL_TAG)
+    target = next((el.get("Target") for el in rels if el.get("Id") == rel_id), None)
+    if target is None:
+        return None
+    return target.lstrip("/") if target.startswith("/") else posixpath.normpath("xl/" + target)
+
+
+def load_without_sheet(path, title):
+    """Load path with worksheet title swapped for an empty placeholder.
+
+    The sheet's XML is never decompressed, so a huge data sheet costs nothing;
+    every other sheet (styles, images, views) loads as usual.
+    """
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(path) as src, zipfile.ZipFile(buffer, "w") as dst:
+        part = sheet_part(src, title)
+        for info in src.infolist():
+            dst.writestr(info, EMPTY_SHEET if info.filename == part else src.read(info))
+    return openpyxl.load_workbook(buffer)
+
+
+def reusable_sheet(path, title):
+    """Zip member of sheet title when its XML can be copied into another workbook as is.
+
+    Our own saves write inline strings and unstyled data cells, so the sheet
+    stands alone; once Excel has re-saved the file it points into the shared
+    string table and is rewritten instead.
+    """
+    try:
+        with zipfile.ZipFile(path) as z:
+            if "xl/sharedStrings.xml" in z.namelist():
+                return None
+            return sheet_part(z, title)
+    except (OSError, KeyError, zipfile.BadZipFile):
+        return None
+
+
+def copy_sheet_part(src_path, src_part, new_workbook, title, out_file):
+    """Save new_workbook (a zip in memory) to out_file with sheet title's XML taken from src_path."""
+    with zipfile.ZipFile(src_path) as src, zipfile.ZipFile(new_workbook) as new, replacing(out_file) as tmp:
+        part = sheet_part(new, title)
+        with zipfile.ZipFile(tmp, "w", zipfile.ZIP_DEFLATED, compresslevel=1) as dst:
+            for info in new.infolist():
+                if info.filename != part:
+                    dst.writestr(info, new.read(info))
+                    continue
+                with src.open(src_part) as data, dst.open(part, "w", force_zip64=True) as out:
+                    shutil.copyfileobj(data, out, 1 << 20)
+
+
+def save_streaming(out_file, wb, data_title, rows=(), stamps=None, data_from=None):
+    """Save wb, whose data_title sheet is an empty stand-in, with that sheet's XML filled in.
+
+    The XML is copied from data_from=(path, part), an earlier save (see
+    reusable_sheet), or else written from rows through a write-only workbook.
+    Every other sheet goes through a regular openpyxl save, so merged cells,
+    column widths, freeze panes, conditional formatting and the like survive.
+    out_file is only replaced once the whole file is written.
+    """
+    if stamps is not None:
+        write_stamps(wb, stamps)
+    if data_title not in wb.sheetnames:
+        wb.create_sheet(data_title, 0)
+    others = io.BytesIO()
+    wb.save(others)
+    with tempfile.TemporaryFile() as scratch:
+        if data_from is None:
+            data_wb = openpyxl.Workbook(write_only=True)
+            ws = data_wb.create_sheet(data_title)
+            try:
+                for row in rows:
+                    ws.append(row)
+            except BaseException:
+                ws.close()  # finish its row stream before the workbook is dropped
+                raise
+            data_wb.save(scratch)
+            with zipfile.ZipFile(scratch) as z:
+                data_from = (scratch, sheet_part(z, data_title))
+        copy_sheet_part(*data_from, others, data_title, out_file)
+
+
+class WorkbookSession:
+    """Keeps the output workbook in memory across stages and saves it once.
+
+    With data_sheet=(title, wafer) the big data sheet is never held as cells:
+    the in-memory workbook carries the result sheets and an empty stand-in
+    for the data sheet, and save() streams the data rows from the parsed
+    wafer through a write-only workbook. Add
+    existing=True to build on out_file's other sheets and stamps: they load
+    with the data sheet left out, and saves copy its XML back unchanged (or
+    re-stream it when the file was re-saved elsewhere).
+
+    progress, if given, is called as progress(what, count) while save()
+    streams the data rows; it may raise to cancel the save, leaving out_file
+    as it was.
+
+    stamps ({sheet: key}) are the stage stamps read from out_file; they are
+    written back into the workbook's custom properties on every save.
+    """
+
+    def __init__(self, out_file, workbook=None, data_sheet=None, existing=False, progress=None):
+        self.out_file = out_file
+        self.data_sheet = data_sheet
+        self.existing = existing
+        self.progress = progress
+        self._wb = workbook
+        self.dirty = False
+        keep = existing or not data_sheet
+        self.stamps = read_stamps(out_file) if keep and os.path.exists(out_file) else {}
+
+    @property
+    def workbook(self):
+        if self._wb is None:
+            if self.data_sheet and self.existing and os.path.exists(self.out_file):
+                with span("load workbook"):
+                    self._wb = load_without_sheet(self.out_file, self.data_sheet[0])
+            elif self.data_sheet:
+                # An empty stand-in keeps the data sheet's place for stages that insert after it
+                self._wb = openpyxl.Workbook()
+                self._wb.active.title = self.data_sheet[0]
+            else:
+                with span("load workbook"):
+                    self._wb = openpyxl.load_workbook(self.out_file)
+        return self._wb
+
+    def run(self, stage, *args, **kwargs):
+        """Run stage(workbook, *args, **kwargs) on the in-memory workbook."""
+        result = stage(self.workbook, *args, **kwargs)
+        self.dirty = True
+        return result
+
+    def is_fresh(self, sheet, key):
+        return self.stamps.get(sheet) == key
+
+    def stamp(self, sheet, key):
+        self.stamps[sheet] = key
+        self.dirty = True
+
+    def restream(self, key):
+        """Stamp the data sheet with key and have the next save write it from the wafer.
+
+        For a data sheet that went stale: the other sheets are loaded first, so
+        they are kept while the old data sheet's XML is no longer copied.
+        """
+        self.workbook
+        self.existing = False
+        self.stamp(self.data_sheet[0], key)
+
+    def run_stage(self, sheet, key, stage, *args, **kwargs):
+        """run() a stage that (re)builds sheet, then stamp the sheet with key."""
+        try:
+            result = self.run(stage, *args, **kwargs)
+        except BaseException:
+            # A sheet left half-written (error or cancel) must not pass for the one it replaced
+            self.stamps.pop(sheet, None)
+            raise
+        self.stamp(sheet, key)
+        return result
+
+    def save(self):
+        if not self.dirty:
+            return
+        with span("save workbook"):
+            if self.data_sheet:
+                title, wafer = self.data_sheet
+                part = self.existing and title in self.stamps and reusable_sheet(self.out_file, title)
+                data_from = (self.out_file, part) if part else None
+                rows = wafer.iter_rows(self.progress)
+                save_streaming(self.out_file, self.workbook, title, rows, self.stamps, data_from)
+                self.existing = True  # later saves copy the data sheet just written instead of re-streaming it
+            elif self._wb is not None:
+                write_stamps(self._wb, self.stamps)
+                with replacing(self.out_file) as tmp:
+                    self._wb.save(tmp)
+        count("bytes_written", os.path.getsize(self.out_file))
+        self.dirty = False
+
+    def reload(self):
+        # Drop the in-memory copy and re-read the stamps from the file on disk
+        if self._wb is not None:
+            self._wb.close()
+        self._wb = None
+        self.data_sheet = None
+        self.dirty = False
+        self.stamps = read_stamps(self.out_file) if os.path.exists(self.out_file) else {}
+
+    def close(self):
+        self.save()
+        self.reload()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.save()
+        self.reload()
+
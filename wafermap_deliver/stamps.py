@@ -0,0 +1,54 @@
+import hashlib
+import json
+import zipfile
+
+from openpyxl.packaging.custom import CustomPropertyList, StringProperty
+from openpyxl.xml.functions import fromstring
+
+# Stage stamps: for every generated sheet, a hash of the inputs it was built
+# from (CSV SHA-256, C1_MARK, palette version, ...) kept in the workbook's
+# custom document properties. A re-run compares the stamps against the
+# current inputs and only rebuilds the sheets that went stale.
+
+STAMP_VERSION = 1
+STAMP_PREFIX = "stamp:"
+SHEET_TAG = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}sheet"
+
+
+def stage_key(*inputs):
+    """Short hash of everything one sheet depends on."""
+    payload = json.dumps([STAMP_VERSION, *inputs], default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:20]
+
+
+def read_stamps(path):
+    """{sheet: key} stored in an .xlsx, for sheets that still exist; {} when there are none.
+
+    Reads docProps/custom.xml and the sheet list straight from the zip, so the
+    (possibly huge) data sheet is never loaded.
+    """
+    try:
+        with zipfile.ZipFile(path) as z:
+            if "docProps/custom.xml" not in z.namelist():
+                return {}
+            props = CustomPropertyList.from_tree(fromstring(z.read("docProps/custom.xml")))
+            sheets = {el.get("name") for el in fromstring(z.read("xl/workbook.xml")).iter(SHEET_TAG)}
+    except (OSError, KeyError, ValueError, SyntaxError, zipfile.BadZipFile):
+        return {}
+
+    stamps = {}
+    for prop in props:
+        sheet = prop.name[len(STAMP_PREFIX):]
+        if prop.name.startswith(STAMP_PREFIX) and sheet in sheets:
+            stamps[sheet] = str(prop.value)
+    return stamps
+
+
+def write_stamps(wb, stamps):
+    """Replace the workbook's stage stamps with stamps ({sheet: key}) before a save."""
+    props = wb.custom_doc_props
+    for name in [name for name in props.names if name.startswith(STAMP_PREFIX)]:
+        del props[name]
+    for sheet, key in sorted(stamps.items()):
+        if sheet in wb.sheetnames:
+            props.append(StringProperty(name=STAMP_PREFIX + sheet, value=key))
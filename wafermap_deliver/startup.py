@@ -0,0 +1,74 @@
+import os
+import sys
+import time
+
+# Startup cost of the command-line entry point. Scheduler jobs run many short
+# commands, so `python -m wafermap_deliver` must not import the heavy backends
+# (NumPy, openpyxl, Tk) before a command actually needs them.
+# Everything is measured in fresh interpreters, since imports are cached
+# once loaded.
+
+HEAVY_MODULES = ("numpy", "openpyxl", "tkinter")
+STARTUP_BUDGET_MS = 150.0  # wall time of `python -m wafermap_deliver --help`
+PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _python(args):
+    import subprocess  # the CLI imports this module on every run, keep its own imports light
+
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [PACKAGE_DIR, env.get("PYTHONPATH")]))
+    return subprocess.run([sys.executable, *args], capture_output=True, text=True, env=env, check=True)
+
+
+def import_times(module="wafermap_deliver.cli"):
+    """{module: cumulative import ms} for everything a fresh `import module` loads (python -X importtime)."""
+    stderr = _python(["-X", "importtime", "-c", f"import {module}"]).stderr
+    times = {}
+    for line in stderr.splitlines():
+        parts = line.split("|")
+        if len(parts) != 3 or not parts[1].strip().isdigit():
+            continue  # header line
+        times[parts[2].strip()] = int(parts[1]) / 1000
+    return times
+
+
+def startup_seconds(argv=("--help",), repeat=5):
+    """Best wall time of `python -m wafermap_deliver <argv>` over repeat fresh runs."""
+    best = None
+    for _ in range(max(repeat, 1)):
+        start = time.perf_counter()
+        _python(["-m", "wafermap_deliver", *argv])
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def startup_report(repeat=5):
+    """{"seconds", "import_ms", "heavy", "slowest"} for the CLI entry point."""
+    times = import_times()
+    own = {name: ms for name, ms in times.items() if "." not in name}  # top-level packages only
+    return {
+        "seconds": round(startup_seconds(repeat=repeat), 4),
+        "import_ms": round(times.get("wafermap_deliver.cli", 0.0), 1),
+        "heavy": sorted(name for name in HEAVY_MODULES if name in times),
+        "slowest": sorted(own.items(), key=lambda item: -item[1])[:8],
+    }
+
+
+def startup_problems(report, budget_ms=STARTUP_BUDGET_MS):
+    """Why the startup report is over budget; empty when it is fine."""
+    problems = []
+    if report["seconds"] * 1000 > budget_ms:
+        problems.append(f"`--help` took {report['seconds'] * 1000:.0f} ms (budget {budget_ms:.0f} ms)")
+    if report["heavy"]:
+        problems.append("imported at startup: " + ", ".join(report["heavy"]))
+    return problems
+
+
+def startup_lines(report):
+    lines = [f"CLI startup: {report['seconds'] * 1000:.0f} ms (`--help`), "
+             f"wafermap_deliver.cli import: {report['import_ms']:.1f} ms",
+             f"{'Module':<24}{'Import ms'}"]
+    lines += [f"{name:<24}{ms:.1f}" for name, ms in report["slowest"]]
+    return lines
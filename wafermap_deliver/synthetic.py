@@ -0,0 +1,106 @@
+import csv
+import math
+
+import numpy as np
+
+# Synthetic qccsvout .wmap.csv generator for benchmarks and load tests.
+# Dies fill a round wafer on a square grid; fails are more likely towards the
+# edge ring, End Test Nos. follow a long-tailed (Zipf-like) distribution and a
+# share of them is deliberately missing from the limit table.
+
+WIDTH = 11  # qccsvout pads every row to the die-table width
+HEADER_KEYS = ("QC_VERSION", "F_TYPE", "TESTER_NAME", "TCP_NAME", "ST_NO", "FACTORY", "CHIP_NAME", "KEY_NO",
+               "LOT_NO", "PROCESS_CODE", "TESTPRO_NAME", "ROM_NO", "PROBE_CARD", "OPERATOR_NAME", "HOSTNAME",
+               "PRE_POST", "QC_FLAG", "SENSESW", "TIME", "LOTSTART_TIME", "START_TIME", "END_TIME",
+               "PASS_CHIP_NUM", "FAIL_CHIP_NUM", "WAFER_NUM")
+DIE_HEADER = ["X", "Y", "INDEX", "DUT", "G/N", "C1", "C1_MARK", "C2", "C2_MARK", "FT", "ET"]
+FAIL_MARKS = "HIKLMNVabdegpvw12345*$"
+PASS_MARK = "/"
+EDGE_RING_MM = 5.0      # dies this close to the edge fail EDGE_WEIGHT times as often
+EDGE_WEIGHT = 4.0
+MISSING_SHARE = 0.1     # share of fail ETs that are not in the limit table
+LIMIT_UNITS = (("V", " V", 1.0), ("A", "uA", 50.0), ("S", "nS", 20.0), ("N", None, None))
+
+
+def _pad(row):
+    return list(row) + [""] * (WIDTH - len(row))
+
+
+def _die_coordinates(dies):
+    # The `dies` grid cells closest to the center, offset so X/Y start near 10 like real maps
+    radius = math.ceil(math.sqrt(dies / math.pi)) + 2
+    span = np.arange(-radius, radius + 1)
+    gx, gy = np.meshgrid(span, span)
+    gx, gy = gx.ravel(), gy.ravel()
+    dist = np.hypot(gx + 0.5, gy + 0.5)
+    keep = np.argsort(dist, kind="stable")[:dies]
+    x, y, dist = gx[keep] + radius + 10, gy[keep] + radius + 10, dist[keep]
+    order = np.lexsort((-y, x))  # X ascending, Y descending, as the tester walks the wafer
+    return x[order], y[order], dist[order]
+
+
+def _limit_row(i, testno, rng):
+    mode, unit, scale = LIMIT_UNITS[i % len(LIMIT_UNITS)]
+    if unit is None:
+        return [f"T{i + 1}", testno, f"Synthetic_Test_{testno}", mode, "NON", "NON"]
+    lo = round(rng.uniform(0.1, 1.0) * scale, 2)
+    hi = round(lo * rng.uniform(1.02, 1.3), 2)
+    return [f"T{i + 1}", testno, f"Synthetic_Test_{testno}", mode, f" {hi}{unit}", f" {lo}{unit}"]
+
+
+def write_synthetic_wafer(path, dies=7458, diameter_mm=300.0, fail_rate=0.1, et_count=50, limit_rows=100,
+                          slot=1, seed=0):
+    """Write a qccsvout-style .wmap.csv with the given shape; returns path.
+
+    diameter_mm sets the die pitch (and so how wide the failing edge ring is
+    in dies); fail_rate is the overall share of failing dies.
+    """
+    rng = np.random.default_rng(seed)
+    x, y, dist = _die_coordinates(dies)
+
+    # --- Limit table: TESTNO 1001.. ---
+    testnos = np.arange(1001, 1001 + limit_rows)
+    limits = [_limit_row(i, int(t), rng) for i, t in enumerate(testnos)]
+
+    # --- Fail ETs: mostly TESTNOs of the limit table, a few unknown ones ---
+    n_missing = min(et_count, max(int(round(et_count * MISSING_SHARE)), et_count - limit_rows))
+    known = rng.choice(testnos, size=et_count - n_missing, replace=False) if limit_rows else np.zeros(0, int)
+    fail_ets = np.concatenate([known, 50001 + np.arange(n_missing)]).astype(np.int64)
+    weights = 1.0 / np.arange(1, et_count + 1)
+
+    # --- Which dies fail: edge ring weighted, overall rate fail_rate ---
+    pitch_mm = diameter_mm / (2 * dist.max()) if len(dist) else 1.0
+    edge = (dist.max() - dist) * pitch_mm <= EDGE_RING_MM
+    p = np.where(edge, EDGE_WEIGHT, 1.0)
+    p = np.clip(fail_rate * p / p.mean(), 0, 1)
+    failed = rng.random(dies) < p if et_count else np.zeros(dies, dtype=bool)
+    choice = rng.choice(et_count, size=int(failed.sum()), p=weights / weights.sum()) if et_count else []
+    et = np.zeros(dies, dtype=np.int64)
+    et[failed] = fail_ets[choice]
+
+    # --- Per-ET bin (0 = pass): C1 category and C1_MARK ---
+    die_bin = np.zeros(dies, dtype=np.int64)
+    die_bin[failed] = np.asarray(choice, dtype=np.int64) + 1
+    marks = np.array([PASS_MARK] + [FAIL_MARKS[i % len(FAIL_MARKS)] for i in range(et_count)])
+    c1 = np.concatenate([[47], 48 + np.arange(et_count) % 50])
+
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(_pad(["#VERSION"]))
+        writer.writerow(_pad(["##Create qccsvout Ver 2.3.1c. (synthetic wafer)"]))
+        writer.writerow(_pad(["#FILE_HEAD"]))
+        for key in HEADER_KEYS:
+            writer.writerow(_pad([key]))
+        writer.writerow(_pad(["SLOT"]))
+        writer.writerow(_pad([slot]))
+        writer.writerow(_pad(["THEORETICAL_NUM", "FILE", dies]))
+        writer.writerow(_pad(["TSNO", "TESTNO", "COMMENT", "MODE", "HILIMIT", "LOLIMIT"]))
+        writer.writerows(_pad(row) for row in limits)
+        writer.writerow(DIE_HEADER)
+
+        gn = np.where(failed, "NG", "GO")
+        dut = np.arange(dies) % 8 + 1
+        for row in zip(x.tolist(), y.tolist(), dut.tolist(), gn.tolist(), c1[die_bin].tolist(),
+                       marks[die_bin].tolist(), et.tolist()):
+            writer.writerow([row[0], row[1], 1, row[2], row[3], row[4], row[5], 0, "", 0, row[6]])
+    return path
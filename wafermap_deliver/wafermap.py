@@ -0,0 +1,46 @@
+import numpy as np
+
+# Y x X "Min of ET" wafermap grid built straight from the die table,
+# replacing the Excel pivot (Y rows, X columns, Min of ET values).
+
+EMPTY = np.iinfo(np.int64).max
+
+
+def build_wafermap_grid(wafer, compact=True):
+    """Return (x_labels, y_labels, grid) with the min ET per die coordinate.
+
+    Cells without a die hold EMPTY. With compact=True, X/Y values that never
+    occur are dropped, matching the rows/columns the Excel pivot showed.
+    """
+    if not wafer.die_count:
+        raise ValueError("Die table is empty, nothing to map")
+    # ET codes follow ET order, so the min code per die is the min ET's code
+    dies = wafer.dies
+    x_labels, y_labels, codes = grid_from_points(dies.codes("X"), dies.codes("Y"), dies.codes("ET"), compact)
+    grid = np.full(codes.shape, EMPTY, dtype=np.int64)
+    occupied = codes != EMPTY
+    grid[occupied] = dies.categories("ET")[codes[occupied]]
+    return x_labels, y_labels, grid
+
+
+def grid_from_points(x, y, et, compact=True):
+    """build_wafermap_grid for bare X/Y/ET arrays (e.g. per-coordinate minimums)."""
+    x = np.asarray(x, dtype=np.int64)
+    y = np.asarray(y, dtype=np.int64)
+    et = np.asarray(et, dtype=np.int64)
+
+    # --- Offset coordinates into a dense bounding-box grid ---
+    x0, y0 = x.min(), y.min()
+    grid = np.full((y.max() - y0 + 1, x.max() - x0 + 1), EMPTY, dtype=np.int64)
+
+    # --- Scatter-min: duplicate coordinates keep the lowest ET ---
+    np.minimum.at(grid, (y - y0, x - x0), et)
+
+    x_labels = np.arange(x0, x.max() + 1)
+    y_labels = np.arange(y0, y.max() + 1)
+    if compact:
+        occupied = grid != EMPTY
+        rows, cols = occupied.any(axis=1), occupied.any(axis=0)
+        grid, x_labels, y_labels = grid[rows][:, cols], x_labels[cols], y_labels[rows]
+    return x_labels, y_labels, grid
+
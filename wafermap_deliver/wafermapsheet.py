@@ -0,0 +1,93 @@
+from copy import copy
+
+from openpyxl.styles import Alignment, Border, Font, PatternFill, Side
+
+from .palette import et_fill
+from .parser import PROGRESS_EVERY
+from .wafermap import EMPTY
+
+# Native (openpyxl) wafermap sheet, laid out like the sheet the GUI used to
+# format through Excel: X/Y labels bold dark blue on light blue, mirrored
+# below and to the right of the grid with a "No." corner, every cell centered
+# with a thin border, die cells filled with their ET color and no gridlines.
+# Each distinct look is styled through openpyxl once per sheet; every other
+# cell with that look just copies the first cell's style ids.
+
+AXIS_FILL = PatternFill("solid", fgColor="E4F1FD")
+AXIS_FONT = Font(bold=True, color="2E6E9E")
+CENTER = Alignment(horizontal="center", vertical="center")
+THIN = Side(style="thin")
+BORDER = Border(left=THIN, right=THIN, top=THIN, bottom=THIN)
+CORNER = "No."
+
+
+class SheetStyles:
+    """Style ids per look, registered with the workbook on first use."""
+
+    def __init__(self):
+        self._ids = {}
+
+    def apply(self, cell, key, **style):
+        ids = self._ids.get(key)
+        if ids is not None:
+            cell._style = copy(ids)
+            return
+        for name, value in style.items():
+            setattr(cell, name, value)
+        self._ids[key] = copy(cell._style)
+
+    def axis(self, cell):
+        self.apply(cell, "axis", fill=AXIS_FILL, font=AXIS_FONT, alignment=CENTER, border=BORDER)
+
+    def die(self, cell, et):
+        self.apply(cell, et, fill=et_fill(et), alignment=CENTER, border=BORDER)
+
+    def blank(self, cell):
+        self.apply(cell, None, alignment=CENTER, border=BORDER)
+
+
+def write_axis_labels(ws, x_labels, y_labels, styles=None):
+    """X labels along rows 1 and last+1, Y labels down columns A and last+1."""
+    styles = styles or SheetStyles()
+    x_labels = x_labels.tolist()
+    y_labels = y_labels.tolist()
+    last_row, last_col = len(y_labels) + 1, len(x_labels) + 1
+
+    # --- Axis labels: top row / column A, mirrored below and to the right ---
+    for c, x in enumerate([CORNER] + x_labels, start=1):
+        for r in (1, last_row + 1):
+            styles.axis(ws.cell(row=r, column=c, value=x))
+    for r, y in enumerate([CORNER] + y_labels, start=1):
+        for c in (1, last_col + 1):
+            styles.axis(ws.cell(row=r, column=c, value=y))
+    styles.axis(ws.cell(row=last_row + 1, column=last_col + 1, value=CORNER))
+
+
+def write_wafermap_sheet(wb, x_labels, y_labels, grid, title, index=None, progress=None):
+    """Grid with mirrored axis labels, ET fills from the shared palette.
+
+    progress, if given, is called as progress("Dies colored", count) every
+    PROGRESS_EVERY dies or so; it may raise to cancel.
+    """
+    if title in wb.sheetnames:
+        del wb[title]
+    ws = wb.create_sheet(title, index)
+    ws.sheet_view.showGridLines = False
+    styles = SheetStyles()
+    write_axis_labels(ws, x_labels, y_labels, styles)
+
+    # --- Die cells; positions without a die stay empty but keep the border ---
+    colored = reported = 0
+    for r, row in enumerate(grid.tolist(), start=2):
+        for c, et in enumerate(row, start=2):
+            cell = ws.cell(row=r, column=c)
+            if et == EMPTY:
+                styles.blank(cell)
+            else:
+                cell.value = et
+                styles.die(cell, et)
+                colored += 1
+        if progress and colored - reported >= PROGRESS_EVERY:
+            progress("Dies colored", colored)
+            reported = colored
+    return ws
@@ -0,0 +1,199 @@
+import ctypes
+import os
+import select
+import struct
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from .pipeline import process_file
+
+# Watch-folder mode: a long-running loop that picks up every .wmap.csv the
+# tester drops into one or more folders and runs the full chain on it, so the
+# deliverables are ready seconds after test end. Folder changes come from
+# inotify on Linux (plain polling elsewhere or with use_inotify=False). A file
+# is only taken once its size and mtime have been stable for `settle` seconds,
+# so half-written CSVs are never parsed.
+
+SUFFIX = ".wmap.csv"
+IN_MODIFY, IN_CLOSE_WRITE, IN_MOVED_TO, IN_CREATE, IN_Q_OVERFLOW = 0x2, 0x8, 0x80, 0x100, 0x4000
+EVENT = struct.Struct("iIII")  # wd, mask, cookie, len; then len bytes of NUL-padded name
+
+
+class Inotify:
+    """Minimal inotify reader (via libc) for a few non-recursive directories."""
+
+    def __init__(self, dirs):
+        libc = ctypes.CDLL(None, use_errno=True)
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.dirs = {}
+        mask = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+        for d in dirs:
+            wd = libc.inotify_add_watch(self.fd, os.fsencode(d), mask)
+            if wd < 0:
+                self.close()
+                raise OSError(ctypes.get_errno(), f"cannot watch {d}")
+            self.dirs[wd] = d
+
+    def read(self, timeout):
+        """Paths of changed wafer files within timeout seconds; None when events were lost."""
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return set()
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return set()
+        paths, offset = set(), 0
+        while offset < len(data):
+            wd, mask, _, length = EVENT.unpack_from(data, offset)
+            name = data[offset + EVENT.size:offset + EVENT.size + length].rstrip(b"\0")
+            offset += EVENT.size + length
+            if mask & IN_Q_OVERFLOW:
+                return None
+            name = os.fsdecode(name)
+            if wd in self.dirs and name.endswith(SUFFIX):
+                paths.add(os.path.join(self.dirs[wd], name))
+        return paths
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+class FolderWatcher:
+    """Reports each .wmap.csv in dirs once it has stopped changing, and again after it is rewritten."""
+
+    def __init__(self, dirs, settle=2.0, poll=1.0, use_inotify=True):
+        self.dirs = [os.path.abspath(d) for d in dirs]
+        self.settle = settle
+        self.poll = poll
+        self.pending = {}  # path -> (size, mtime_ns, stable since)
+        self.seen = {}     # path -> (size, mtime_ns) when it was last handed out
+        self.inotify = None
+        if use_inotify and sys.platform.startswith("linux"):
+            try:
+                self.inotify = Inotify(self.dirs)
+            except (OSError, AttributeError):
+                self.inotify = None  # no inotify (or out of watches): fall back to polling
+        self._rescan = True  # first call picks up everything already in the folders
+
+    @property
+    def mode(self):
+        return "inotify" if self.inotify is not None else "polling"
+
+    def scan(self):
+        paths = set()
+        for d in self.dirs:
+            try:
+                with os.scandir(d) as entries:
+                    paths.update(e.path for e in entries if e.name.endswith(SUFFIX) and e.is_file())
+            except FileNotFoundError:
+                continue
+        return paths
+
+    def ready(self):
+        """Wait up to `poll` seconds for changes; returns the paths that have settled."""
+        if self._rescan:
+            changed, self._rescan = self.scan(), False
+        elif self.inotify is not None:
+            changed = self.inotify.read(self.poll)
+            if changed is None:
+                changed = self.scan()
+        else:
+            time.sleep(self.poll)
+            changed = self.scan()
+
+        now, out = time.monotonic(), []
+        for path in changed | set(self.pending):
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                self.pending.pop(path, None)
+                continue
+            state = (st.st_size, st.st_mtime_ns)
+            if state == self.seen.get(path) or st.st_size == 0:
+                continue
+            previous = self.pending.get(path)
+            if previous is None or previous[:2] != state:
+                self.pending[path] = (*state, now)
+            elif now - previous[2] >= self.settle:
+                del self.pending[path]
+                self.seen[path] = state
+                out.append(path)
+        return sorted(out)
+
+    def close(self):
+        if self.inotify is not None:
+            self.inotify.close()
+
+
+def _out_dir(path, dirs, out_dir):
+    # Results tree: one subfolder per watched folder when several are watched
+    if not out_dir or len(dirs) == 1:
+        return out_dir
+    return os.path.join(out_dir, os.path.basename(os.path.dirname(path)))
+
+
+def watch_folders(dirs, c1_mark=None, out_dir=None, workers=None, settle=2.0, poll=1.0, use_inotify=True,
+                  status=print, use_cache=True, force=False, stop=None):
+    """Run the full chain on every wafer file that lands in dirs until stop (a threading.Event) is set.
+
+    At most 2 x workers files are in the process pool at once; the rest wait
+    in a queue, so a burst of files never floods the pool. A file written to
+    again while its job runs is queued once more when that job is done, never
+    processed twice at the same time.
+    """
+    workers = workers or os.cpu_count() or 1
+    watcher = FolderWatcher(dirs, settle, poll, use_inotify)
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+    status(f"👀 Watching {', '.join(watcher.dirs)} ({watcher.mode}, settle {settle:g} s, {workers} worker(s))")
+
+    queue, in_flight, changed = deque(), {}, set()
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            while stop is None or not stop.is_set():
+                running = set(in_flight.values())
+                for path in watcher.ready():
+                    if path in running:
+                        changed.add(path)  # rerun once the current job is done
+                    elif path not in queue:
+                        queue.append(path)
+                while queue and len(in_flight) < 2 * workers:
+                    path = queue.popleft()
+                    target = _out_dir(path, watcher.dirs, out_dir)
+                    if target:
+                        os.makedirs(target, exist_ok=True)
+                    future = pool.submit(process_file, path, c1_mark, target, True, use_cache, force)
+                    in_flight[future] = path
+                for future in [f for f in in_flight if f.done()]:
+                    path = in_flight.pop(future)
+                    _report(path, future, status)
+                    if path in changed:
+                        changed.discard(path)
+                        queue.append(path)
+            for future, path in in_flight.items():
+                _report(path, future, status)
+    finally:
+        watcher.close()
+
+
+def _report(path, future, status):
+    name = os.path.basename(path)
+    try:
+        result = future.result()
+    except Exception as e:
+        status(f"❌ {name}: {e}")
+        return
+    if result.up_to_date:
+        status(f"⏭️ {name} (W#{str(result.slot).zfill(2)}) is up to date, skipped.")
+        return
+    try:
+        age = f", {time.time() - os.path.getmtime(path):.1f} s after the last write"
+    except OSError:
+        age = ""
+    status(f"✅ {name} (W#{str(result.slot).zfill(2)}) → {result.out_file}{age}")
@@ -0,0 +1,84 @@
+import queue
+import threading
+import time
+
+from .metrics import collect
+
+# Background worker for the GUI: one long-lived thread runs the stages in
+# order, and everything it wants to show goes back through an event queue
+# that the Tk main loop polls.
+
+
+class Cancelled(BaseException):
+    # BaseException so a stage's own "except Exception" doesn't swallow it
+    pass
+
+
+class StageWorker:
+    """Runs submitted jobs one at a time on a background thread."""
+
+    def __init__(self, metrics_file=None):
+        self.metrics_file = metrics_file  # optional JSON-lines file for every job's timings
+        self.events = queue.Queue()
+        self._jobs = queue.Queue()
+        self._cancel = threading.Event()
+        self._busy = threading.Event()
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+
+    @property
+    def busy(self):
+        return self._busy.is_set()
+
+    @property
+    def alive(self):
+        return self._thread.is_alive()
+
+    def submit(self, name, func, *args):
+        # The cancel flag is reset when the next job starts, so a cancel()
+        # right before submit() still stops the job that is running now
+        self._busy.set()
+        self._jobs.put((name, func, args))
+
+    def cancel(self):
+        self._cancel.set()
+
+    def check_cancelled(self):
+        if self._cancel.is_set():
+            raise Cancelled()
+
+    def post(self, kind, *payload):
+        self.events.put((kind,) + payload)
+
+    def progress(self, what, count):
+        # Progress hook for the core stages; also the point where Cancel takes effect
+        self.check_cancelled()
+        self.post("progress", f"{what}: {count:,}")
+
+    def close(self):
+        """Let the thread exit after the jobs already submitted, without waiting for it."""
+        self._jobs.put(None)
+
+    def stop(self, timeout=None):
+        self.close()
+        self._thread.join(timeout)
+
+    def _loop(self):
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                return
+            name, func, args = job
+            self._cancel.clear()
+            self._busy.set()
+            start = time.perf_counter()
+            try:
+                with collect(name, self.metrics_file) as metrics:
+                    func(*args)
+                self.post("done", name, time.perf_counter() - start, metrics)
+            except Cancelled:
+                self.post("cancelled", name)
+            except Exception as e:
+                self.post("error", name, e)
+            finally:
+                self._busy.clear()